@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+def file_revision(file) -> str:
+    """Révision connue d'un fichier de snapshot: contenthash (web service), sinon date de modification."""
+    value = file.get('contenthash') or file.get('timemodified')
+    return str(value) if value else None
+
+class BlobStore:
+    """Stockage des fichiers téléchargés adressé par contenu (sha256 des octets).
+
+    Chaque contenu distinct est écrit une seule fois sous <root>/<sha[:2]>/<sha>;
+    les chemins par cours/section (downloads/<course_id>/...) sont des liens physiques
+    vers ce blob (copie si le lien est impossible). Un index JSON conserve
+    url -> (sha, révision) et chemin -> sha pour éviter de retélécharger une URL connue
+    et permettre aux envois Telegram de dédupliquer par contenu. Une URL dont la
+    révision (contenthash, date de modification) a changé est retéléchargée.
+    L'index est écrit par flush(), une fois par lot de téléchargements.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.logger = logging.getLogger(__name__)
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.index_path = os.path.join(root, 'index.json')
+        self._lock = threading.Lock()
+        self._dirty = False
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.index = self._load_index()
+        self._prune()
+
+    def _load_index(self) -> dict:
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data.setdefault('urls', {})
+                data.setdefault('refs', {})
+                data.setdefault('blobs', {})
+                return data
+        except Exception as e:
+            self.logger.warning(f"Index des blobs illisible, reconstruction: {e}")
+        return {'urls': {}, 'refs': {}, 'blobs': {}}
+
+    def _prune(self):
+        """Oublier les références dont le fichier de cours ou le blob a disparu."""
+        refs = self.index['refs']
+        for path in [p for p, digest in refs.items()
+                     if not os.path.exists(p) or not os.path.exists(self.blob_path(digest))]:
+            del refs[path]
+            self._dirty = True
+        urls = self.index['urls']
+        for url in [u for u, entry in urls.items() if not os.path.exists(self.blob_path(self._url_digest(entry)))]:
+            del urls[url]
+            self._dirty = True
+        self.flush()
+
+    @staticmethod
+    def _url_digest(entry):
+        # Ancien format d'index: url -> sha, sans révision
+        return entry if isinstance(entry, str) else entry['sha']
+
+    def flush(self):
+        """Écrire l'index s'il a changé (appel bloquant, une fois par lot)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                tmp_path = self.index_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.index, f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_path)
+                self._dirty = False
+            except Exception as e:
+                self.logger.warning(f"Sauvegarde de l'index des blobs impossible: {e}")
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def new_temp_path(self) -> str:
+        """Chemin temporaire unique pour un téléchargement en cours."""
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+
+    def lookup_url(self, url: str, revision: str = None):
+        """sha du contenu déjà téléchargé pour cette URL dans cette révision (si le blob existe encore)."""
+        with self._lock:
+            entry = self.index['urls'].get(url)
+            if entry is None:
+                return None
+            digest = self._url_digest(entry)
+            stored = None if isinstance(entry, str) else entry.get('revision')
+            if stored != revision:
+                # Fichier remplacé à la même URL: l'entrée ne vaut plus
+                del self.index['urls'][url]
+                self._dirty = True
+                return None
+        if os.path.exists(self.blob_path(digest)):
+            return digest
+        return None
+
+    def commit(self, tmp_path: str, digest: str, size: int, url: str, name: str, revision: str = None) -> str:
+        """Intégrer un fichier temporaire complet comme blob (supprimé si déjà présent)."""
+        path = self.blob_path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            self.index['blobs'].setdefault(digest, {'size': size, 'name': name})
+            self.index['urls'][url] = {'sha': digest, 'revision': revision}
+            self._dirty = True
+        return path
+
+    def link(self, digest: str, dest_path: str) -> str:
+        """Créer la référence par cours vers le blob (lien physique, sinon copie).
+
+        Un chemin qui référence un autre contenu (fichier remplacé) est recréé.
+        """
+        src = self.blob_path(digest)
+        key = os.path.normpath(dest_path)
+        with self._lock:
+            current = self.index['refs'].get(key)
+        if current == digest and os.path.exists(dest_path):
+            return dest_path
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(src, dest_path)
+        except OSError:
+            shutil.copyfile(src, dest_path)
+        with self._lock:
+            self.index['refs'][key] = digest
+            self._dirty = True
+        return dest_path
+
+    def digest_for_path(self, path: str):
+        """sha du contenu référencé par un chemin de cours (None si inconnu)."""
+        with self._lock:
+            return self.index['refs'].get(os.path.normpath(path))
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs = self.index['blobs']
+            return {
+                'blobs': len(blobs),
+                'refs': len(self.index['refs']),
+                'bytes': sum(b.get('size', 0) for b in blobs.values())
+            }
+
+    @staticmethod
+    def new_hasher():
+        return hashlib.sha256()
+
+    @staticmethod
+    def hash_file(path: str, chunk_size: int = 64 * 1024) -> str:
+        """sha256 d'un fichier existant (fichiers téléchargés avant le stockage par contenu)."""
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
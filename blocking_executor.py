@@ -0,0 +1,26 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+class BlockingExecutor:
+    """Couche d'exécution des appels bloquants (HTTP eLearning, Firestore, disque).
+
+    Toutes les opérations bloquantes lancées depuis la boucle asyncio passent par
+    ce pool de threads dédié, afin que la boucle de commandes Telegram reste
+    réactive pendant les scans et les bigscans.
+    """
+    def __init__(self, max_workers: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max(1, max_workers or Config.BLOCKING_POOL_SIZE)
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='blocking')
+
+    async def run(self, func, *args, **kwargs):
+        """Exécuter func(*args, **kwargs) dans le pool et attendre son résultat."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        """Arrêter le pool sans attendre les tâches en cours."""
+        self.pool.shutdown(wait=False, cancel_futures=True)
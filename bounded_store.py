@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+class BoundedStore:
+    """Dictionnaire borné: éviction LRU au-delà de `max_entries` et expiration après `ttl` secondes.
+
+    Les valeurs sont conservées par référence (aucune copie): y ranger une liste issue
+    du cache des vues ne duplique pas les items. Compteurs hits/misses/evictions/expired
+    exposés par stats().
+    """
+    def __init__(self, max_entries: int, ttl: float = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._data = OrderedDict()  # clé -> (expire_at, valeur)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _expire_at(self):
+        return time.monotonic() + self.ttl if self.ttl else None
+
+    def _purge_expired(self, now: float):
+        # Les entrées les plus anciennement utilisées sont en tête
+        while self._data:
+            key, (expire_at, _) = next(iter(self._data.items()))
+            if expire_at is None or expire_at > now:
+                break
+            del self._data[key]
+            self.expired += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (item[0] is not None and item[0] <= time.monotonic()):
+                if item is not None:
+                    del self._data[key]
+                    self.expired += 1
+                self.misses += 1
+                return default
+            # Accès: l'entrée redevient la plus récente et sa durée de vie repart
+            self._data[key] = (self._expire_at(), item[1])
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            self._data[key] = (self._expire_at(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and (item[0] is None or item[0] > time.monotonic())
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expired': self.expired
+        }
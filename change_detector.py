@@ -1,14 +1,74 @@
 import json
 import logging
+import re
+import unicodedata
 from datetime import datetime
 from typing import Dict, List, Any, Optional
+from functools import lru_cache
+from urllib.parse import unquote, urlsplit
 import difflib
+from change_record import ChangeRecord
+from content_hash import same_hash
+
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+# Longueur minimale d'une description pour qu'un ajout sans fichier soit signalé
+_MIN_DESCRIPTION_LEN = 50
+# Identifiant du module de cours dans mod/<type>/view.php?id=<cmid>
+_CM_ID_RE = re.compile(r'/mod/\w+/view\.php\?(?:[^#]*&)?id=(\d+)')
+# pluginfile.php/<contextid>/<composant>/<zone>/<itemid>/<chemin/nom>
+_PLUGINFILE_RE = re.compile(r'/pluginfile\.php/(\d+)/([^/]+)/([^/]+)/(?:(\d+)/)?(.+)$')
+
+@lru_cache(maxsize=4096)
+def _normalize(text: str) -> str:
+    """Normaliser un texte pour la comparaison de similarité (mémoïsé: titres répétés d'un scan à l'autre)"""
+    # Normaliser les caractères Unicode (NFC)
+    text = unicodedata.normalize('NFC', text)
+    
+    # Convertir en minuscules
+    text = text.lower()
+    
+    # Supprimer les balises HTML
+    text = re.sub(r'<[^>]+>', '', text)
+    
+    # Normaliser les espaces
+    text = re.sub(r'\s+', ' ', text).strip()
+    
+    # Supprimer la ponctuation
+    text = re.sub(r'[^\w\s]', '', text)
+    
+    return text
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def module_id(url: str) -> Optional[str]:
+    """Identifiant stable (cmid) d'une activité/ressource Moodle, None si absent de l'URL."""
+    match = _CM_ID_RE.search(url or '')
+    return match.group(1) if match else None
+
+def pluginfile_key(url: str):
+    """(clé stable, révision) d'un fichier pluginfile.php, None pour une autre URL.
+
+    Pour mod_resource/content, l'itemid est la révision de la ressource: il est exclu de
+    la clé pour qu'un fichier remplacé la garde. Ailleurs (dossiers, pièces jointes de
+    devoirs ou de forums...) il distingue des fichiers différents et reste dans la clé.
+    """
+    if not url or 'pluginfile.php' not in url:
+        return None
+    match = _PLUGINFILE_RE.search(urlsplit(url).path)
+    if not match:
+        return None
+    context_id, component, area, item_id, path = match.groups()
+    if component == 'mod_resource' and area == 'content':
+        return ('pluginfile', context_id, component, area, unquote(path)), item_id
+    return ('pluginfile', context_id, component, area, item_id, unquote(path)), None
 
 class ChangeDetector:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
     
-    def detect_changes(self, old_content: Optional[Dict], new_content: Dict, is_initial_scan: bool = False) -> List[Dict]:
+    def detect_changes(self, old_content: Optional[Dict], new_content: Dict, is_initial_scan: bool = False) -> List[ChangeRecord]:
         """
         Détecter les changements entre l'ancien et le nouveau contenu
         """
@@ -19,6 +79,10 @@ class ChangeDetector:
             changes.extend(self._extract_all_existing_content(new_content))
             return changes
         
+        # Même empreinte de cours: rien n'a changé, inutile de parcourir l'arbre
+        if same_hash(old_content, new_content, 'content_hash'):
+            return changes
+        
         # Comparer les sections
         old_sections = old_content.get('sections', [])
         new_sections = new_content.get('sections', [])
@@ -31,18 +95,15 @@ class ChangeDetector:
         
         return meaningful_changes
     
-    def _extract_all_existing_content(self, content: Dict) -> List[Dict]:
+    def _extract_all_existing_content(self, content: Dict) -> List[ChangeRecord]:
         """Extraire tout le contenu existant pour le premier scan"""
         changes = []
         
+        sections = content.get('sections', [])
+        
         # Ajouter un message de début de scan
-        changes.append({
-            'type': 'initial_scan_start',
-            'message': '🔍 Premier scan complet du cours - Extraction de tout le contenu existant',
-            'details': f"Nombre total de sections: {len(content.get('sections', []))}"
-        })
+        changes.append(ChangeRecord('initial_scan_start', counts={'sections': len(sections)}))
         
-        sections = content.get('sections', [])
         total_items = 0
         
         now_iso = datetime.now().isoformat()
@@ -56,248 +117,249 @@ class ChangeDetector:
             total_items += section_total
             
             if section_total > 0:
-                changes.append({
-                    'type': 'existing_section',
-                    'section_title': section_title,
-                    'message': f'📂 Section existante: {section_title}',
-                    'details': f"Activités: {len(activities)}, Ressources: {len(resources)}"
-                })
-                
-                # Ajouter chaque activité existante
-                for activity in activities:
-                    changes.append({
-                        'type': 'existing_activity',
-                        'activity_title': activity.get('title', 'Sans titre'),
-                        'activity_type': activity.get('type', 'unknown'),
-                        'message': f'📋 Activité existante: {activity.get("title", "Sans titre")}',
-                        'details': self._get_activity_summary(activity)
-                    })
-                    
-                    # Ajouter chaque fichier dans l'activité
-                    for file_info in activity.get('files', []):
-                        # Date de publication inconnue côté Moodle sans page dédiée => on stocke la date de découverte
-                        changes.append({
-                            'type': 'existing_file',
-                            'file_name': file_info.get('name', 'Sans nom'),
-                            'parent_title': activity.get('title', 'Sans titre'),
-                            'file_date': now_iso,
-                            'message': f"📄 Fichier existant: {file_info.get('name', 'Sans nom')}",
-                            'details': f"Dans l'activité: {activity.get('title', 'Sans titre')} | Publié (détecté) : {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                        })
+                changes.append(ChangeRecord(
+                    'existing_section', kind='section', section_title=section_title,
+                    counts=self._section_counts(section)
+                ))
                 
-                # Ajouter chaque ressource existante
-                for resource in resources:
-                    changes.append({
-                        'type': 'existing_resource',
-                        'resource_title': resource.get('title', 'Sans titre'),
-                        'message': f'📚 Ressource existante: {resource.get("title", "Sans titre")}',
-                        'details': self._get_resource_summary(resource)
-                    })
-                    
-                    # Ajouter chaque fichier dans la ressource
-                    for file_info in resource.get('files', []):
-                        changes.append({
-                            'type': 'existing_file',
-                            'file_name': file_info.get('name', 'Sans nom'),
-                            'parent_title': resource.get('title', 'Sans titre'),
-                            'file_date': now_iso,
-                            'message': f"📄 Fichier existant: {file_info.get('name', 'Sans nom')}",
-                            'details': f"Dans la ressource: {resource.get('title', 'Sans titre')} | Publié (détecté) : {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                        })
+                # Ajouter chaque activité puis chaque ressource existante, avec leurs fichiers
+                # (date de publication inconnue côté Moodle sans page dédiée => date de découverte)
+                for kind, items in (('activity', activities), ('resource', resources)):
+                    for item in items:
+                        title = item.get('title', 'Sans titre')
+                        fields = {f'{kind}_title': title}
+                        if kind == 'activity':
+                            fields['activity_type'] = item.get('type', 'unknown')
+                        changes.append(ChangeRecord(
+                            f'existing_{kind}', kind=kind, counts={'files': len(item.get('files', []))},
+                            new_value=item.get('description', ''), **fields
+                        ))
+                        for file_info in item.get('files', []):
+                            changes.append(ChangeRecord(
+                                'existing_file', kind=kind,
+                                file_name=file_info.get('name', 'Sans nom'),
+                                parent_title=title,
+                                file_date=now_iso
+                            ))
         
         # Ajouter un message de fin de scan
-        changes.append({
-            'type': 'initial_scan_complete',
-            'message': f'✅ Premier scan terminé - {total_items} éléments trouvés',
-            'details': f"Le cours contient {len(sections)} sections avec {total_items} éléments au total"
-        })
+        changes.append(ChangeRecord('initial_scan_complete', counts={'sections': len(sections), 'items': total_items}))
         
         return changes
     
-    def _compare_sections(self, old_sections: List[Dict], new_sections: List[Dict]) -> List[Dict]:
-        """Comparer les sections entre l'ancien et le nouveau contenu"""
+    def _compare_sections(self, old_sections: List[Dict], new_sections: List[Dict]) -> List[ChangeRecord]:
+        """Comparer les sections, puis leurs activités/ressources en une seule passe sur le cours"""
         changes = []
         
-        # Créer des dictionnaires pour faciliter la comparaison
-        old_sections_dict = {section['title']: section for section in old_sections}
-        new_sections_dict = {section['title']: section for section in new_sections}
-        
-        # Détection des renommages potentiels via similarité avec seuil plus élevé
-        unmatched_old = set(old_sections_dict.keys())
-        unmatched_new = set(new_sections_dict.keys())
-        rename_pairs = []  # (old_title, new_title)
+        # Sections indexées par (titre, rang parmi les titres identiques)
+        old_sections_dict = dict(self._keyed_sections(old_sections))
+        new_sections_dict = dict(self._keyed_sections(new_sections))
+        
+        # Correspondance ancienne clé -> nouvelle clé (titre identique, puis renommages)
+        section_map = {key: key for key in old_sections_dict if key in new_sections_dict}
+        unmatched_old = [key for key in old_sections_dict if key not in new_sections_dict]
+        unmatched_new = set(key for key in new_sections_dict if key not in old_sections_dict)
+        rename_pairs = []  # (old_key, new_key, ratio)
+        
+        # Détection des renommages potentiels via similarité avec seuil élevé
+        for old_key, best_match, best_ratio in self._rename_candidates(unmatched_old, unmatched_new):
+            if best_match:
+                # Même section: renommage significatif signalé, changement cosmétique ignoré
+                if self._is_significant_rename(old_key[0], best_match[0]):
+                    rename_pairs.append((old_key, best_match, best_ratio))
+                section_map[old_key] = best_match
+                unmatched_new.discard(best_match)
         
-        for old_title in list(unmatched_old):
-            best_match = None
-            best_ratio = 0.0
-            for new_title in list(unmatched_new):
-                # Normaliser les chaînes pour une meilleure comparaison
-                old_normalized = self._normalize_for_comparison(old_title)
-                new_normalized = self._normalize_for_comparison(new_title)
-                ratio = difflib.SequenceMatcher(None, old_normalized, new_normalized).ratio()
-                # Seuil élevé pour détecter les renommages
-                if ratio > 0.8 and ratio > best_ratio:
-                    best_ratio = ratio
-                    best_match = new_title
-            
-            # Vérifier que c'est vraiment un renommage et pas juste un changement cosmétique
-            if best_match and old_title != best_match:
-                if self._is_significant_rename(old_title, best_match):
-                    # C'est un vrai renommage
-                    rename_pairs.append((old_title, best_match, best_ratio))
-                    unmatched_old.discard(old_title)
-                    unmatched_new.discard(best_match)
-                else:
-                    # C'est un changement cosmétique, on l'ignore complètement
-                    unmatched_old.discard(old_title)
-                    unmatched_new.discard(best_match)
-
         # Sections renommées (seulement si c'est significatif)
-        for old_title, new_title, ratio in rename_pairs:
-            changes.append({
-                'type': 'section_renamed',
-                'old_title': old_title,
-                'new_title': new_title,
-                'similarity': f"{ratio:.2f}",
-                'message': f'Section renommée: {old_title} ➜ {new_title}',
-                'details': f'Similarité {ratio:.2f} | Ancien résumé: {self._get_section_summary(old_sections_dict[old_title])} | Nouveau résumé: {self._get_section_summary(new_sections_dict[new_title])}'
-            })
-
+        for old_key, new_key, ratio in rename_pairs:
+            counts = self._section_counts(new_sections_dict[new_key])
+            counts.update({f'old_{k}': v for k, v in self._section_counts(old_sections_dict[old_key]).items()})
+            changes.append(ChangeRecord(
+                'section_renamed', kind='section', counts=counts,
+                old_value=old_key[0], new_value=new_key[0],
+                old_title=old_key[0], new_title=new_key[0], similarity=f"{ratio:.2f}"
+            ))
+        
         # Sections ajoutées (non mappées) - seulement si elles ont du contenu
-        for title in unmatched_new:
-            section = new_sections_dict[title]
-            if self._has_meaningful_content(section):
-                changes.append({
-                    'type': 'section_added',
-                    'section_title': title,
-                    'message': f'Nouvelle section ajoutée: {title}',
-                    'details': self._get_section_summary(section)
-                })
+        added_keys = set(unmatched_new)
+        for key in new_sections_dict:
+            section = new_sections_dict[key]
+            if key in added_keys:
+                counts = self._section_counts(section)
+                if self._has_meaningful_content(counts):
+                    changes.append(ChangeRecord('section_added', kind='section', counts=counts, section_title=key[0]))
         
         # Sections supprimées (non mappées) - seulement si elles avaient du contenu
-        for title in unmatched_old:
-            section = old_sections_dict[title]
-            if self._has_meaningful_content(section):
-                changes.append({
-                    'type': 'section_removed',
-                    'section_title': title,
-                    'message': f'Section supprimée: {title}',
-                    'details': self._get_section_summary(section)
-                })
-        
-        # Sections modifiées (ignorer celles qui sont renommées -> prendre le nouveau titre uniquement)
-        processed_titles = {new for _, new, _ in rename_pairs}
-        for title, new_section in new_sections_dict.items():
-            if title in old_sections_dict and title not in processed_titles:
-                old_section = old_sections_dict[title]
-                section_changes = self._compare_section_content(old_section, new_section)
-                changes.extend(section_changes)
-        
-        return changes
-    
-    def _compare_section_content(self, old_section: Dict, new_section: Dict) -> List[Dict]:
-        """Comparer le contenu d'une section"""
-        changes = []
-        
-        # Comparer les activités
-        activity_changes = self._compare_activities(
-            old_section.get('activities', []),
-            new_section.get('activities', [])
-        )
-        changes.extend(activity_changes)
+        for key in unmatched_old:
+            section = old_sections_dict[key]
+            if key not in section_map:
+                counts = self._section_counts(section)
+                if self._has_meaningful_content(counts):
+                    changes.append(ChangeRecord('section_removed', kind='section', counts=counts, section_title=key[0]))
         
-        # Comparer les ressources
-        resource_changes = self._compare_resources(
-            old_section.get('resources', []),
-            new_section.get('resources', [])
-        )
-        changes.extend(resource_changes)
+        # Activités/ressources: diff unique sur tout le cours (un module déplacé n'est ni ajouté ni supprimé)
+        changes.extend(self._compare_items(old_sections_dict, new_sections_dict, section_map, added_keys))
         
         return changes
     
-    def _compare_activities(self, old_activities: List[Dict], new_activities: List[Dict]) -> List[Dict]:
-        """Comparer les activités"""
+    def _rename_candidates(self, unmatched_old: List, unmatched_new: set, threshold: float = 0.8):
+        """(ancienne clé, meilleure nouvelle clé ou None, ratio) pour chaque ancienne section non appariée.
+
+        Seules les paires partageant assez de trigrammes sont évaluées (index trigramme ->
+        nouvelles clés), après les bornes real_quick_ratio/quick_ratio de SequenceMatcher.
+        Une nouvelle clé déjà attribuée n'est plus proposée.
+        """
+        normalized = {key: _normalize(key[0]) for key in unmatched_new}
+        grams_of = {key: _trigrams(text) for key, text in normalized.items()}
+        index = {}
+        for key, grams in grams_of.items():
+            for gram in grams:
+                index.setdefault(gram, []).append(key)
+        
+        matcher = difflib.SequenceMatcher(None)
+        for old_key in unmatched_old:
+            old_text = _normalize(old_key[0])
+            old_grams = _trigrams(old_text)
+            shared = {}
+            for gram in old_grams:
+                for key in index.get(gram, ()):
+                    shared[key] = shared.get(key, 0) + 1
+            # SequenceMatcher analyse seq2: l'ancien titre est fixé une fois pour tous les candidats
+            matcher.set_seq2(old_text)
+            best_match = None
+            best_ratio = 0.0
+            for key, common in sorted(shared.items(), key=lambda kc: -kc[1]):
+                if key not in unmatched_new:
+                    continue
+                # Blocage: trop peu de trigrammes communs pour une similarité > seuil
+                if common * 3 < min(len(old_grams), len(grams_of[key])):
+                    continue
+                new_text = normalized[key]
+                floor = max(threshold, best_ratio)
+                # Borne supérieure exacte du ratio d'après les longueurs seules
+                total = len(old_text) + len(new_text)
+                if not total or 2 * min(len(old_text), len(new_text)) / total <= floor:
+                    continue
+                matcher.set_seq1(new_text)
+                if matcher.real_quick_ratio() <= floor or matcher.quick_ratio() <= floor:
+                    continue
+                ratio = matcher.ratio()
+                if ratio > floor:
+                    best_ratio = ratio
+                    best_match = key
+            yield old_key, best_match, best_ratio
+    
+    def _keyed_sections(self, sections: List[Dict]):
+        """(clé, section) avec clé = (titre, rang du titre) pour distinguer les titres en double"""
+        seen = {}
+        for section in sections:
+            title = section.get('title', '')
+            rank = seen[title] = seen.get(title, -1) + 1
+            yield (title, rank), section
+    
+    def _keyed_items(self, items: List[Dict], kind: str, scope):
+        """(clé, élément): id du module Moodle (cm) si l'URL le porte, sinon titre + rang dans la section"""
+        seen = {}
+        for item in items:
+            cm_id = module_id(item.get('url', ''))
+            if cm_id:
+                yield ('cm', cm_id), item
+            else:
+                title = item.get('title', '')
+                rank = seen[title] = seen.get(title, -1) + 1
+                yield ('title', kind, scope, title, rank), item
+    
+    def _compare_items(self, old_sections: Dict, new_sections: Dict, section_map: Dict, added_keys: set) -> List[ChangeRecord]:
+        """Comparer activités et ressources de tout le cours, indexées par identifiant stable"""
         changes = []
         
-        old_activities_dict = {activity['title']: activity for activity in old_activities}
-        new_activities_dict = {activity['title']: activity for activity in new_activities}
-        
-        # Activités ajoutées
-        for title, activity in new_activities_dict.items():
-            if title not in old_activities_dict:
-                changes.append({
-                    'type': 'activity_added',
-                    'activity_title': title,
-                    'activity_type': activity.get('type', 'unknown'),
-                    'message': f'Nouvelle activité ajoutée: {title}',
-                    'details': self._get_activity_summary(activity)
-                })
-        
-        # Activités supprimées
-        for title, activity in old_activities_dict.items():
-            if title not in new_activities_dict:
-                changes.append({
-                    'type': 'activity_removed',
-                    'activity_title': title,
-                    'activity_type': activity.get('type', 'unknown'),
-                    'message': f'Activité supprimée: {title}',
-                    'details': self._get_activity_summary(activity)
-                })
-        
-        # Activités modifiées
-        for title, new_activity in new_activities_dict.items():
-            if title in old_activities_dict:
-                old_activity = old_activities_dict[title]
-                activity_changes = self._compare_activity_content(old_activity, new_activity)
-                changes.extend(activity_changes)
+        # Sections de même empreinte des deux côtés: éléments identiques, non parcourus
+        unchanged = {new_key for old_key, new_key in section_map.items()
+                     if same_hash(old_sections[old_key], new_sections[new_key])}
         
-        return changes
-    
-    def _compare_resources(self, old_resources: List[Dict], new_resources: List[Dict]) -> List[Dict]:
-        """Comparer les ressources"""
-        changes = []
+        old_items = {}
+        for old_key, section in old_sections.items():
+            # Les éléments sans id sont rattachés à la section correspondante du nouveau contenu
+            scope = section_map.get(old_key)
+            if scope in unchanged:
+                continue
+            for kind, list_key in (('activity', 'activities'), ('resource', 'resources')):
+                for item_key, item in self._keyed_items(section.get(list_key, []), kind, scope):
+                    old_items[item_key] = (kind, old_key, item)
         
-        old_resources_dict = {resource['title']: resource for resource in old_resources}
-        new_resources_dict = {resource['title']: resource for resource in new_resources}
-        
-        # Ressources ajoutées
-        for title, resource in new_resources_dict.items():
-            if title not in old_resources_dict:
-                changes.append({
-                    'type': 'resource_added',
-                    'resource_title': title,
-                    'message': f'Nouvelle ressource ajoutée: {title}',
-                    'details': self._get_resource_summary(resource)
-                })
-        
-        # Ressources supprimées
-        for title, resource in old_resources_dict.items():
-            if title not in new_resources_dict:
-                changes.append({
-                    'type': 'resource_removed',
-                    'resource_title': title,
-                    'message': f'Ressource supprimée: {title}',
-                    'details': self._get_resource_summary(resource)
-                })
-        
-        # Ressources modifiées
-        for title, new_resource in new_resources_dict.items():
-            if title in old_resources_dict:
-                old_resource = old_resources_dict[title]
-                resource_changes = self._compare_resource_content(old_resource, new_resource)
-                changes.extend(resource_changes)
+        for new_key, section in new_sections.items():
+            if new_key in unchanged:
+                continue
+            section_title = new_key[0]
+            for kind, list_key in (('activity', 'activities'), ('resource', 'resources')):
+                for item_key, item in self._keyed_items(section.get(list_key, []), kind, new_key):
+                    matched = old_items.pop(item_key, None)
+                    if matched is None:
+                        # Éléments d'une nouvelle section: couverts par section_added
+                        if new_key not in added_keys:
+                            changes.append(self._item_added(kind, item, section_title))
+                        continue
+                    old_item = matched[2]
+                    if same_hash(old_item, item):
+                        continue
+                    old_title = old_item.get('title', '')
+                    new_title = item.get('title', '')
+                    if old_title != new_title and self._is_significant_rename(old_title, new_title):
+                        changes.append(self._item_renamed(kind, old_item, item, section_title))
+                    if kind == 'activity':
+                        changes.extend(self._compare_activity_content(old_item, item, section_title))
+                    else:
+                        changes.extend(self._compare_resource_content(old_item, item, section_title))
+        
+        for kind, old_key, item in old_items.values():
+            # Éléments d'une section supprimée: couverts par section_removed
+            if old_key in section_map:
+                changes.append(self._item_removed(kind, item))
         
         return changes
     
-    def _compare_activity_content(self, old_activity: Dict, new_activity: Dict) -> List[Dict]:
+    def _ids(self, item: Dict) -> Dict:
+        """Identifiant Moodle de l'élément (cm_id) quand l'URL le fournit"""
+        cm_id = module_id(item.get('url', ''))
+        return {'cm_id': cm_id} if cm_id else {}
+    
+    def _item_added(self, kind: str, item: Dict, section_title: str) -> ChangeRecord:
+        fields = {f'{kind}_title': item.get('title', '')}
+        if kind == 'activity':
+            fields['activity_type'] = item.get('type', 'unknown')
+        return ChangeRecord(
+            f'{kind}_added', kind=kind, counts={'files': len(item.get('files', []))},
+            new_value=item.get('description', ''), section_title=section_title, **fields, **self._ids(item)
+        )
+    
+    def _item_removed(self, kind: str, item: Dict) -> ChangeRecord:
+        fields = {f'{kind}_title': item.get('title', '')}
+        if kind == 'activity':
+            fields['activity_type'] = item.get('type', 'unknown')
+        return ChangeRecord(
+            f'{kind}_removed', kind=kind, counts={'files': len(item.get('files', []))},
+            old_value=item.get('description', ''), **fields, **self._ids(item)
+        )
+    
+    def _item_renamed(self, kind: str, old_item: Dict, new_item: Dict, section_title: str) -> ChangeRecord:
+        old_title = old_item.get('title', '')
+        new_title = new_item.get('title', '')
+        return ChangeRecord(
+            f'{kind}_renamed', kind=kind, old_value=old_title, new_value=new_title,
+            old_title=old_title, new_title=new_title, section_title=section_title,
+            **{f'{kind}_title': new_title}, **self._ids(new_item)
+        )
+    
+    def _compare_activity_content(self, old_activity: Dict, new_activity: Dict, section_title: str = '') -> List[ChangeRecord]:
         """Comparer le contenu d'une activité"""
         changes = []
+        title = new_activity.get('title', '')
         
         # Comparer les fichiers
         old_files = old_activity.get('files', [])
         new_files = new_activity.get('files', [])
         
-        file_changes = self._compare_files(old_files, new_files, old_activity['title'])
+        file_changes = self._compare_files(old_files, new_files, title, section_title)
         changes.extend(file_changes)
         
         # Comparer la description
@@ -305,16 +367,14 @@ class ChangeDetector:
         new_desc = new_activity.get('description', '')
         
         if old_desc != new_desc:
-            changes.append({
-                'type': 'activity_description_changed',
-                'activity_title': old_activity['title'],
-                'message': f'Description modifiée pour l\'activité: {old_activity["title"]}',
-                'details': f'Ancienne: {old_desc[:100]}...\nNouvelle: {new_desc[:100]}...'
-            })
+            changes.append(ChangeRecord(
+                'activity_description_changed', kind='activity',
+                old_value=old_desc, new_value=new_desc, activity_title=title
+            ))
         
         return changes
     
-    def _compare_resource_content(self, old_resource: Dict, new_resource: Dict) -> List[Dict]:
+    def _compare_resource_content(self, old_resource: Dict, new_resource: Dict, section_title: str = '') -> List[ChangeRecord]:
         """Comparer le contenu d'une ressource"""
         changes = []
         
@@ -322,64 +382,72 @@ class ChangeDetector:
         old_files = old_resource.get('files', [])
         new_files = new_resource.get('files', [])
         
-        file_changes = self._compare_files(old_files, new_files, old_resource['title'])
+        file_changes = self._compare_files(old_files, new_files, new_resource.get('title', ''), section_title)
         changes.extend(file_changes)
         
         return changes
     
-    def _compare_files(self, old_files: List[Dict], new_files: List[Dict], parent_title: str) -> List[Dict]:
+    def _keyed_files(self, files: List[Dict]):
+        """(clé, révision, fichier): chemin pluginfile.php (hors révision) si disponible, sinon nom;
+        un rang distingue les doublons d'une même clé"""
+        seen = {}
+        for file in files:
+            parsed = pluginfile_key(file.get('url', ''))
+            if parsed:
+                base, revision = parsed
+            else:
+                base, revision = ('name', file.get('name', '')), None
+            rank = seen[base] = seen.get(base, -1) + 1
+            yield base + (rank,), revision, file
+    
+    def _compare_files(self, old_files: List[Dict], new_files: List[Dict], parent_title: str, section_title: str = '') -> List[ChangeRecord]:
         """Comparer les fichiers"""
         changes = []
         
-        old_files_dict = {file['name']: file for file in old_files}
-        new_files_dict = {file['name']: file for file in new_files}
-        
-        # Fichiers ajoutés
-        from datetime import datetime
-        for name, file in new_files_dict.items():
-            if name not in old_files_dict:
-                changes.append({
-                    'type': 'file_added',
-                    'file_name': name,
-                    'parent_title': parent_title,
-                    'file_url': file.get('url'),
-                    'file_date': datetime.now().isoformat(),
-                    'message': f'Nouveau fichier ajouté: {name}',
-                    'details': f"Dans: {parent_title}\nURL: {file.get('url', 'N/A')}\nPublié (détecté) : {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                })
+        old_index = {key: (revision, file) for key, revision, file in self._keyed_files(old_files)}
+        
+        now = datetime.now()
+        for key, revision, file in self._keyed_files(new_files):
+            name = file.get('name', '')
+            matched = old_index.pop(key, None)
+            # Fichiers ajoutés
+            if matched is None:
+                changes.append(ChangeRecord(
+                    'file_added', kind='file', file_name=name, parent_title=parent_title,
+                    section_title=section_title, file_url=file.get('url'), file_date=now.isoformat()
+                ))
+                continue
+            old_revision, old_file = matched
+            # Même fichier mais contenu différent: empreinte du web service Moodle,
+            # ou nouvelle révision dans le chemin pluginfile.php (fichier remplacé)
+            content_changed = file.get('contenthash') and old_file.get('contenthash') \
+                and file['contenthash'] != old_file['contenthash']
+            revision_changed = revision is not None and old_revision is not None and revision != old_revision
+            if content_changed or revision_changed:
+                changes.append(ChangeRecord(
+                    'file_updated', kind='file', old_value=old_file.get('url'), new_value=file.get('url'),
+                    file_name=name, parent_title=parent_title, section_title=section_title,
+                    file_url=file.get('url'), file_date=now.isoformat()
+                ))
         
         # Fichiers supprimés
-        for name, file in old_files_dict.items():
-            if name not in new_files_dict:
-                changes.append({
-                    'type': 'file_removed',
-                    'file_name': name,
-                    'parent_title': parent_title,
-                    'message': f'Fichier supprimé: {name}',
-                    'details': f'Dans: {parent_title}'
-                })
+        for _, file in old_index.values():
+            changes.append(ChangeRecord(
+                'file_removed', kind='file', file_name=file.get('name', ''), parent_title=parent_title
+            ))
         
         return changes
     
-    def _get_section_summary(self, section: Dict) -> str:
-        """Obtenir un résumé d'une section"""
-        activities_count = len(section.get('activities', []))
-        resources_count = len(section.get('resources', []))
-        return f"Activités: {activities_count}, Ressources: {resources_count}"
-    
-    def _get_activity_summary(self, activity: Dict) -> str:
-        """Obtenir un résumé d'une activité"""
-        files_count = len(activity.get('files', []))
-        desc = activity.get('description', '')
-        desc_preview = desc[:100] + '...' if len(desc) > 100 else desc
-        return f"Type: {activity.get('type', 'unknown')}, Fichiers: {files_count}\nDescription: {desc_preview}"
-    
-    def _get_resource_summary(self, resource: Dict) -> str:
-        """Obtenir un résumé d'une ressource"""
-        files_count = len(resource.get('files', []))
-        desc = resource.get('description', '')
-        desc_preview = desc[:100] + '...' if len(desc) > 100 else desc
-        return f"Fichiers: {files_count}\nDescription: {desc_preview}"
+    def _section_counts(self, section: Dict) -> Dict:
+        """Nombre d'activités, de ressources et de fichiers d'une section"""
+        activities = section.get('activities', [])
+        resources = section.get('resources', [])
+        return {
+            'activities': len(activities),
+            'resources': len(resources),
+            'files': sum(len(item.get('files', [])) for item in activities) +
+                     sum(len(item.get('files', [])) for item in resources)
+        }
     
     def _is_significant_rename(self, old_title: str, new_title: str) -> bool:
         """Vérifier si un renommage est significatif (pas juste cosmétique)"""
@@ -413,152 +481,56 @@ class ChangeDetector:
         
         return True
     
-    def _has_meaningful_content(self, section: Dict) -> bool:
-        """Vérifier si une section a du contenu significatif"""
-        activities = section.get('activities', [])
-        resources = section.get('resources', [])
-        
-        # Compter le contenu réel
-        total_items = len(activities) + len(resources)
-        total_files = 0
-        
-        for activity in activities:
-            total_files += len(activity.get('files', []))
-        for resource in resources:
-            total_files += len(resource.get('files', []))
-        
-        # Une section est significative si elle a des activités/ressources OU des fichiers
-        return total_items > 0 or total_files > 0
+    def _has_meaningful_content(self, counts: Dict) -> bool:
+        """Une section est significative si elle a des activités/ressources ou des fichiers"""
+        return counts.get('activities', 0) + counts.get('resources', 0) + counts.get('files', 0) > 0
     
-    def _filter_meaningful_changes(self, changes: List[Dict]) -> List[Dict]:
+    def _filter_meaningful_changes(self, changes: List[ChangeRecord]) -> List[ChangeRecord]:
         """Filtrer les changements pour ne garder que les vrais changements significatifs"""
         meaningful_changes = []
         
         for change in changes:
-            change_type = change.get('type', '')
+            change_type = change.type
             
-            # Toujours garder les ajouts de fichiers (vraies nouveautés)
-            if change_type == 'file_added':
+            # Toujours garder les ajouts/mises à jour de fichiers (vraies nouveautés)
+            # et les renommages significatifs
+            if change_type in ('file_added', 'file_updated', 'section_renamed', 'activity_renamed', 'resource_renamed'):
                 meaningful_changes.append(change)
-                continue
             
-            # Toujours garder les ajouts d'activités/ressources avec contenu
-            if change_type in ['activity_added', 'resource_added']:
-                if self._has_meaningful_activity_or_resource(change):
+            # Ajouts d'activités/ressources: seulement avec du contenu (fichiers ou description)
+            elif change_type in ('activity_added', 'resource_added'):
+                if change.counts.get('files', 0) > 0 or len((change.new_value or '').strip()) > _MIN_DESCRIPTION_LEN:
                     meaningful_changes.append(change)
-                continue
             
-            # Garder les ajouts de sections seulement si elles ont du contenu
-            if change_type == 'section_added':
-                if self._has_meaningful_content(change):
+            # Ajouts/suppressions de sections: seulement si elles ont (avaient) du contenu
+            elif change_type in ('section_added', 'section_removed'):
+                if self._has_meaningful_content(change.counts):
                     meaningful_changes.append(change)
-                continue
             
-            # Garder les suppressions seulement si elles avaient du contenu
-            if change_type in ['section_removed', 'activity_removed', 'resource_removed']:
-                if self._had_meaningful_content(change):
+            # Suppressions d'activités/ressources: seulement si elles avaient des fichiers
+            elif change_type in ('activity_removed', 'resource_removed'):
+                if change.counts.get('files', 0) > 0:
                     meaningful_changes.append(change)
-                continue
-            
-            # Garder les renommages significatifs
-            if change_type == 'section_renamed':
-                meaningful_changes.append(change)
-                continue
             
-            # Garder les modifications de descriptions seulement si c'est substantiel
-            if change_type == 'activity_description_changed':
-                if self._is_substantial_description_change(change):
+            # Modifications de descriptions: seulement si c'est substantiel
+            elif change_type == 'activity_description_changed':
+                if self._is_substantial_description_change(change.old_value or '', change.new_value or ''):
                     meaningful_changes.append(change)
-                continue
         
         return meaningful_changes
     
-    def _has_meaningful_activity_or_resource(self, change: Dict) -> bool:
-        """Vérifier si une activité ou ressource ajoutée a du contenu significatif"""
-        # Vérifier s'il y a des fichiers
-        if 'file_name' in change:
+    def _is_substantial_description_change(self, old_desc: str, new_desc: str) -> bool:
+        """Vérifier si un changement de description est substantiel"""
+        # Ignorer les changements de formatage HTML uniquement
+        old_clean = _HTML_TAG_RE.sub('', old_desc).strip()
+        new_clean = _HTML_TAG_RE.sub('', new_desc).strip()
+        if old_clean == new_clean:
+            return False
+        if not old_clean or not new_clean:
             return True
         
-        # Vérifier s'il y a une description substantielle
-        details = change.get('details', '')
-        if len(details) > 50:  # Description substantielle
+        # Changement significatif si similarité < 90% (bornes rapides avant le calcul complet)
+        matcher = difflib.SequenceMatcher(None, old_clean, new_clean)
+        if matcher.real_quick_ratio() < 0.9 or matcher.quick_ratio() < 0.9:
             return True
-        
-        return False
-    
-    def _had_meaningful_content(self, change: Dict) -> bool:
-        """Vérifier si une section/activité/ressource supprimée avait du contenu significatif"""
-        details = change.get('details', '')
-        
-        # Chercher des indicateurs de contenu dans les détails
-        if 'Fichiers:' in details:
-            try:
-                files_part = details.split('Fichiers:')[1].split('\n')[0]
-                files_count = int(files_part.split(',')[0])
-                if files_count > 0:
-                    return True
-            except:
-                pass
-        
-        # Chercher des activités/ressources
-        if 'Activités:' in details or 'Ressources:' in details:
-            try:
-                for part in details.split('\n'):
-                    if 'Activités:' in part or 'Ressources:' in part:
-                        count = int(part.split(':')[1].split(',')[0])
-                        if count > 0:
-                            return True
-            except:
-                pass
-        
-        return False
-    
-    def _is_substantial_description_change(self, change: Dict) -> bool:
-        """Vérifier si un changement de description est substantiel"""
-        details = change.get('details', '')
-        
-        # Extraire ancienne et nouvelle description
-        if 'Ancienne:' in details and 'Nouvelle:' in details:
-            try:
-                old_desc = details.split('Ancienne:')[1].split('Nouvelle:')[0].strip()
-                new_desc = details.split('Nouvelle:')[1].strip()
-                
-                # Ignorer les changements de formatage HTML uniquement
-                import re
-                old_clean = re.sub(r'<[^>]+>', '', old_desc)
-                new_clean = re.sub(r'<[^>]+>', '', new_desc)
-                
-                if old_clean.strip() == new_clean.strip():
-                    return False
-                
-                # Vérifier que le changement est substantiel (plus de 10 caractères différents)
-                if len(old_clean) > 0 and len(new_clean) > 0:
-                    ratio = difflib.SequenceMatcher(None, old_clean, new_clean).ratio()
-                    return ratio < 0.9  # Changement significatif si similarité < 90%
-                
-            except:
-                pass
-        
-        return True  # Par défaut, considérer comme substantiel si on ne peut pas analyser
-    
-    def _normalize_for_comparison(self, text: str) -> str:
-        """Normaliser un texte pour la comparaison de similarité"""
-        import re
-        import unicodedata
-        
-        # Normaliser les caractères Unicode (NFC)
-        text = unicodedata.normalize('NFC', text)
-        
-        # Convertir en minuscules
-        text = text.lower()
-        
-        # Supprimer les balises HTML
-        text = re.sub(r'<[^>]+>', '', text)
-        
-        # Normaliser les espaces
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        # Supprimer la ponctuation
-        text = re.sub(r'[^\w\s]', '', text)
-        
-        return text
\ No newline at end of file
+        return matcher.ratio() < 0.9
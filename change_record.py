@@ -0,0 +1,181 @@
+from collections.abc import Mapping
+from datetime import datetime
+
+class ChangeRecord(Mapping):
+    """Changement détecté, sous forme structurée.
+
+    Les champs historiques (type, activity_title, file_name, file_url...) restent
+    accessibles comme dans un dict (change['type'], change.get(...)); les données de
+    filtrage sont typées: `counts` (sections/activités/ressources/fichiers), `old_value`
+    et `new_value` (descriptions, titres). Les textes 'message' et 'details' ne sont
+    produits qu'à la première lecture, lors de la construction d'une notification ou de
+    la sauvegarde (to_dict).
+    """
+    __slots__ = ('type', 'kind', 'fields', 'counts', 'old_value', 'new_value', '_message', '_details')
+
+    def __init__(self, type: str, kind: str = None, counts: dict = None, old_value=None, new_value=None,
+                 message: str = None, details: str = None, **fields):
+        self.type = type
+        self.kind = kind
+        self.fields = fields
+        self.counts = counts or {}
+        self.old_value = old_value
+        self.new_value = new_value
+        self._message = message
+        self._details = details
+
+    # ===================== Textes (rendus à la demande) =====================
+    @property
+    def message(self) -> str:
+        if self._message is None:
+            self._render()
+        return self._message
+
+    @property
+    def details(self) -> str:
+        if self._details is None:
+            self._render()
+        return self._details
+
+    def _render(self):
+        message, details = _RENDERERS.get(self.type, _render_default)(self)
+        if self._message is None:
+            self._message = message
+        if self._details is None:
+            self._details = details
+
+    # ===================== Interface dict =====================
+    def __getitem__(self, key):
+        if key == 'type':
+            return self.type
+        if key == 'message':
+            return self.message
+        if key == 'details':
+            return self.details
+        return self.fields[key]
+
+    def __iter__(self):
+        yield 'type'
+        yield from self.fields
+        yield 'message'
+        yield 'details'
+
+    def __len__(self) -> int:
+        return len(self.fields) + 3
+
+    def to_dict(self) -> dict:
+        """Forme dict historique (journal des changements, Firestore)."""
+        return dict(self)
+
+    def __repr__(self):
+        return f"ChangeRecord({self.type!r}, {self.fields!r})"
+
+# ===================== Rendu des textes =====================
+def _preview(text: str) -> str:
+    text = text or ''
+    return text[:100] + '...' if len(text) > 100 else text
+
+def _detected_at(record) -> str:
+    try:
+        return datetime.fromisoformat(record.fields['file_date']).strftime('%d/%m/%Y %H:%M')
+    except Exception:
+        return datetime.now().strftime('%d/%m/%Y %H:%M')
+
+def _item_summary(record, description) -> str:
+    files = record.counts.get('files', 0)
+    if record.kind == 'activity':
+        return f"Type: {record.fields.get('activity_type', 'unknown')}, Fichiers: {files}\nDescription: {_preview(description)}"
+    return f"Fichiers: {files}\nDescription: {_preview(description)}"
+
+def _section_summary(counts: dict, prefix: str = '') -> str:
+    return f"Activités: {counts.get(prefix + 'activities', 0)}, Ressources: {counts.get(prefix + 'resources', 0)}"
+
+def _item_title(record) -> str:
+    return record.fields.get(f'{record.kind}_title', '')
+
+def _render_default(record):
+    return record.type, ''
+
+def _render_initial_scan_start(record):
+    return ('🔍 Premier scan complet du cours - Extraction de tout le contenu existant',
+            f"Nombre total de sections: {record.counts.get('sections', 0)}")
+
+def _render_initial_scan_complete(record):
+    total = record.counts.get('items', 0)
+    return (f'✅ Premier scan terminé - {total} éléments trouvés',
+            f"Le cours contient {record.counts.get('sections', 0)} sections avec {total} éléments au total")
+
+def _render_existing_section(record):
+    return f"📂 Section existante: {record.fields['section_title']}", _section_summary(record.counts)
+
+def _render_existing_item(record):
+    icon, label = ('📋', 'Activité') if record.kind == 'activity' else ('📚', 'Ressource')
+    return f'{icon} {label} existante: {_item_title(record)}', _item_summary(record, record.new_value)
+
+def _render_existing_file(record):
+    parent = "l'activité" if record.kind == 'activity' else 'la ressource'
+    return (f"📄 Fichier existant: {record.fields['file_name']}",
+            f"Dans {parent}: {record.fields['parent_title']} | Publié (détecté) : {_detected_at(record)}")
+
+def _render_section_renamed(record):
+    ratio = record.fields['similarity']
+    return (f"Section renommée: {record.old_value} ➜ {record.new_value}",
+            f"Similarité {ratio} | Ancien résumé: {_section_summary(record.counts, 'old_')} | "
+            f"Nouveau résumé: {_section_summary(record.counts)}")
+
+def _render_section_added(record):
+    return f"Nouvelle section ajoutée: {record.fields['section_title']}", _section_summary(record.counts)
+
+def _render_section_removed(record):
+    return f"Section supprimée: {record.fields['section_title']}", _section_summary(record.counts)
+
+def _render_item_added(record):
+    label = 'Nouvelle activité ajoutée' if record.kind == 'activity' else 'Nouvelle ressource ajoutée'
+    return f'{label}: {_item_title(record)}', _item_summary(record, record.new_value)
+
+def _render_item_removed(record):
+    label = 'Activité supprimée' if record.kind == 'activity' else 'Ressource supprimée'
+    return f'{label}: {_item_title(record)}', _item_summary(record, record.old_value)
+
+def _render_item_renamed(record):
+    label = 'Activité renommée' if record.kind == 'activity' else 'Ressource renommée'
+    return (f'{label}: {record.old_value} ➜ {record.new_value}',
+            f"Dans la section: {record.fields.get('section_title', '')}")
+
+def _render_description_changed(record):
+    return (f"Description modifiée pour l'activité: {record.fields['activity_title']}",
+            f'Ancienne: {(record.old_value or "")[:100]}...\nNouvelle: {(record.new_value or "")[:100]}...')
+
+def _render_file_added(record):
+    return (f"Nouveau fichier ajouté: {record.fields['file_name']}",
+            f"Dans: {record.fields['parent_title']}\nURL: {record.fields.get('file_url') or 'N/A'}\n"
+            f"Publié (détecté) : {_detected_at(record)}")
+
+def _render_file_updated(record):
+    return (f"Fichier mis à jour: {record.fields['file_name']}",
+            f"Dans: {record.fields['parent_title']}\nURL: {record.fields.get('file_url') or 'N/A'}")
+
+def _render_file_removed(record):
+    return f"Fichier supprimé: {record.fields['file_name']}", f"Dans: {record.fields['parent_title']}"
+
+_RENDERERS = {
+    'initial_scan_start': _render_initial_scan_start,
+    'initial_scan_complete': _render_initial_scan_complete,
+    'existing_section': _render_existing_section,
+    'existing_activity': _render_existing_item,
+    'existing_resource': _render_existing_item,
+    'existing_file': _render_existing_file,
+    'section_renamed': _render_section_renamed,
+    'section_added': _render_section_added,
+    'section_removed': _render_section_removed,
+    'activity_added': _render_item_added,
+    'resource_added': _render_item_added,
+    'activity_removed': _render_item_removed,
+    'resource_removed': _render_item_removed,
+    'activity_renamed': _render_item_renamed,
+    'resource_renamed': _render_item_renamed,
+    'activity_description_changed': _render_description_changed,
+    'file_added': _render_file_added,
+    'file_updated': _render_file_updated,
+    'file_removed': _render_file_removed,
+}
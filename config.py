@@ -15,6 +15,13 @@ class Config:
     TELEGRAM_API_ID = os.getenv('TELEGRAM_API_ID', '24358290')
     TELEGRAM_API_HASH = os.getenv('TELEGRAM_API_HASH', '847c2d71463d5940bc55648eb9241b51')
     TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')  # Optionnel: fixe directement le chat cible
+    # Webhook (servi par web_app.py): URL publique du service; vide = long polling
+    TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+    TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram/webhook')
+    # Jeton vérifié sur chaque requête du webhook (vide = dérivé du token du bot)
+    TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+    # Intervalle (s) de vérification de l'état du webhook avant repli sur le polling
+    TELEGRAM_WEBHOOK_CHECK_SECONDS = int(os.getenv('TELEGRAM_WEBHOOK_CHECK_SECONDS', '300'))
     
     # Configuration Firebase
     FIREBASE_CONFIG = {
@@ -38,6 +45,17 @@ class Config:
     SEND_FILES_AS_DOCUMENTS = os.getenv('SEND_FILES_AS_DOCUMENTS', 'false').lower() == 'true'
     # Délai (en secondes) entre messages individuels pour éviter le flood Telegram
     MESSAGE_DELAY_SECONDS = float(os.getenv('MESSAGE_DELAY_SECONDS', '0.4'))
+    # File d'envoi Telegram, aux limites documentées de l'API (indépendantes de MESSAGE_DELAY_SECONDS):
+    # débit global (~30 messages/s), par chat privé (~1/s), par groupe (20/min) et nouvelles tentatives
+    TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))
+    TELEGRAM_PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))
+    TELEGRAM_GROUP_CHAT_RATE = float(os.getenv('TELEGRAM_GROUP_CHAT_RATE', str(20 / 60)))
+    TELEGRAM_SEND_RETRIES = int(os.getenv('TELEGRAM_SEND_RETRIES', '3'))
+    # Commandes Telegram: handlers simultanés (tous chats), délai (s) après lequel un handler
+    # lent est annulé, et nombre d'update_id mémorisés contre les doublons
+    COMMAND_CONCURRENCY = int(os.getenv('COMMAND_CONCURRENCY', '8'))
+    COMMAND_TIMEOUT_SECONDS = float(os.getenv('COMMAND_TIMEOUT_SECONDS', '30'))
+    SEEN_UPDATES_WINDOW = int(os.getenv('SEEN_UPDATES_WINDOW', '1000'))
     # Niveau de détail du premier inventaire: 'full' (sections + activités + ressources + fichiers) ou 'summary'
     INITIAL_SCAN_DETAIL_LEVEL = os.getenv('INITIAL_SCAN_DETAIL_LEVEL', 'full')
     # Envoyer un message "pas de mise à jour" quand aucun changement détecté sur un cycle
@@ -49,7 +67,47 @@ class Config:
     COURSE_VERSIONING = os.getenv('COURSE_VERSIONING', 'true').lower() == 'true'
     # Cooldown minutes between manual /bigscan calls
     BIGSCAN_COOLDOWN_MINUTES = int(os.getenv('BIGSCAN_COOLDOWN_MINUTES', '30'))
-    
+    # Récupération concurrente des espaces: nombre total de récupérations simultanées,
+    # limite simultanée par hôte et intervalle minimal (s) entre deux requêtes sur un hôte
+    FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '8'))
+    FETCH_PER_HOST_LIMIT = int(os.getenv('FETCH_PER_HOST_LIMIT', '4'))
+    FETCH_HOST_MIN_INTERVAL = float(os.getenv('FETCH_HOST_MIN_INTERVAL', '0.2'))
+    # Taille du pool de threads pour les appels bloquants (réseau, Firestore);
+    # doit rester supérieure à FETCH_CONCURRENCY pour ne pas affamer Firestore pendant un scan
+    BLOCKING_POOL_SIZE = int(os.getenv('BLOCKING_POOL_SIZE', '16'))
+    # Taille maximale d'un fichier téléchargé (octets) et taille des blocs lus en flux
+    MAX_DOWNLOAD_BYTES = int(os.getenv('MAX_DOWNLOAD_BYTES', str(50 * 1024 * 1024)))
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', str(64 * 1024)))
+    # Pool de téléchargement (bigscan / nouveaux fichiers): téléchargements simultanés,
+    # limite par hôte, nombre de nouvelles tentatives et délai initial (s) doublé à chaque essai
+    DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '6'))
+    DOWNLOAD_PER_HOST_LIMIT = int(os.getenv('DOWNLOAD_PER_HOST_LIMIT', '4'))
+    DOWNLOAD_MAX_RETRIES = int(os.getenv('DOWNLOAD_MAX_RETRIES', '3'))
+    DOWNLOAD_RETRY_BACKOFF = float(os.getenv('DOWNLOAD_RETRY_BACKOFF', '1.0'))
+    # Envoi des documents: taille des groupes sendMediaGroup (10 max) et téléversements
+    # simultanés (voie 'bulk' de la file d'envoi Telegram, dont ils suivent le débit)
+    FILE_MEDIA_GROUP_SIZE = int(os.getenv('FILE_MEDIA_GROUP_SIZE', '10'))
+    FILE_SEND_CONCURRENCY = int(os.getenv('FILE_SEND_CONCURRENCY', '3'))
+    # Registre des fichiers déjà envoyés sur Telegram (par chat) et des file_id réutilisables
+    SENT_LEDGER_PATH = os.getenv('SENT_LEDGER_PATH', 'local_storage/sent_ledger.json')
+    # Cookies de session eLearning conservés entre redémarrages (évite une connexion complète à chaque relance)
+    SESSION_STATE_PATH = os.getenv('SESSION_STATE_PATH', 'local_storage/session_state.json')
+    # Source du contenu des cours: 'html' (scraping des pages) ou 'ws' (API REST Moodle core_course_get_contents)
+    CONTENT_SOURCE = os.getenv('CONTENT_SOURCE', 'html').lower()
+    # Jeton web service (vide = obtenu via /login/token.php avec les identifiants ci-dessus)
+    MOODLE_WS_TOKEN = os.getenv('MOODLE_WS_TOKEN', '')
+    MOODLE_WS_SERVICE = os.getenv('MOODLE_WS_SERVICE', 'moodle_mobile_app')
+    # Point d'accès REST (surchargeable, ex. serveur Moodle factice local pour les tests)
+    MOODLE_WS_URL = os.getenv('MOODLE_WS_URL', ELEARNING_URL + '/webservice/rest/server.php')
+    # Recherche approchée (/search ~terme): similarité minimale des trigrammes (0-1)
+    # et nombre maximal de mots du vocabulaire retenus par mot de la requête
+    SEARCH_FUZZY_THRESHOLD = float(os.getenv('SEARCH_FUZZY_THRESHOLD', '0.35'))
+    SEARCH_FUZZY_MAX_WORDS = int(os.getenv('SEARCH_FUZZY_MAX_WORDS', '50'))
+    # État de navigation des menus et pages inline: nombre d'entrées conservées (LRU)
+    # et durée de vie (s) sans utilisation
+    NAV_STATE_MAX_ENTRIES = int(os.getenv('NAV_STATE_MAX_ENTRIES', '500'))
+    NAV_STATE_TTL_SECONDS = int(os.getenv('NAV_STATE_TTL_SECONDS', str(24 * 3600)))
+
     # Espaces à surveiller
     MONITORED_SPACES = [
         {
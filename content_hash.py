@@ -0,0 +1,40 @@
+import hashlib
+import json
+
+# Empreintes de contenu (arbre de Merkle) attachées aux snapshots de cours:
+#   élément (activité/ressource) -> item['hash']: champs de l'élément, fichiers compris
+#   section -> section['hash']: titre + empreintes de ses éléments
+#   cours -> content['content_hash']: empreintes des sections
+# Deux sous-arbres de même empreinte sont identiques: le détecteur de changements
+# n'y descend pas. L'horodatage du snapshot n'entre pas dans le calcul.
+
+_CHILD_KEYS = ('activities', 'resources')
+
+def _digest(payload) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+def item_hash(item: dict) -> str:
+    return _digest({k: v for k, v in item.items() if k != 'hash'})
+
+def annotate(content: dict) -> str:
+    """Calculer et attacher les empreintes de tout le snapshot; renvoie l'empreinte du cours."""
+    section_hashes = []
+    for section in content.get('sections', []):
+        children = []
+        for key in _CHILD_KEYS:
+            hashes = []
+            for item in section.get(key, []):
+                item['hash'] = item_hash(item)
+                hashes.append(item['hash'])
+            children.append(hashes)
+        fields = {k: v for k, v in section.items() if k not in _CHILD_KEYS and k != 'hash'}
+        section['hash'] = _digest([fields, children])
+        section_hashes.append(section['hash'])
+    content['content_hash'] = _digest(section_hashes)
+    return content['content_hash']
+
+def same_hash(old: dict, new: dict, key: str = 'hash') -> bool:
+    """Vrai si les deux nœuds portent la même empreinte (faux si l'une manque: snapshot antérieur)."""
+    old_hash = old.get(key)
+    return old_hash is not None and old_hash == new.get(key)
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from config import Config
+
+class DownloadPool:
+    """Pool borné de téléchargements de fichiers.
+
+    Le scraper y soumet chaque fichier d'un cours puis attend les futures du cours.
+    Limite le nombre de téléchargements simultanés au total et par hôte, et
+    réessaie les échecs transitoires (exceptions) avec un délai exponentiel.
+    L'avancement (queued/done/failed) est transmis à on_progress s'il est défini.
+    """
+    def __init__(self, max_workers: int = None, per_host_limit: int = None,
+                 max_retries: int = None, backoff: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max(1, max_workers or Config.DOWNLOAD_WORKERS)
+        self.per_host_limit = max(1, per_host_limit or Config.DOWNLOAD_PER_HOST_LIMIT)
+        self.max_retries = Config.DOWNLOAD_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.DOWNLOAD_RETRY_BACKOFF if backoff is None else backoff
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='download')
+        self.on_progress = None  # callable(stats: dict) injecté par ELearningBot
+        self._lock = threading.Lock()
+        self._host_sems = {}
+        self.stats = {'queued': 0, 'done': 0, 'failed': 0}
+
+    def submit(self, url: str, func, *args, **kwargs):
+        """Planifier func(*args, **kwargs) pour l'URL donnée; retourne un Future."""
+        with self._lock:
+            self.stats['queued'] += 1
+        self._notify()
+        return self.pool.submit(self._run, url, func, args, kwargs)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'queued': 0, 'done': 0, 'failed': 0}
+        self._notify()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _host_sem(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            sem = self._host_sems.get(host)
+            if sem is None:
+                sem = self._host_sems[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return sem
+
+    def _run(self, url, func, args, kwargs):
+        sem = self._host_sem(url)
+        attempt = 0
+        while True:
+            try:
+                with sem:
+                    result = func(*args, **kwargs)
+                self._finish(result is not None)
+                return result
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.logger.warning(f"Téléchargement abandonné après {attempt} tentatives {url}: {e}")
+                    self._finish(False)
+                    return None
+                # Attente hors sémaphore pour laisser l'hôte aux autres téléchargements
+                delay = self.backoff * (2 ** (attempt - 1))
+                self.logger.info(f"Téléchargement {url} en échec ({e}), nouvel essai dans {delay:.1f}s")
+                time.sleep(delay)
+
+    def _finish(self, ok: bool):
+        with self._lock:
+            self.stats['done' if ok else 'failed'] += 1
+        self._notify()
+
+    def _notify(self):
+        if self.on_progress:
+            try:
+                with self._lock:
+                    snapshot = dict(self.stats)
+                self.on_progress(snapshot)
+            except Exception as e:
+                self.logger.debug(f"Callback progression téléchargements: {e}")
@@ -1,9 +1,29 @@
 import requests
 from bs4 import BeautifulSoup
+import hashlib
+import json
+import re
 import time
 import logging
+import os
+import threading
+from concurrent.futures import wait
 from urllib.parse import urljoin
 from config import Config
+from fetch_engine import AsyncFetchEngine
+from download_pool import DownloadPool
+import content_hash
+from snapshot_model import CourseSnapshot
+from moodle_ws_source import MoodleWebServiceSource
+from blob_store import file_revision
+
+# Fragments volatils d'une page Moodle (jetons de session, identifiants YUI générés)
+# ignorés pour l'empreinte de la zone utile
+_VOLATILE_HTML_RE = re.compile(r'sesskey["=:\s]+\w+|yui_[\w]+')
+
+def _files_signature(files) -> tuple:
+    """Liste (nom, URL) comparable des fichiers d'un dossier."""
+    return tuple((f.get('name'), f.get('url')) for f in files)
 
 class ELearningScraper:
     def __init__(self):
@@ -13,10 +33,39 @@ class ELearningScraper:
             'Accept-Language': 'fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
         })
+        # Pool de connexions dimensionné pour les récupérations et téléchargements concurrents
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=4, pool_maxsize=max(10, Config.FETCH_CONCURRENCY + Config.DOWNLOAD_WORKERS)
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.fetch_engine = AsyncFetchEngine()
+        self.download_pool = DownloadPool()
+        # Une seule connexion à la fois lorsque plusieurs cours sont récupérés en parallèle;
+        # la génération s'incrémente à chaque tentative pour que les récupérations concurrentes
+        # qui tombent sur /login/ partagent la même reconnexion
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
         self.logger = logging.getLogger(__name__)
         self.logged_in = False
         self.enable_file_download = Config.SEND_FILES_AS_DOCUMENTS  # réutiliser le flag
         self.firebase_mgr = None  # sera injecté si besoin
+        # Cache par URL de cours: validateurs HTTP (ETag/Last-Modified), empreinte de la zone
+        # utile, dernier snapshot analysé et empreinte des dossiers:
+        # {url: {'etag','last_modified','body_hash','snapshot','folders'}}
+        self._page_cache = {}
+        # Entrées en attente: reportées dans _page_cache par commit_page() une fois le
+        # snapshot sauvegardé (un échec de sauvegarde fait réanalyser la page au cycle suivant)
+        self._pending_pages = {}
+        # Cours dont la dernière récupération a réutilisé le snapshot précédent (page identique)
+        self.unchanged_courses = set()
+        # Cache des pages de dossier: {folder_url: {'files','etag','last_modified','body_hash'}}
+        self._folder_cache = {}
+        # Mémo du cycle courant: une même URL de dossier n'est jamais récupérée deux fois par cycle
+        self._folder_cycle_memo = {}
+        self._folder_lock = threading.Lock()
+        # Source alternative: API REST Moodle au lieu du scraping HTML (CONTENT_SOURCE=ws)
+        self.ws_source = MoodleWebServiceSource(self.session) if Config.CONTENT_SOURCE == 'ws' else None
         
     def login(self) -> bool:
         """Se connecter à la plateforme eLearning via HTTP (sans Chrome)."""
@@ -43,13 +92,10 @@ class ELearningScraper:
             # 3) Vérifier la réussite de la connexion
             #    - Présence du cookie MoodleSession
             #    - Absence d'un message d'erreur de login
-            #    - Présence du menu utilisateur sur la page d'accueil
+            #    - Présence du menu utilisateur sur la page d'arrivée (redirection après POST)
             has_session_cookie = any(c.name.lower().startswith('moodlesession') for c in self.session.cookies)
 
-            # Vérification contenu après login
-            home_resp = self.session.get(Config.ELEARNING_URL, timeout=20)
-            home_resp.raise_for_status()
-            home_soup = BeautifulSoup(home_resp.text, 'lxml')
+            home_soup = BeautifulSoup(post_resp.text, 'lxml')
 
             login_error = home_soup.select_one('.loginerrors, #loginerrormessage, .alert-danger')
             user_menu = home_soup.select_one('.usermenu, .user-menu, [data-region="user-menu"]')
@@ -68,6 +114,7 @@ class ELearningScraper:
                     f"Connexion eLearning réussie{' en tant que ' + user_name if user_name else ''}"
                 )
                 self.logged_in = True
+                self._save_session_state()
                 return True
 
             # Si nous arrivons ici, la connexion semble échouée
@@ -78,39 +125,114 @@ class ELearningScraper:
             self.logger.error(f"Erreur lors de la connexion: {str(e)}")
             return False
     
+    def _relogin(self, generation: int) -> bool:
+        """Reconnexion unique: les récupérations concurrentes qui ont vu la page de login
+        depuis la même génération attendent et réutilisent le résultat d'une seule connexion."""
+        with self._login_lock:
+            if self._login_generation != generation:
+                return self.logged_in
+            self.logged_in = False
+            ok = self.login()
+            self._login_generation += 1
+            return ok
+
+    # ===================== Session persistante =====================
+    def restore_session(self) -> bool:
+        """Recharger les cookies sauvegardés et vérifier la session par une requête légère."""
+        path = Config.SESSION_STATE_PATH
+        try:
+            if not os.path.exists(path):
+                return False
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            for c in state.get('cookies', []):
+                self.session.cookies.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'))
+            # /my/ redirige vers /login/ si la session n'est plus valide; pas de suivi de redirection
+            resp = self.session.get(urljoin(Config.ELEARNING_URL, '/my/'), timeout=15, allow_redirects=False)
+            if resp.status_code == 200:
+                self.logged_in = True
+                self.logger.info("Session eLearning restaurée depuis le disque")
+                return True
+            self.logger.info("Session sauvegardée expirée: reconnexion à la demande")
+            self.session.cookies.clear()
+            return False
+        except Exception as e:
+            self.logger.warning(f"Restauration de session impossible: {e}")
+            return False
+
+    def _save_session_state(self):
+        """Sauvegarder les cookies de session (écriture atomique)."""
+        path = Config.SESSION_STATE_PATH
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            state = {
+                'saved_at': time.time(),
+                'cookies': [
+                    {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path}
+                    for c in self.session.cookies
+                ]
+            }
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.warning(f"Sauvegarde de session impossible: {e}")
+
     def get_course_content(self, course_url: str, course_id: str):
         """Récupérer le contenu d'un cours spécifique via HTTP."""
         max_retries = 3
         retry_count = 0
 
+        self.unchanged_courses.discard(course_id)
+        self._pending_pages.pop(course_id, None)
+        # Pas de court-circuit quand les fichiers doivent être téléchargés (bigscan)
+        cached = None if self.enable_file_download else self._page_cache.get(course_url)
+
+        if self.ws_source:
+            return self._get_course_content_ws(course_url, course_id, cached)
+
         while retry_count < max_retries:
             try:
+                generation = self._login_generation
                 # 1) Essayer d'abord en anonyme (beaucoup d'espaces d'affichage sont publics)
-                resp = self.session.get(course_url, timeout=25, allow_redirects=True)
+                resp = self.session.get(course_url, timeout=25, allow_redirects=True,
+                                        headers=self._conditional_headers(cached))
+                if resp.status_code == 304 and cached:
+                    if self._folders_unchanged(cached):
+                        return self._reuse_snapshot(course_id, cached)
+                    # Un dossier a changé sans modifier la page du cours: la réanalyser
+                    cached = None
+                    resp = self.session.get(course_url, timeout=25, allow_redirects=True)
                 resp.raise_for_status()
 
                 # Si redirigé vers la page de login, réessayer login
                 if '/login/' in resp.url:
                     self.logger.info("Authentification requise. Tentative de connexion...")
-                    if not self.logged_in:
-                        if not self.login():
-                            return None
-                        # Récupérer à nouveau la page du cours après login
-                        resp = self.session.get(course_url, timeout=25, allow_redirects=True)
-                        resp.raise_for_status()
+                    if not self._relogin(generation):
+                        return None
+                    # Récupérer à nouveau la page du cours après login
+                    resp = self.session.get(course_url, timeout=25, allow_redirects=True)
+                    resp.raise_for_status()
+
+                # Page identique au dernier passage: réutiliser le snapshot sans parsing
+                body_hash = self._region_hash(resp.text)
+                if cached and cached.get('body_hash') == body_hash and self._folders_unchanged(cached):
+                    self._remember_page(course_id, course_url, resp, body_hash, cached['snapshot'])
+                    return self._reuse_snapshot(course_id, cached)
 
                 soup = BeautifulSoup(resp.text, 'lxml')
 
                 # Détection de login forcé dans le contenu
                 if soup.select_one('form#login, form[action*="/login/"]'):
                     self.logger.info("Page de connexion détectée sur le cours. Tentative de connexion...")
-                    if not self.logged_in:
-                        if not self.login():
-                            return None
-                        # Récupérer à nouveau la page du cours après login
-                        resp = self.session.get(course_url, timeout=25, allow_redirects=True)
-                        resp.raise_for_status()
-                        soup = BeautifulSoup(resp.text, 'lxml')
+                    if not self._relogin(generation):
+                        return None
+                    # Récupérer à nouveau la page du cours après login
+                    resp = self.session.get(course_url, timeout=25, allow_redirects=True)
+                    resp.raise_for_status()
+                    body_hash = self._region_hash(resp.text)
+                    soup = BeautifulSoup(resp.text, 'lxml')
 
                 content = {
                     'course_id': course_id,
@@ -140,12 +262,18 @@ class ELearningScraper:
                         )
                         continue
 
+                # Empreintes par élément/section/cours (comparaison descendante du détecteur)
+                content_hash.annotate(content)
+
                 # Option: télécharger les fichiers référencés
                 if self.enable_file_download and self.firebase_mgr:
                     self._download_all_files(course_id, content)
 
-                self.logger.info(f"Contenu récupéré pour le cours {course_id}: {len(content['sections'])} sections")
-                return content
+                # Forme compacte gardée en cache et renvoyée (le dict brut n'est pas conservé)
+                snapshot = CourseSnapshot.from_dict(content)
+                self._remember_page(course_id, course_url, resp, body_hash, snapshot)
+                self.logger.info(f"Contenu récupéré pour le cours {course_id}: {snapshot.counts['sections']} sections")
+                return snapshot
 
             except Exception as e:
                 retry_count += 1
@@ -162,6 +290,107 @@ class ELearningScraper:
 
         return None
     
+    def _get_course_content_ws(self, course_url: str, course_id: str, cached):
+        """Récupérer le contenu d'un cours via core_course_get_contents (même format que le HTML)."""
+        max_retries = 3
+        retry_count = 0
+
+        while retry_count < max_retries:
+            try:
+                raw = self.ws_source.call_raw('core_course_get_contents', courseid=course_id)
+                sections_json = self.ws_source.check_response(json.loads(raw))
+
+                # Réponse JSON identique au dernier passage: réutiliser le snapshot
+                # (le contenu des dossiers fait partie de la réponse du web service)
+                body_hash = hashlib.sha1(raw.encode('utf-8', 'ignore')).hexdigest()
+                if cached and cached.get('body_hash') == body_hash:
+                    return self._reuse_snapshot(course_id, cached)
+
+                content = self.ws_source.build_content(course_url, course_id, sections_json)
+                content_hash.annotate(content)
+
+                if self.enable_file_download and self.firebase_mgr:
+                    self._download_all_files(course_id, content)
+
+                snapshot = CourseSnapshot.from_dict(content)
+                self._remember_page(course_id, course_url, None, body_hash, snapshot)
+                self.logger.info(f"Contenu récupéré (web service) pour le cours {course_id}: {snapshot.counts['sections']} sections")
+                return snapshot
+
+            except Exception as e:
+                retry_count += 1
+                self.logger.warning(
+                    f"Tentative {retry_count}/{max_retries} (web service) échouée pour le cours {course_id}: {str(e)}"
+                )
+                if retry_count < max_retries:
+                    time.sleep(2)
+                else:
+                    self.logger.error(
+                        f"Échec définitif pour le cours {course_id} après {max_retries} tentatives"
+                    )
+                    return None
+
+        return None
+
+    # ===================== Requêtes conditionnelles =====================
+    def _conditional_headers(self, cached) -> dict:
+        """En-têtes If-None-Match / If-Modified-Since à partir du cache de la page."""
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def _region_hash(self, html: str) -> str:
+        """Empreinte de la zone de contenu du cours, sans les jetons volatils de la page."""
+        start = html.find('course-content')
+        region = html[start:] if start != -1 else html
+        end = region.find('id="page-footer"')
+        if end != -1:
+            region = region[:end]
+        region = _VOLATILE_HTML_RE.sub('', region)
+        return hashlib.sha1(region.encode('utf-8', 'ignore')).hexdigest()
+
+    def _remember_page(self, course_id: str, course_url: str, resp, body_hash: str, snapshot):
+        """Préparer l'entrée de cache de la page; effective seulement après commit_page()."""
+        headers = resp.headers if resp is not None else {}
+        self._pending_pages[course_id] = (course_url, {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'body_hash': body_hash,
+            'snapshot': snapshot,
+            'folders': self._folder_signatures(snapshot)
+        })
+
+    def commit_page(self, course_id: str):
+        """Valider le cache de la page d'un cours, une fois son snapshot sauvegardé."""
+        pending = self._pending_pages.pop(course_id, None)
+        if pending:
+            course_url, entry = pending
+            self._page_cache[course_url] = entry
+
+    def _folder_signatures(self, snapshot) -> dict:
+        """{url de dossier: fichiers} des dossiers du snapshot, d'après le mémo du cycle."""
+        with self._folder_lock:
+            memo = dict(self._folder_cycle_memo)
+        return {item.url: _files_signature(memo[item.url]) for _, _, item in snapshot.iter_items()
+                if item.type == 'folder' and item.url in memo}
+
+    def _folders_unchanged(self, cached: dict) -> bool:
+        """Revalider les dossiers d'une page inchangée (un ajout dans un dossier ne modifie pas la page)."""
+        for folder_url, signature in cached.get('folders', {}).items():
+            if _files_signature(self._extract_folder_files(folder_url)) != signature:
+                self.logger.info(f"Dossier modifié {folder_url}: page du cours réanalysée")
+                return False
+        return True
+
+    def _reuse_snapshot(self, course_id: str, cached: dict):
+        self.unchanged_courses.add(course_id)
+        self.logger.info(f"Cours {course_id} inchangé: snapshot précédent réutilisé")
+        return cached['snapshot']
+
     def _select_sections(self, soup: BeautifulSoup):
         """Sélectionner les blocs de section de manière robuste (Moodle varie selon le thème)."""
         # Essayer différents sélecteurs courants
@@ -280,76 +509,144 @@ class ELearningScraper:
             self.logger.error(f"Erreur lors de l'extraction des données d'activité: {str(e)}")
             return None
     
-    def get_all_courses_content(self):
-        """Récupérer le contenu de tous les cours surveillés (HTTP)."""
+    async def get_all_courses_content_async(self):
+        """Récupérer le contenu de tous les cours surveillés en parallèle (concurrence bornée)."""
         all_content = {}
         successful_scans = 0
         failed_scans = 0
-
-        self.logger.info(f"Début du scan de {len(Config.MONITORED_SPACES)} espaces d'affichage")
-
-        for i, space in enumerate(Config.MONITORED_SPACES, 1):
-            self.logger.info(f"[{i}/{len(Config.MONITORED_SPACES)}] Récupération du contenu pour: {space['name']}")
-
-            try:
-                content = self.get_course_content(space['url'], space['id'])
-                if content:
-                    all_content[space['id']] = content
-                    successful_scans += 1
-                    self.logger.info(f"✅ Succès pour: {space['name']}")
-                else:
-                    failed_scans += 1
-                    self.logger.error(f"❌ Échec pour: {space['name']}")
-            except Exception as e:
+        spaces = Config.MONITORED_SPACES
+
+        self.logger.info(f"Début du scan de {len(spaces)} espaces d'affichage")
+        # Nouveau cycle: oublier le mémo des dossiers (le cache des dossiers est conservé pour les requêtes conditionnelles)
+        with self._folder_lock:
+            self._folder_cycle_memo = {}
+
+        results = await self.fetch_engine.fetch_all(
+            [(space['id'], space['url']) for space in spaces],
+            lambda url, course_id: self.get_course_content(url, course_id)
+        )
+
+        # Conserver l'ordre de MONITORED_SPACES dans le dict retourné
+        for space in spaces:
+            content = results.get(space['id'])
+            if isinstance(content, Exception):
                 failed_scans += 1
-                self.logger.error(f"❌ Erreur pour {space['name']}: {str(e)}")
-
-            # Pause entre les requêtes pour éviter la surcharge
-            time.sleep(1.5)
+                self.logger.error(f"❌ Erreur pour {space['name']}: {str(content)}")
+            elif content:
+                all_content[space['id']] = content
+                successful_scans += 1
+                self.logger.info(f"✅ Succès pour: {space['name']}")
+            else:
+                failed_scans += 1
+                self.logger.error(f"❌ Échec pour: {space['name']}")
 
         self.logger.info(f"Scan terminé: {successful_scans} succès, {failed_scans} échecs")
         return all_content
-    
+
     def close(self):
-        """Aucune ressource à fermer pour HTTP; méthode pour compat."""
-        # La session HTTP peut être réutilisée; on ne la ferme pas explicitement
-        return
+        """Arrêter le pool de téléchargement; la session HTTP n'est pas fermée explicitement."""
+        self.download_pool.shutdown()
 
     # ===================== Téléchargement de fichiers helper =====================
     def _download_all_files(self, course_id: str, content: dict):
+        """Télécharger tous les fichiers référencés par le contenu du cours."""
+        files = []
+        for section in content.get('sections', []):
+            stitle = section.get('title','')
+            for item in section.get('activities', []) + section.get('resources', []):
+                for f in item.get('files', []):
+                    files.append((f.get('url',''), stitle, item.get('title',''), file_revision(f)))
+        self.download_files(course_id, files)
+
+    def download_files(self, course_id: str, files: list) -> list:
+        """Télécharger via le pool les fichiers [(url, titre section, titre parent, révision)] et attendre la fin.
+
+        Retourne les chemins locaux obtenus (fichiers en échec ou ignorés exclus).
+        L'index des blobs est écrit une fois pour le lot.
+        """
         try:
             if not self.firebase_mgr:
-                return
-            sections = content.get('sections', [])
-            for section in sections:
-                stitle = section.get('title','')
-                for act in section.get('activities', []):
-                    for f in act.get('files', []):
-                        self.firebase_mgr.download_file(self.session, f.get('url',''), course_id, stitle, act.get('title',''))
-                for res in section.get('resources', []):
-                    for f in res.get('files', []):
-                        self.firebase_mgr.download_file(self.session, f.get('url',''), course_id, stitle, res.get('title',''))
+                return []
+            futures = []
+            for file_url, stitle, parent_title, revision in files:
+                url = self._download_url(file_url)
+                if not url:
+                    continue
+                futures.append(self.download_pool.submit(
+                    url, self.firebase_mgr.download_file, self.session, url, course_id, stitle,
+                    parent_title, raise_on_error=True, revision=revision
+                ))
+            # Le cours n'est terminé (et ses fichiers envoyables) qu'une fois tous ses fichiers traités
+            wait(futures)
+            return [fut.result() for fut in futures if fut.result()]
         except Exception as e:
             self.logger.warning(f"Erreur download fichiers cours {course_id}: {e}")
+            return []
+        finally:
+            if self.firebase_mgr:
+                self.firebase_mgr.blob_store.flush()
+
+    def _download_url(self, file_url: str) -> str:
+        """URL effective de téléchargement (jeton web service en mode CONTENT_SOURCE=ws)."""
+        if self.ws_source and file_url:
+            return self.ws_source.download_url(file_url)
+        return file_url
 
     # ===================== Extraction fichiers dossier =====================
     def _extract_folder_files(self, folder_url: str):
-        """Ouvrir la page d'un dossier Moodle et récupérer les liens de fichiers internes."""
+        """Récupérer les fichiers internes d'un dossier Moodle.
+
+        Une requête par dossier et par cycle (mémo du cycle): conditionnelle si le serveur
+        fournit ETag/Last-Modified, sinon la page est relue et son empreinte évite le parsing
+        quand elle n'a pas changé (mod/folder/view.php n'envoie aucun validateur).
+        """
+        with self._folder_lock:
+            files = self._folder_cycle_memo.get(folder_url)
+            cached = self._folder_cache.get(folder_url)
+        if files is None:
+            files = self._fetch_folder_files(folder_url, cached)
+            with self._folder_lock:
+                self._folder_cycle_memo[folder_url] = files
+        # Copies: les entrées sont rattachées aux snapshots des activités
+        return [dict(f) for f in files]
+
+    def _fetch_folder_files(self, folder_url: str, cached):
+        """Ouvrir la page d'un dossier (requête conditionnelle) et mettre à jour le cache."""
         try:
-            resp = self.session.get(folder_url, timeout=25)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'lxml')
-            files = []
-            for a in soup.select('a[href]'):
-                href = a.get('href','')
-                label = a.get_text(strip=True)
-                if not href:
-                    continue
-                if 'pluginfile.php' in href or any(href.lower().endswith(ext) for ext in [
-                    '.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx', '.zip', '.rar', '.txt'
-                ]):
-                    files.append({'name': label or href.split('/')[-1], 'url': urljoin(Config.ELEARNING_URL, href)})
+            resp = self.session.get(folder_url, timeout=25, headers=self._conditional_headers(cached))
+            if resp.status_code == 304 and cached:
+                files, body_hash = cached['files'], cached.get('body_hash')
+            else:
+                resp.raise_for_status()
+                body_hash = self._region_hash(resp.text)
+                if cached and cached.get('body_hash') == body_hash:
+                    files = cached['files']
+                else:
+                    files = self._parse_folder_files(resp.text)
+            with self._folder_lock:
+                self._folder_cache[folder_url] = {
+                    'files': files,
+                    'etag': resp.headers.get('ETag') or (cached or {}).get('etag'),
+                    'last_modified': resp.headers.get('Last-Modified') or (cached or {}).get('last_modified'),
+                    'body_hash': body_hash
+                }
             return files
         except Exception as e:
             self.logger.warning(f"_extract_folder_files erreur {folder_url}: {e}")
-            return []
\ No newline at end of file
+            # Préférer le dernier contenu connu à une liste vide (évite de fausses suppressions)
+            return cached['files'] if cached else []
+
+    def _parse_folder_files(self, html: str):
+        """Extraire les liens de fichiers d'une page de dossier Moodle."""
+        soup = BeautifulSoup(html, 'lxml')
+        files = []
+        for a in soup.select('a[href]'):
+            href = a.get('href','')
+            label = a.get_text(strip=True)
+            if not href:
+                continue
+            if 'pluginfile.php' in href or any(href.lower().endswith(ext) for ext in [
+                '.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx', '.zip', '.rar', '.txt'
+            ]):
+                files.append({'name': label or href.split('/')[-1], 'url': urljoin(Config.ELEARNING_URL, href)})
+        return files
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlparse
+from config import Config
+
+class AsyncFetchEngine:
+    """Moteur de récupération concurrente des espaces d'affichage.
+
+    Lance les récupérations en parallèle (concurrence globale bornée) tout en
+    respectant une limite de politesse par hôte: nombre de requêtes simultanées
+    et intervalle minimal entre deux démarrages de requête sur le même hôte.
+    La fonction de récupération fournie est bloquante (requests) et s'exécute
+    hors de la boucle d'évènements (pool BlockingExecutor si injecté).
+    """
+    def __init__(self, max_concurrency: int = None, per_host_limit: int = None, host_min_interval: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.executor = None  # BlockingExecutor injecté par ELearningBot
+        self.max_concurrency = max(1, max_concurrency or Config.FETCH_CONCURRENCY)
+        self.per_host_limit = max(1, per_host_limit or Config.FETCH_PER_HOST_LIMIT)
+        self.host_min_interval = Config.FETCH_HOST_MIN_INTERVAL if host_min_interval is None else host_min_interval
+
+    async def fetch_all(self, jobs, fetch):
+        """Exécuter fetch(url, key) pour chaque (key, url) de jobs.
+
+        Retourne un dict {key: résultat}; une exception levée par fetch est
+        retournée telle quelle comme résultat pour que l'appelant la journalise.
+        """
+        global_sem = asyncio.Semaphore(self.max_concurrency)
+        host_sems = {}
+        host_locks = {}
+        host_last_start = {}
+
+        async def _respect_interval(host):
+            lock = host_locks.setdefault(host, asyncio.Lock())
+            async with lock:
+                wait = host_last_start.get(host, 0) + self.host_min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                host_last_start[host] = time.monotonic()
+
+        async def _one(key, url):
+            host = urlparse(url).netloc
+            host_sem = host_sems.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+            async with global_sem:
+                async with host_sem:
+                    await _respect_interval(host)
+                    if self.executor:
+                        return await self.executor.run(fetch, url, key)
+                    return await asyncio.to_thread(fetch, url, key)
+
+        keys = [key for key, _ in jobs]
+        results = await asyncio.gather(*(_one(key, url) for key, url in jobs), return_exceptions=True)
+        return dict(zip(keys, results))
@@ -5,6 +5,7 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from google.auth.exceptions import DefaultCredentialsError
 from config import Config
+from blob_store import BlobStore
 
 class FirebaseManager:
     """Gestionnaire de persistance.
@@ -18,6 +19,8 @@ class FirebaseManager:
         self.provider = Config.DB_PROVIDER
         self.download_root = 'downloads'
         os.makedirs(self.download_root, exist_ok=True)
+        # Fichiers stockés une seule fois par contenu, référencés par cours
+        self.blob_store = BlobStore(os.path.join(self.download_root, '_blobs'))
         if self.provider == 'firebase':
             self._initialize_firebase()
         elif self.provider == 'supabase':
@@ -63,6 +66,9 @@ class FirebaseManager:
           subcollection: versions (historique si versioning)
         """
         try:
+            # Snapshot compact (CourseSnapshot) -> format dict stocké
+            if hasattr(content, 'to_dict'):
+                content = content.to_dict()
             if self.provider == 'supabase':
                 return self._save_supabase_course(course_id, content)
             if self.db:
@@ -110,6 +116,8 @@ class FirebaseManager:
         """Sauvegarder un lot de changements (avec déduplication basique) sous courses/{course_id}/changes."""
         try:
             import hashlib, json as _json
+            # ChangeRecord -> dict (textes rendus ici au plus tard)
+            changes = [ch.to_dict() if hasattr(ch, 'to_dict') else ch for ch in changes]
             payload = _json.dumps(changes, sort_keys=True, ensure_ascii=False)
             digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()
             if self._is_duplicate_change_hash(course_id, digest):
@@ -256,8 +264,15 @@ class FirebaseManager:
             return False
 
     # ===================== Téléchargement de fichiers =====================
-    def download_file(self, session, file_url: str, course_id: str, section_title: str = '', parent_title: str = ''):
-        """Télécharger un fichier et le stocker localement. Retourne le chemin ou None."""
+    def download_file(self, session, file_url: str, course_id: str, section_title: str = '', parent_title: str = '',
+                      raise_on_error: bool = False, revision: str = None):
+        """Télécharger un fichier et le stocker localement. Retourne le chemin ou None.
+
+        raise_on_error: propager les erreurs transitoires (réseau, 5xx, 429) pour qu'un
+        appelant (DownloadPool) puisse réessayer.
+        revision: révision connue du fichier (blob_store.file_revision); une URL déjà
+        téléchargée dans une autre révision est téléchargée à nouveau.
+        """
         try:
             import re
             import hashlib
@@ -270,20 +285,51 @@ class FirebaseManager:
             h = hashlib.sha1(file_url.encode('utf-8')).hexdigest()[:8]
             filename = f"{safe_parent}_{h}_{name_part}"[:120]
             path = os.path.join(course_folder, filename)
-            if os.path.exists(path):
-                return path  # déjà téléchargé
-            resp = session.get(file_url, timeout=40)
-            if resp.status_code != 200 or not resp.content:
-                self.logger.warning(f"Téléchargement échoué {file_url} -> status {resp.status_code}")
-                return None
-            # Taille limite 50MB
-            if len(resp.content) > 50 * 1024 * 1024:
-                self.logger.warning(f"Fichier ignoré (taille >50MB): {file_url}")
-                return None
-            with open(path, 'wb') as f:
-                f.write(resp.content)
-            return path
+            # URL déjà téléchargée (ce chemin ou un autre cours/section): simple référence au blob
+            digest = self.blob_store.lookup_url(file_url, revision)
+            if digest:
+                return self.blob_store.link(digest, path)
+            max_bytes = Config.MAX_DOWNLOAD_BYTES
+            # Téléchargement en flux: mémoire bornée par la taille d'un bloc
+            with session.get(file_url, timeout=40, stream=True) as resp:
+                if resp.status_code != 200:
+                    if raise_on_error and (resp.status_code >= 500 or resp.status_code == 429):
+                        raise IOError(f"status {resp.status_code}")
+                    self.logger.warning(f"Téléchargement échoué {file_url} -> status {resp.status_code}")
+                    return None
+                # Rejet immédiat si la taille annoncée dépasse la limite
+                announced = resp.headers.get('Content-Length')
+                if announced and announced.isdigit() and int(announced) > max_bytes:
+                    self.logger.warning(f"Fichier ignoré (taille annoncée {int(announced)} > {max_bytes} octets): {file_url}")
+                    return None
+                tmp_path = self.blob_store.new_temp_path()
+                hasher = self.blob_store.new_hasher()
+                written = 0
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in resp.iter_content(chunk_size=Config.DOWNLOAD_CHUNK_SIZE):
+                            if not chunk:
+                                continue
+                            written += len(chunk)
+                            # Taille absente ou fausse: arrêter dès que la limite est franchie
+                            if written > max_bytes:
+                                self.logger.warning(f"Fichier ignoré (taille >{max_bytes} octets): {file_url}")
+                                return None
+                            hasher.update(chunk)
+                            f.write(chunk)
+                    if not written:
+                        self.logger.warning(f"Téléchargement vide {file_url}")
+                        return None
+                    # Intégration atomique dans le stockage par contenu (dédupliqué)
+                    digest = hasher.hexdigest()
+                    self.blob_store.commit(tmp_path, digest, written, file_url, name_part, revision)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            return self.blob_store.link(digest, path)
         except Exception as e:
+            if raise_on_error:
+                raise
             self.logger.error(f"Erreur téléchargement fichier {file_url}: {e}")
             return None
 
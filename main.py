@@ -15,7 +15,12 @@ from elearning_scraper import ELearningScraper
 from firebase_manager import FirebaseManager
 from change_detector import ChangeDetector
 from telegram_notifier import TelegramNotifier
+from telegram_outbox import send_lane
 from monitoring import BotMonitor
+from blocking_executor import BlockingExecutor
+from search_index import SearchIndex
+from snapshot_model import CourseSnapshot
+from blob_store import file_revision
 from config import Config
 
 class ELearningBot:
@@ -25,6 +30,9 @@ class ELearningBot:
         self.detector = ChangeDetector()
         self.notifier = TelegramNotifier()
         self.monitor = BotMonitor()
+        # Pool dédié aux appels bloquants (scraper, Firestore) pour libérer la boucle asyncio
+        self.executor = BlockingExecutor()
+        self.scraper.fetch_engine.executor = self.executor
         self.logger = self._setup_logging()
         self.running = False
         self.stop_requested = False
@@ -35,13 +43,35 @@ class ELearningBot:
         self.scraper.enable_file_download = False
         # Mémoire du dernier contenu des cours pour les commandes interactives
         self.last_courses_content = {}
+        # Index de recherche sur ces snapshots (mis à jour à chaque changement de snapshot)
+        self.search_index = SearchIndex({space['id']: space['name'] for space in Config.MONITORED_SPACES})
         # Lier le bot principal au notifier pour accès aux méthodes
         self.notifier.set_bot_ref(self)
         # Injection pour téléchargement fichier (doit être dans __init__)
         self.scraper.firebase_mgr = self.firebase
         # Contexte bigscan courant
         self.current_bigscan = None
+        # Inventaire complet lancé par commande (/first, /bigscan): un seul à la fois
+        self.full_scan_task = None
+        # Un seul scan à la fois (cycle, inventaire, scan manuel): l'état du scraper
+        # (unchanged_courses, mémo des dossiers, pages en attente...) est celui du scan en cours
+        self.scan_lock = asyncio.Lock()
+        self.scraper.download_pool.on_progress = self._on_download_progress
         
+    def _remember_snapshot(self, course_id: str, content) -> CourseSnapshot:
+        """Mémoriser le dernier snapshot d'un cours (forme compacte) et mettre à jour l'index de recherche."""
+        if not isinstance(content, CourseSnapshot):
+            content = CourseSnapshot.from_dict(content)
+        self.last_courses_content[course_id] = content
+        self.search_index.update_course(course_id, content)
+        return content
+
+    def _on_download_progress(self, stats: dict):
+        """Reporter l'avancement du pool de téléchargement dans le contexte bigscan (thread du pool)."""
+        ctx = self.current_bigscan
+        if ctx is not None:
+            ctx['downloads'] = stats
+
     def _setup_logging(self):
         """Configurer le système de logging"""
         logging.basicConfig(
@@ -55,7 +85,19 @@ class ELearningBot:
         return logging.getLogger(__name__)
     
     async def check_all_courses(self, is_initial_scan: bool = False):
-        """Vérifier tous les cours surveillés
+        """Vérifier tous les cours surveillés, après le scan en cours s'il y en a un."""
+        async with self.scan_lock:
+            await self._check_all_courses(is_initial_scan)
+
+    def _scheduled_check(self):
+        """Tick du planificateur: ignoré tant qu'un cycle ou un inventaire est en cours."""
+        if self.scan_lock.locked():
+            self.logger.info("⏭️ Vérification planifiée ignorée: un scan est déjà en cours")
+            return
+        asyncio.create_task(self.check_all_courses())
+
+    async def _check_all_courses(self, is_initial_scan: bool = False):
+        """Vérifier tous les cours surveillés (appelé sous scan_lock)
         is_initial_scan: indique intention de faire un scan initial; sera converti en scan incrémental
         si des snapshots existent déjà (redémarrage) et que force_full_initial n'est pas activé.
         """
@@ -64,7 +106,7 @@ class ELearningBot:
         # Détection redémarrage: si on a déjà des contenus en base, ne pas re-spammer inventaire
         if is_initial_scan and not self.force_full_initial:
             # Vérifier si au moins un cours a déjà un contenu sauvegardé
-            already_has_data = any(self.firebase.get_course_content(space['id']) for space in Config.MONITORED_SPACES)
+            already_has_data = await self.executor.run(self._has_saved_content)
             if already_has_data:
                 self.logger.info("♻️ Redémarrage détecté: le 'premier' scan sera traité comme incrémental pour éviter le spam")
                 is_initial_scan = False
@@ -80,19 +122,28 @@ class ELearningBot:
                     'total_courses': len(Config.MONITORED_SPACES),
                     'course_times': [],
                     'milestones_sent': set(),
-                    'course_file_counts': {}
+                    'course_file_counts': {},
+                    'downloads': {'queued': 0, 'done': 0, 'failed': 0}
                 }
+                self.scraper.download_pool.reset_stats()
         else:
             self.logger.info("Début de la vérification des cours")
         
         # Enregistrer le début du scan
         self.monitor.record_scan_start()
+        # Inventaire initial en voie de masse; notifications de cycle en voie normale,
+        # même si le scan a été lancé depuis une commande
+        lane_token = send_lane.set('bulk' if is_initial_scan else 'notify')
         
         try:
             # Récupérer le contenu actuel de tous les cours
-            current_content = self.scraper.get_all_courses_content()
+            current_content = await self.scraper.get_all_courses_content_async()
             # Sauvegarder en mémoire pour les commandes
-            self.last_courses_content = current_content or {}
+            self.last_courses_content = {cid: c if isinstance(c, CourseSnapshot) else CourseSnapshot.from_dict(c)
+                                         for cid, c in (current_content or {}).items()}
+            self.search_index.sync(self.last_courses_content)
+            skipped = sum(1 for cid in self.last_courses_content if cid in self.scraper.unchanged_courses)
+            self.monitor.record_page_fetches(len(self.last_courses_content) - skipped, skipped)
             
             if not current_content:
                 self.logger.error("Aucun contenu récupéré")
@@ -118,7 +169,7 @@ class ELearningBot:
                 if is_initial_scan and not self.stop_requested:
                     try:
                         cname = self._get_course_name(course_id)
-                        await self.notifier.send_department_complete_message(cname, course_id, content)
+                        await self.notifier.send_department_complete_message(cname, course_id, self.last_courses_content[course_id])
                         if self.scraper.enable_file_download and Config.SEND_FILES_AS_DOCUMENTS:
                             await self.notifier.send_course_files(course_id, cname)
                             if self.current_bigscan is not None:
@@ -146,13 +197,8 @@ class ELearningBot:
                                     self.logger.debug(f"Progress milestone err: {_pgerr}")
                                 # Compter fichiers du cours (structure) pour stats finales
                                 try:
-                                    file_count = 0
-                                    for s in content.get('sections', []):
-                                        for a in s.get('activities', []):
-                                            file_count += len(a.get('files', []))
-                                        for r in s.get('resources', []):
-                                            file_count += len(r.get('files', []))
-                                    self.current_bigscan['course_file_counts'][course_id] = file_count
+                                    self.current_bigscan['course_file_counts'][course_id] = \
+                                        self.last_courses_content[course_id].counts['files']
                                 except Exception:
                                     pass
                     except Exception as e:
@@ -171,7 +217,7 @@ class ELearningBot:
                 # Audit fin bigscan si ctx
                 if self.current_bigscan is not None:
                     self.current_bigscan['end'] = datetime.now().isoformat()
-                    self.firebase.save_audit_event('bigscan', {
+                    await self.executor.run(self.firebase.save_audit_event, 'bigscan', {
                         'start': self.current_bigscan.get('start'),
                         'end': self.current_bigscan.get('end'),
                         'courses': self.current_bigscan.get('courses'),
@@ -210,18 +256,56 @@ class ELearningBot:
         
         finally:
             # Ne pas fermer la session HTTP pour permettre réutilisation
-            pass
+            send_lane.reset(lane_token)
     
+    def _collect_new_files(self, content: dict, changes: list) -> list:
+        """Fichiers à télécharger pour ces changements: [(url, titre section, titre parent, révision)].
+
+        Fichiers ajoutés/mis à jour, plus les fichiers des activités/ressources nouvelles.
+        """
+        files = []
+        seen = set()
+        added_items = set()
+        # Révision de chaque fichier du snapshot (un fichier remplacé à la même URL est retéléchargé)
+        revisions = {}
+        snapshot_files = []
+        for section in content.get('sections', []):
+            stitle = section.get('title', '')
+            for item in list(section.get('activities', [])) + list(section.get('resources', [])):
+                for f in item.get('files', []):
+                    if f.get('url'):
+                        revisions[f['url']] = file_revision(f)
+                        snapshot_files.append((stitle, item.get('title'), f))
+        for ch in changes:
+            ctype = ch.get('type')
+            if ctype in ('file_added', 'file_updated') and ch.get('file_url'):
+                if ch['file_url'] not in seen:
+                    seen.add(ch['file_url'])
+                    files.append((ch['file_url'], ch.get('section_title', ''), ch.get('parent_title', ''),
+                                  revisions.get(ch['file_url'])))
+            elif ctype in ('activity_added', 'resource_added'):
+                added_items.add((ch.get('section_title', ''), ch.get('activity_title') or ch.get('resource_title')))
+        for stitle, title, f in snapshot_files:
+            if (stitle, title) in added_items and f['url'] not in seen:
+                seen.add(f['url'])
+                files.append((f['url'], stitle, title or '', revisions[f['url']]))
+        return files
+
     async def _check_single_course(self, course_id: str, current_content: dict, is_initial_scan: bool = False):
         """Vérifier un cours spécifique"""
         course_name = self._get_course_name(course_id)
         
         try:
-            # Récupérer le contenu précédent
-            old_content = self.firebase.get_course_content(course_id)
-            
-            # Détecter les changements
-            changes = self.detector.detect_changes(old_content, current_content, is_initial_scan)
+            # Page identique au cycle précédent: snapshot réutilisé, aucune détection ni sauvegarde
+            unchanged = not is_initial_scan and course_id in self.scraper.unchanged_courses
+            if unchanged:
+                changes = []
+            else:
+                # Récupérer le contenu précédent
+                old_content = await self.executor.run(self.firebase.get_course_content, course_id)
+                
+                # Détecter les changements
+                changes = await self.executor.run(self.detector.detect_changes, old_content, current_content, is_initial_scan)
             
             if changes:
                 course_url = self._get_course_url(course_id)
@@ -229,24 +313,14 @@ class ELearningBot:
                 # Envoyer la notification
                 await self.notifier.send_notification(course_name, course_url, changes, is_initial_scan)
 
-                # Si nouveaux fichiers détectés et option active, tenter téléchargement + envoi ciblé
+                # Si nouveaux fichiers détectés et option active: télécharger et envoyer uniquement ceux-ci
                 if not is_initial_scan and Config.SEND_FILES_AS_DOCUMENTS:
-                    new_files = [c for c in changes if c.get('type') == 'file_added']
+                    new_files = self._collect_new_files(current_content, changes)
                     if new_files:
                         try:
-                            # Activer temporairement le download
-                            prev = self.scraper.enable_file_download
-                            self.scraper.enable_file_download = True
-                            # Re-scraper uniquement ce cours pour récupérer et télécharger les fichiers
-                            space = next((s for s in Config.MONITORED_SPACES if s['id']==course_id), None)
-                            if space:
-                                refreshed = self.scraper.get_course_content(space['url'], space['id'])
-                                if refreshed:
-                                    # Sauvegarder snapshot mis à jour (avec fichiers téléchargés)
-                                    self.firebase.save_course_content(course_id, refreshed)
-                                    self.last_courses_content[course_id] = refreshed
-                                    await self.notifier.send_course_files(course_id, course_name)
-                            self.scraper.enable_file_download = prev
+                            paths = await self.executor.run(self.scraper.download_files, course_id, new_files)
+                            if paths:
+                                await self.notifier.send_files(paths, course_name)
                         except Exception as send_file_err:
                             self.logger.warning(f"Envoi fichiers nouveaux échoué {course_id}: {send_file_err}")
                 
@@ -254,7 +328,7 @@ class ELearningBot:
                 self.monitor.record_notification(course_id, len(changes))
                 
                 # Sauvegarder le log des changements
-                self.firebase.save_changes_log(course_id, changes)
+                await self.executor.run(self.firebase.save_changes_log, course_id, changes)
                 
                 if is_initial_scan:
                     self.logger.info(f"Premier scan terminé pour {course_name}: {len(changes)} éléments trouvés")
@@ -273,23 +347,27 @@ class ELearningBot:
             if changes and not is_initial_scan and Config.SEND_NO_UPDATES_MESSAGE:
                 self.changed_courses_cycle.append((course_id, course_name))
             
-            # Compter les éléments trouvés
-            total_items = sum(len(section.get('activities', [])) + len(section.get('resources', [])) 
-                             for section in current_content.get('sections', []))
+            # Mettre à jour le snapshot mémoire individuel (agrégats précalculés)
+            snapshot = self._remember_snapshot(course_id, current_content)
             
             # Enregistrer le résultat du scan
-            self.monitor.record_scan_result(course_id, course_name, True, total_items)
+            self.monitor.record_scan_result(course_id, course_name, True,
+                                            snapshot.counts['activities'] + snapshot.counts['resources'])
             
-            # Sauvegarder le nouveau contenu
-            self.firebase.save_course_content(course_id, current_content)
-            # Mettre à jour le snapshot mémoire individuel
-            self.last_courses_content[course_id] = current_content
+            # Sauvegarder le nouveau contenu (inutile si la page n'a pas changé); la page n'est
+            # mémorisée comme vue qu'ensuite, pour qu'un échec fasse réanalyser le cours
+            if unchanged or await self.executor.run(self.firebase.save_course_content, course_id, current_content):
+                self.scraper.commit_page(course_id)
             
         except Exception as e:
             self.logger.error(f"Erreur lors de la vérification du cours {course_id}: {str(e)}")
             self.monitor.record_error("course_scan_error", str(e), course_id)
             self.monitor.record_scan_result(course_id, course_name, False)
     
+    def _has_saved_content(self) -> bool:
+        """Indiquer si au moins un cours possède déjà un snapshot persistant (appel bloquant)."""
+        return any(self.firebase.get_course_content(space['id']) for space in Config.MONITORED_SPACES)
+
     def _get_course_name(self, course_id: str) -> str:
         """Obtenir le nom d'un cours par son ID"""
         for space in Config.MONITORED_SPACES:
@@ -312,14 +390,15 @@ class ELearningBot:
         
         # Envoyer le message de démarrage
         await self.notifier.send_startup_message(self.monitor)
+
+        # Réutiliser la session eLearning sauvegardée si elle est encore valide
+        await self.executor.run(self.scraper.restore_session)
         
         # Planifier la vérification périodique
-        schedule.every(Config.CHECK_INTERVAL_MINUTES).minutes.do(
-            lambda: asyncio.create_task(self.check_all_courses())
-        )
+        schedule.every(Config.CHECK_INTERVAL_MINUTES).minutes.do(self._scheduled_check)
 
         # Vérifier si c'est le tout premier run (aucun snapshot persistant)
-        first_run = not any(self.firebase.get_course_content(space['id']) for space in Config.MONITORED_SPACES)
+        first_run = not await self.executor.run(self._has_saved_content)
         if first_run:
             self.logger.info("🟢 Aucune donnée trouvée: le bot attend la commande /first pour lancer le premier scan")
             # Ne pas lancer automatiquement le premier scan
@@ -350,6 +429,7 @@ class ELearningBot:
         self.running = False
         self.stop_requested = True
         self.scraper.close()
+        self.executor.shutdown()
         self.notifier.stopped = True
 
     # ================= Méthodes utilitaires pour commandes =================
@@ -379,16 +459,29 @@ class ELearningBot:
         else:
             asyncio.create_task(self.check_all_courses())
 
-    def trigger_big_scan(self):
-        """Forcer un inventaire complet comme si c'était le premier (utilisé par /bigscan)."""
-        self.force_full_initial = True
-        # Activer téléchargement fichiers seulement pour ce bigscan
-        self.scraper.enable_file_download = Config.SEND_FILES_AS_DOCUMENTS
+    def full_scan_running(self) -> bool:
+        return self.full_scan_task is not None and not self.full_scan_task.done()
+
+    def trigger_big_scan(self) -> bool:
+        """Forcer un inventaire complet comme si c'était le premier (utilisé par /bigscan et /first).
+
+        Retourne False sans rien lancer si un inventaire complet est déjà en cours.
+        """
+        if self.full_scan_running():
+            return False
         async def _run_big():
-            await self.check_all_courses(is_initial_scan=True)
-            # Après bigscan, désactiver
-            self.scraper.enable_file_download = False
-        asyncio.create_task(_run_big())
+            # Drapeaux posés seulement une fois le cycle en cours terminé
+            async with self.scan_lock:
+                self.force_full_initial = True
+                # Activer téléchargement fichiers seulement pour ce bigscan
+                self.scraper.enable_file_download = Config.SEND_FILES_AS_DOCUMENTS
+                try:
+                    await self._check_all_courses(is_initial_scan=True)
+                finally:
+                    # Après bigscan, désactiver
+                    self.scraper.enable_file_download = False
+        self.full_scan_task = asyncio.create_task(_run_big())
+        return True
 
     async def quick_baseline(self):
         """Effectuer un scan baseline silencieux: capture l'état sans notifications.
@@ -396,13 +489,15 @@ class ELearningBot:
         """
         self.logger.info("⚡ Baseline silencieuse en cours (aucune notification envoyée)")
         try:
-            snapshot = self.scraper.get_all_courses_content()
-            if not snapshot:
-                self.logger.warning("Baseline: aucun contenu récupéré")
-                return
-            for course_id, content in snapshot.items():
-                self.firebase.save_course_content(course_id, content)
-                self.last_courses_content[course_id] = content
+            async with self.scan_lock:
+                snapshot = await self.scraper.get_all_courses_content_async()
+                if not snapshot:
+                    self.logger.warning("Baseline: aucun contenu récupéré")
+                    return
+                for course_id, content in snapshot.items():
+                    if await self.executor.run(self.firebase.save_course_content, course_id, content):
+                        self.scraper.commit_page(course_id)
+                    self._remember_snapshot(course_id, content)
             self.logger.info("Baseline terminée: état initial mémorisé.")
         except Exception as e:
             self.logger.error(f"Erreur baseline silencieuse: {e}")
@@ -412,17 +507,20 @@ class ELearningBot:
         space = next((s for s in Config.MONITORED_SPACES if s['id'] == course_id), None)
         if not space:
             return
-        content = self.scraper.get_course_content(space['url'], space['id'])
-        if content:
-            self.last_courses_content[course_id] = content
-            old_content = self.firebase.get_course_content(course_id)
-            changes = self.detector.detect_changes(old_content, content, False)
+        async with self.scan_lock:
+            content = await self.executor.run(self.scraper.get_course_content, space['url'], space['id'])
+            if not content:
+                return
+            self._remember_snapshot(course_id, content)
+            old_content = await self.executor.run(self.firebase.get_course_content, course_id)
+            changes = await self.executor.run(self.detector.detect_changes, old_content, content, False)
             if changes:
                 await self.notifier.send_notification(space['name'], space['url'], changes, False)
-            self.firebase.save_course_content(course_id, content)
-            # Option: envoyer fichiers si activé
-            if Config.SEND_FILES_AS_DOCUMENTS:
-                await self.notifier.send_course_files(course_id, space['name'])
+            if await self.executor.run(self.firebase.save_course_content, course_id, content):
+                self.scraper.commit_page(course_id)
+        # Option: envoyer fichiers si activé
+        if Config.SEND_FILES_AS_DOCUMENTS:
+            await self.notifier.send_course_files(course_id, space['name'])
     
     def signal_handler(self, signum, frame):
         """Gestionnaire de signaux pour l'arrêt propre"""
@@ -17,6 +17,8 @@ class BotMonitor:
         self.stats = self._load_stats()
         # Compteur de notifications sur le cycle (entre deux scans globaux)
         self.cycle_notifications = self.stats.get('cycle_notifications', 0)
+        # Pages du cycle courant: réutilisées car identiques vs analysées (parsing + diff)
+        self.cycle_pages = self.stats.get('cycle_pages', {'skipped_unchanged': 0, 'parsed': 0})
     
     def _load_stats(self) -> Dict:
         """Charger les statistiques depuis le fichier"""
@@ -28,6 +30,7 @@ class BotMonitor:
                     data.setdefault('courses_scanned', {})
                     data.setdefault('errors', [])
                     data.setdefault('cycle_notifications', 0)
+                    data.setdefault('cycle_pages', {'skipped_unchanged': 0, 'parsed': 0})
                     return data
         except Exception as e:
             self.logger.error(f"Erreur lors du chargement des statistiques: {str(e)}")
@@ -43,13 +46,15 @@ class BotMonitor:
             'last_scan_time': None,
             'uptime_hours': 0,
             'errors': [],
-            'cycle_notifications': 0
+            'cycle_notifications': 0,
+            'cycle_pages': {'skipped_unchanged': 0, 'parsed': 0}
         }
     
     def _save_stats(self):
         """Sauvegarder les statistiques dans le fichier"""
         # Synchroniser le compteur de cycle dans la structure persistée
         self.stats['cycle_notifications'] = self.cycle_notifications
+        self.stats['cycle_pages'] = self.cycle_pages
         try:
             with open(self.stats_file, 'w', encoding='utf-8') as f:
                 json.dump(self.stats, f, ensure_ascii=False, indent=2)
@@ -59,8 +64,9 @@ class BotMonitor:
         """Enregistrer le début d'un scan global (tous les cours)"""
         self.stats['total_scans'] += 1
         self.stats['last_scan_time'] = time.time()
-        # Réinitialiser le compteur de notifications sur ce nouveau cycle
+        # Réinitialiser les compteurs de notifications et de pages sur ce nouveau cycle
         self.cycle_notifications = 0
+        self.cycle_pages = {'skipped_unchanged': 0, 'parsed': 0}
         self._save_stats()
     
     def record_scan_result(self, course_id: str, course_name: str, success: bool, items_found: int = 0):
@@ -91,6 +97,12 @@ class BotMonitor:
 
         self._save_stats()
 
+    def record_page_fetches(self, parsed: int, skipped_unchanged: int):
+        """Enregistrer, pour le cycle courant, les pages analysées et celles réutilisées car inchangées"""
+        self.cycle_pages['parsed'] += parsed
+        self.cycle_pages['skipped_unchanged'] += skipped_unchanged
+        self._save_stats()
+
     def last_notifications_cycle(self) -> int:
         """Retourne le nombre de notifications envoyées dans le cycle courant"""
         return self.cycle_notifications
@@ -159,7 +171,9 @@ class BotMonitor:
             'success_rate': f"{self.get_success_rate():.1f}%",
             'total_notifications': self.stats['total_notifications'],
             'courses_monitored': len(self.stats['courses_scanned']),
-            'recent_errors': len(self.get_recent_errors(24))
+            'recent_errors': len(self.get_recent_errors(24)),
+            'pages_parsed': self.cycle_pages.get('parsed', 0),
+            'pages_skipped_unchanged': self.cycle_pages.get('skipped_unchanged', 0)
         }
     
     def generate_report(self) -> str:
@@ -176,7 +190,8 @@ class BotMonitor:
         report += f"📊 Taux de succès: {stats['success_rate']}\n"
         report += f"📱 Notifications envoyées: {stats['total_notifications']}\n"
         report += f"📚 Cours surveillés: {stats['courses_monitored']}\n"
-        report += f"⚠️ Erreurs récentes (24h): {stats['recent_errors']}\n\n"
+        report += f"⚠️ Erreurs récentes (24h): {stats['recent_errors']}\n"
+        report += f"🗂️ Dernier cycle: {stats['pages_parsed']} pages analysées, {stats['pages_skipped_unchanged']} inchangées\n\n"
         
         # Statistiques par cours
         if self.stats['courses_scanned']:
@@ -219,8 +234,10 @@ class BotMonitor:
             'last_scan_time': None,
             'uptime_hours': 0,
             'errors': [],
-            'cycle_notifications': 0
+            'cycle_notifications': 0,
+            'cycle_pages': {'skipped_unchanged': 0, 'parsed': 0}
         }
         self.cycle_notifications = 0
+        self.cycle_pages = {'skipped_unchanged': 0, 'parsed': 0}
         self._save_stats()
         self.logger.info("Statistiques réinitialisées")
\ No newline at end of file
@@ -0,0 +1,142 @@
+import html
+import logging
+import re
+import time
+from config import Config
+
+# Correspondance modname Moodle -> type utilisé dans les snapshots (identique au scraping HTML)
+_MODNAME_TYPES = {
+    'resource': 'resource',
+    'forum': 'forum',
+    'assign': 'assignment',
+    'url': 'url',
+    'folder': 'folder',
+    'page': 'page',
+    'quiz': 'quiz',
+}
+
+class MoodleWebServiceError(Exception):
+    """Erreur renvoyée par l'API REST Moodle (réponse JSON avec 'exception')."""
+
+class MoodleWebServiceSource:
+    """Source de contenu basée sur l'API REST Moodle (core_course_get_contents).
+
+    Produit le même dict que ELearningScraper.get_course_content
+    ({'course_id','url','timestamp','sections':[...]}) à partir du JSON du web service,
+    sans dépendre du thème HTML. Les fichiers portent en plus timemodified, filesize
+    et contenthash. Le point d'accès est configurable (MOODLE_WS_URL) pour pouvoir
+    viser un serveur Moodle factice local.
+    """
+    def __init__(self, session, token: str = None, endpoint: str = None):
+        self.session = session
+        self.logger = logging.getLogger(__name__)
+        self.token = token or Config.MOODLE_WS_TOKEN
+        self.endpoint = endpoint or Config.MOODLE_WS_URL
+        # Racine du site déduite du point d'accès (…/webservice/rest/server.php)
+        self.base_url = self.endpoint.split('/webservice/')[0]
+
+    # ===================== Appels REST =====================
+    def _ensure_token(self):
+        """Obtenir un jeton via /login/token.php si aucun n'est configuré."""
+        if self.token:
+            return self.token
+        resp = self.session.post(f"{self.base_url}/login/token.php", data={
+            'username': Config.USERNAME,
+            'password': Config.PASSWORD,
+            'service': Config.MOODLE_WS_SERVICE
+        }, timeout=20)
+        resp.raise_for_status()
+        data = resp.json()
+        if not data.get('token'):
+            raise MoodleWebServiceError(f"Jeton web service refusé: {data.get('error') or data}")
+        self.token = data['token']
+        self.logger.info("Jeton web service Moodle obtenu")
+        return self.token
+
+    def call_raw(self, wsfunction: str, **params) -> str:
+        """Appeler une fonction du web service et retourner le corps JSON brut."""
+        payload = {
+            'wstoken': self._ensure_token(),
+            'wsfunction': wsfunction,
+            'moodlewsrestformat': 'json',
+        }
+        payload.update(params)
+        resp = self.session.post(self.endpoint, data=payload, timeout=25)
+        resp.raise_for_status()
+        return resp.text
+
+    def check_response(self, data):
+        """Lever MoodleWebServiceError si la réponse décodée est une erreur Moodle."""
+        if isinstance(data, dict) and data.get('exception'):
+            # Jeton expiré/invalide: l'oublier pour en redemander un au prochain appel
+            if data.get('errorcode') in ('invalidtoken', 'accessexception') and not Config.MOODLE_WS_TOKEN:
+                self.token = None
+            raise MoodleWebServiceError(f"{data.get('errorcode')}: {data.get('message')}")
+        return data
+
+    # ===================== Conversion vers le format snapshot =====================
+    def build_content(self, course_url: str, course_id: str, sections_json: list) -> dict:
+        """Convertir la réponse de core_course_get_contents en dict de contenu de cours."""
+        content = {
+            'course_id': course_id,
+            'url': course_url,
+            'timestamp': time.time(),
+            'sections': []
+        }
+        for section in sections_json or []:
+            section_data = self._section_data(section)
+            if section_data:
+                content['sections'].append(section_data)
+        return content
+
+    def _section_data(self, section: dict) -> dict:
+        section_data = {
+            'title': (section.get('name') or '').strip() or f"section-{section.get('section', '')}",
+            'activities': [],
+            'resources': []
+        }
+        for module in section.get('modules', []) or []:
+            if not module.get('uservisible', True):
+                continue
+            activity_data = self._module_data(module)
+            if activity_data['type'] == 'resource':
+                section_data['resources'].append(activity_data)
+            else:
+                section_data['activities'].append(activity_data)
+        return section_data
+
+    def _module_data(self, module: dict) -> dict:
+        activity_data = {
+            'title': (module.get('name') or '').strip(),
+            'type': _MODNAME_TYPES.get(module.get('modname'), 'other'),
+            'url': module.get('url') or '',
+            'description': self._strip_html(module.get('description') or ''),
+            'files': []
+        }
+        for entry in module.get('contents', []) or []:
+            if entry.get('type') != 'file':
+                continue
+            activity_data['files'].append({
+                'name': entry.get('filename') or entry.get('fileurl', '').split('/')[-1],
+                'url': self.public_file_url(entry.get('fileurl', '')),
+                'timemodified': entry.get('timemodified'),
+                'filesize': entry.get('filesize'),
+                'contenthash': entry.get('contenthash')
+            })
+        return activity_data
+
+    # ===================== URLs de fichiers =====================
+    def public_file_url(self, fileurl: str) -> str:
+        """URL pluginfile.php équivalente à celle du scraping HTML (sans jeton ni paramètres)."""
+        return fileurl.split('?')[0].replace('/webservice/pluginfile.php', '/pluginfile.php')
+
+    def download_url(self, file_url: str) -> str:
+        """URL de téléchargement authentifiée par jeton pour un fichier pluginfile.php."""
+        if '/pluginfile.php' not in file_url or '/webservice/pluginfile.php' in file_url:
+            return file_url
+        sep = '&' if '?' in file_url else '?'
+        return f"{file_url.replace('/pluginfile.php', '/webservice/pluginfile.php', 1)}{sep}token={self._ensure_token()}"
+
+    def _strip_html(self, text: str) -> str:
+        text = re.sub(r'<[^>]+>', ' ', text)
+        return re.sub(r'\s+', ' ', html.unescape(text)).strip()
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Seau à jetons asynchrone: `rate` jetons par seconde, rafale maximale `capacity`.
+
+    acquire(n) réserve n jetons immédiatement puis attend juste le temps nécessaire
+    pour qu'ils soient disponibles, ce qui remplace les pauses fixes entre envois par
+    le débit maximal autorisé. Un coût supérieur à la capacité (groupe de documents)
+    est payé en entier: le seau passe en négatif et les appels suivants attendent le
+    remplissage correspondant. Aucun verrou n'est tenu pendant l'attente.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        # Instant à partir duquel le seau se remplit (dans le futur pendant une pause)
+        self.updated = time.monotonic()
+        # Décalage cumulé des pauses: repousse aussi les appels déjà en attente
+        self._shift = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def pause(self, seconds: float):
+        """Suspendre le seau pendant `seconds` (RetryAfter): aucun jeton pendant la pause."""
+        self._refill()
+        resume = time.monotonic() + seconds
+        if resume > self.updated:
+            self._shift += resume - self.updated
+            self.updated = resume
+        self.tokens = min(self.tokens, 0.0)
+
+    async def acquire(self, tokens: float = 1.0):
+        self._refill()
+        self.tokens -= tokens
+        wait = max(0.0, -self.tokens / self.rate) + max(0.0, self.updated - time.monotonic())
+        shift = self._shift
+        while wait > 0:
+            await asyncio.sleep(wait)
+            # Pause survenue pendant l'attente: la prolonger d'autant
+            wait, shift = self._shift - shift, self._shift
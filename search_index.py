@@ -0,0 +1,224 @@
+import itertools
+import logging
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from config import Config
+
+_TOKEN_RE = re.compile(r'[^\W_]+')  # '_' sépare les mots des noms de fichiers
+# Mots plus longs ignorés par l'index de trigrammes (identifiants, URL collées...)
+_MAX_FUZZY_WORD_LEN = 40
+
+def fold(text: str) -> str:
+    """Minuscules sans accents ('Génie Électrique' -> 'genie electrique')."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+def _trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """Index inversé (mot -> éléments) sur les snapshots de cours.
+
+    Chaque section, activité, ressource et fichier devient un document indexé par
+    les mots de son titre/nom et de sa description, sans accents ni casse. L'index est
+    mis à jour cours par cours quand un snapshot change (un snapshot identique - même
+    objet - n'est pas réindexé). Une requête retient les documents contenant, pour
+    chaque mot de la requête, un mot qui le contient (trouvé par ses trigrammes à
+    partir de 3 caractères), puis vérifie la sous-chaîne complète.
+
+    Les deux recherches s'appuient sur un index trigramme -> mots du vocabulaire: sa
+    taille suit le nombre de mots distincts, pas le nombre de documents.
+    """
+    def __init__(self, course_names: dict = None):
+        self.logger = logging.getLogger(__name__)
+        self.course_names = course_names or {}
+        self._ids = itertools.count()
+        self._docs = {}                    # doc_id -> document
+        self._course_docs = {}             # course_id -> [doc_id]
+        self._course_snapshots = {}        # course_id -> snapshot indexé
+        self._postings = defaultdict(set)  # mot -> {doc_id}
+        self._trigram_words = defaultdict(set)  # trigramme -> {mot}
+        self._long_words = set()           # mots hors index de trigrammes (parcourus)
+
+    # ===================== Mise à jour =====================
+    def sync(self, snapshots: dict):
+        """Aligner l'index sur {course_id: snapshot} (ajouts, changements, suppressions)."""
+        for course_id in list(self._course_docs):
+            if course_id not in snapshots:
+                self.remove_course(course_id)
+        for course_id, content in snapshots.items():
+            self.update_course(course_id, content)
+
+    def update_course(self, course_id: str, content: dict):
+        if not content or self._course_snapshots.get(course_id) is content:
+            return
+        self.remove_course(course_id)
+        doc_ids = []
+        course_name = self.course_names.get(course_id)
+        if course_name:
+            doc_ids.append(self._add(course_id, 'course', course_name, '', '', ''))
+        for section in content.get('sections', []):
+            stitle = section.get('title', '')
+            doc_ids.append(self._add(course_id, 'section', stitle, '', stitle, ''))
+            for kind, key in (('activity', 'activities'), ('resource', 'resources')):
+                for item in section.get(key, []):
+                    title = item.get('title', '')
+                    doc_ids.append(self._add(course_id, kind, title, item.get('description', ''), stitle, ''))
+                    for f in item.get('files', []):
+                        doc_ids.append(self._add(course_id, 'file', f.get('name', ''), '', stitle, title))
+        self._course_docs[course_id] = doc_ids
+        self._course_snapshots[course_id] = content
+
+    def remove_course(self, course_id: str):
+        for doc_id in self._course_docs.pop(course_id, []):
+            doc = self._docs.pop(doc_id)
+            for token in doc['tokens']:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.discard(doc_id)
+                    if not postings:
+                        del self._postings[token]
+                        self._forget_word(token)
+        self._course_snapshots.pop(course_id, None)
+
+    def _add(self, course_id, kind, title, description, section_title, parent_title) -> int:
+        doc_id = next(self._ids)
+        title_l = fold(title)
+        description_l = fold(description or '')
+        tokens = set(_TOKEN_RE.findall(title_l)) | set(_TOKEN_RE.findall(description_l))
+        self._docs[doc_id] = {
+            'course_id': course_id,
+            'kind': kind,
+            'title': title,
+            'description': description or '',
+            'section_title': section_title,
+            'parent_title': parent_title,
+            'title_l': title_l,
+            'description_l': description_l,
+            'tokens': tokens,
+        }
+        for token in tokens:
+            if token not in self._postings:
+                self._learn_word(token)
+            self._postings[token].add(doc_id)
+        return doc_id
+
+    def _learn_word(self, word: str):
+        if len(word) > _MAX_FUZZY_WORD_LEN:
+            self._long_words.add(word)
+        else:
+            for gram in _trigrams(word):
+                self._trigram_words[gram].add(word)
+
+    def _forget_word(self, word: str):
+        if len(word) > _MAX_FUZZY_WORD_LEN:
+            self._long_words.discard(word)
+        else:
+            for gram in _trigrams(word):
+                words = self._trigram_words.get(gram)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._trigram_words[gram]
+
+    # ===================== Requêtes =====================
+    def _containing(self, token: str):
+        """Mots du vocabulaire contenant `token` (n'importe où dans le mot)."""
+        if len(token) < 3:
+            return [word for word in self._postings if token in word]
+        # Un mot contenant token contient tous ses trigrammes: partir du plus rare
+        lists = sorted((self._trigram_words.get(token[i:i + 3], ()) for i in range(len(token) - 2)), key=len)
+        words = [word for word in lists[0] if token in word]
+        words.extend(word for word in self._long_words if token in word)
+        return words
+
+    def search(self, term: str, kinds=None, with_description: bool = False, limit: int = None) -> list:
+        """Documents dont le titre (et la description si demandé) contient `term`, dans l'ordre des cours."""
+        query = fold(term).strip()
+        tokens = _TOKEN_RE.findall(query)
+        if not tokens:
+            return []
+        candidates = None
+        for token in tokens:
+            ids = set()
+            for word in self._containing(token):
+                ids |= self._postings[word]
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        results = []
+        for doc_id in sorted(candidates):
+            doc = self._docs[doc_id]
+            if kinds and doc['kind'] not in kinds:
+                continue
+            if query in doc['title_l'] or (with_description and query in doc['description_l']):
+                results.append(doc)
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+    def _similar_words(self, token: str, threshold: float, max_words: int) -> list:
+        """[(mot, similarité)] du vocabulaire proches de `token` (Jaccard des trigrammes)."""
+        grams = _trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigram_words.get(gram, ()))
+        # Jaccard >= seuil impose au moins seuil * |trigrammes de la requête| en commun
+        min_shared = threshold * len(grams)
+        scored = []
+        for word, common in shared.items():
+            if common < min_shared:
+                continue
+            score = common / (len(grams) + len(_trigrams(word)) - common)
+            if word.startswith(token):
+                score = max(score, 0.9)
+            if score >= threshold:
+                scored.append((word, score))
+        scored.sort(key=lambda ws: -ws[1])
+        return scored[:max_words]
+
+    def fuzzy_search(self, term: str, kinds=None, limit: int = None, threshold: float = None) -> list:
+        """[(document, score)] triés par pertinence, tolérant fautes de frappe et accents.
+
+        Le score d'un document est la moyenne, sur les mots de la requête, de la meilleure
+        similarité avec un mot de son titre ou de sa description; un titre contenant la
+        requête exacte passe devant.
+        """
+        threshold = Config.SEARCH_FUZZY_THRESHOLD if threshold is None else threshold
+        query = fold(term).strip()
+        tokens = _TOKEN_RE.findall(query)
+        if not tokens:
+            return []
+        totals = defaultdict(float)
+        for token in tokens:
+            best = {}
+            for word, score in self._similar_words(token, threshold, Config.SEARCH_FUZZY_MAX_WORDS):
+                for doc_id in self._postings.get(word, ()):
+                    if score > best.get(doc_id, 0.0):
+                        best[doc_id] = score
+            for doc_id, score in best.items():
+                totals[doc_id] += score
+        ranked = []
+        for doc_id, total in totals.items():
+            doc = self._docs[doc_id]
+            if kinds and doc['kind'] not in kinds:
+                continue
+            score = total / len(tokens)
+            if query in doc['title_l']:
+                score += 1.0
+            if score >= threshold:
+                ranked.append((score, doc_id))
+        ranked.sort(key=lambda sd: (-sd[0], sd[1]))
+        if limit:
+            ranked = ranked[:limit]
+        return [(self._docs[doc_id], round(min(score, 1.0), 2)) for score, doc_id in ranked]
+
+    def stats(self) -> dict:
+        return {
+            'courses': len(self._course_docs),
+            'documents': len(self._docs),
+            'tokens': len(self._postings),
+            'trigrams': len(self._trigram_words)
+        }
@@ -0,0 +1,77 @@
+import json
+import logging
+import os
+import threading
+import time
+from config import Config
+
+class SentLedger:
+    """Registre persistant des fichiers déjà livrés sur Telegram.
+
+    delivered: {chat_id: {sha: {'name', 'sent_at'}}} - contenus déjà envoyés à chaque chat
+    file_ids:  {sha: file_id} - identifiant Telegram réutilisable pour renvoyer un contenu
+               sans le téléverser à nouveau (les file_id sont valables pour tout le bot).
+    """
+    def __init__(self, path: str = None):
+        self.path = path or Config.SENT_LEDGER_PATH
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self) -> dict:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data.setdefault('delivered', {})
+                data.setdefault('file_ids', {})
+                return data
+        except Exception as e:
+            self.logger.warning(f"Registre des envois illisible, réinitialisé: {e}")
+        return {'delivered': {}, 'file_ids': {}}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.warning(f"Sauvegarde du registre des envois impossible: {e}")
+
+    def was_delivered(self, chat_id, digest: str) -> bool:
+        with self._lock:
+            return digest in self.data['delivered'].get(str(chat_id), {})
+
+    def get_file_id(self, digest: str):
+        with self._lock:
+            return self.data['file_ids'].get(digest)
+
+    def forget_file_id(self, digest: str):
+        """Oublier un file_id refusé par Telegram (le prochain envoi re-téléversera)."""
+        with self._lock:
+            if self.data['file_ids'].pop(digest, None) is not None:
+                self._save()
+
+    def record(self, chat_id, digest: str, name: str, file_id: str = None, save: bool = True):
+        """Enregistrer une livraison; save=False laisse l'écriture à un flush() par lot."""
+        with self._lock:
+            self.data['delivered'].setdefault(str(chat_id), {})[digest] = {'name': name, 'sent_at': time.time()}
+            if file_id:
+                self.data['file_ids'][digest] = file_id
+            if save:
+                self._save()
+
+    def flush(self):
+        """Écrire le registre sur disque (appel bloquant)."""
+        with self._lock:
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'chats': len(self.data['delivered']),
+                'delivered': sum(len(v) for v in self.data['delivered'].values()),
+                'file_ids': len(self.data['file_ids'])
+            }
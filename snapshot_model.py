@@ -0,0 +1,175 @@
+import sys
+
+# Représentation compacte des snapshots de cours gardés en mémoire (last_courses_content).
+# Le scraper, le détecteur et le stockage (Firestore / JSON local) manipulent toujours le
+# format dict; CourseSnapshot.from_dict / to_dict font la conversion. Les objets gardent une
+# lecture façon dict (snap.get('sections', []), item['title']...) pour les commandes existantes.
+# Chaînes répétées (types, titres de section, préfixes d'URL Moodle) internées; listes en tuples.
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _split_url(url):
+    """(préfixe interné, reste): 'https://.../mod/resource/view.php?id=' + '1234'."""
+    if not url:
+        return None, url
+    cut = max(url.rfind('/'), url.rfind('='), url.rfind('?')) + 1
+    return sys.intern(url[:cut]), url[cut:]
+
+class _Node:
+    """Lecture façon dict des champs d'un nœud (get, [], in, to_dict)."""
+    __slots__ = ()
+    _KEYS = ()
+
+    def get(self, key, default=None):
+        if key in self._KEYS:
+            value = getattr(self, key)
+            return default if value is None else value
+        extra = self.extra
+        return extra.get(key, default) if extra else default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def _base_dict(self) -> dict:
+        data = dict(self.extra) if self.extra else {}
+        for key in self._KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        return data
+
+    @staticmethod
+    def _extra(data: dict, keys) -> dict:
+        extra = {k: v for k, v in data.items() if k not in keys}
+        return extra or None
+
+_MISSING = object()
+
+class FileEntry(_Node):
+    __slots__ = ('name', '_url_prefix', '_url_rest', 'contenthash', 'timemodified', 'filesize', 'extra')
+    _KEYS = ('name', 'url', 'contenthash', 'timemodified', 'filesize')
+
+    def __init__(self, name, url=None, contenthash=None, timemodified=None, filesize=None, extra=None):
+        self.name = name
+        self._url_prefix, self._url_rest = _split_url(url)
+        self.contenthash = contenthash
+        self.timemodified = timemodified
+        self.filesize = filesize
+        self.extra = extra
+
+    @property
+    def url(self):
+        return self._url_rest if self._url_prefix is None else self._url_prefix + self._url_rest
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'FileEntry':
+        return cls(data.get('name'), data.get('url'), data.get('contenthash'), data.get('timemodified'),
+                   data.get('filesize'), cls._extra(data, cls._KEYS))
+
+    def to_dict(self) -> dict:
+        return self._base_dict()
+
+class Item(_Node):
+    """Activité ou ressource."""
+    __slots__ = ('title', 'type', '_url_prefix', '_url_rest', 'description', 'files', 'hash', 'extra')
+    _KEYS = ('title', 'type', 'url', 'description', 'files', 'hash')
+
+    def __init__(self, title, type=None, url=None, description=None, files=(), hash=None, extra=None):
+        self.title = title
+        self.type = _intern(type)
+        self._url_prefix, self._url_rest = _split_url(url)
+        self.description = description
+        self.files = tuple(files)
+        self.hash = hash
+        self.extra = extra
+
+    @property
+    def url(self):
+        return self._url_rest if self._url_prefix is None else self._url_prefix + self._url_rest
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Item':
+        return cls(data.get('title'), data.get('type'), data.get('url'), data.get('description'),
+                   (FileEntry.from_dict(f) for f in data.get('files', [])), data.get('hash'),
+                   cls._extra(data, cls._KEYS))
+
+    def to_dict(self) -> dict:
+        data = self._base_dict()
+        data['files'] = [f.to_dict() for f in self.files]
+        return data
+
+class Section(_Node):
+    __slots__ = ('title', 'activities', 'resources', 'hash', 'extra')
+    _KEYS = ('title', 'activities', 'resources', 'hash')
+
+    def __init__(self, title, activities=(), resources=(), hash=None, extra=None):
+        self.title = _intern(title)
+        self.activities = tuple(activities)
+        self.resources = tuple(resources)
+        self.hash = hash
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Section':
+        return cls(data.get('title'),
+                   (Item.from_dict(a) for a in data.get('activities', [])),
+                   (Item.from_dict(r) for r in data.get('resources', [])),
+                   data.get('hash'), cls._extra(data, cls._KEYS))
+
+    def to_dict(self) -> dict:
+        data = self._base_dict()
+        data['activities'] = [a.to_dict() for a in self.activities]
+        data['resources'] = [r.to_dict() for r in self.resources]
+        return data
+
+class CourseSnapshot(_Node):
+    """Snapshot d'un cours avec agrégats précalculés (counts) et itérateurs."""
+    __slots__ = ('course_id', 'url', 'timestamp', 'content_hash', 'sections', 'counts', 'extra')
+    _KEYS = ('course_id', 'url', 'timestamp', 'content_hash', 'sections')
+
+    def __init__(self, course_id=None, url=None, timestamp=None, content_hash=None, sections=(), extra=None):
+        self.course_id = course_id
+        self.url = url
+        self.timestamp = timestamp
+        self.content_hash = content_hash
+        self.sections = tuple(sections)
+        self.extra = extra
+        # Agrégats calculés une fois (le snapshot n'est pas modifié après construction)
+        counts = {'sections': len(self.sections), 'activities': 0, 'resources': 0, 'files': 0}
+        for section in self.sections:
+            counts['activities'] += len(section.activities)
+            counts['resources'] += len(section.resources)
+            for item in section.activities + section.resources:
+                counts['files'] += len(item.files)
+        self.counts = counts
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'CourseSnapshot':
+        return cls(data.get('course_id'), data.get('url'), data.get('timestamp'), data.get('content_hash'),
+                   (Section.from_dict(s) for s in data.get('sections', [])), cls._extra(data, cls._KEYS))
+
+    def to_dict(self) -> dict:
+        data = self._base_dict()
+        data['sections'] = [s.to_dict() for s in self.sections]
+        return data
+
+    def iter_items(self):
+        """(section, 'activity'|'resource', élément) dans l'ordre du cours."""
+        for section in self.sections:
+            for item in section.activities:
+                yield section, 'activity', item
+            for item in section.resources:
+                yield section, 'resource', item
+
+    def iter_files(self):
+        """(section, élément parent, fichier) pour tous les fichiers du cours."""
+        for section, _, item in self.iter_items():
+            for file in item.files:
+                yield section, item, file
@@ -4,23 +4,42 @@ from telegram.error import TelegramError
 import asyncio
 from config import Config
 from datetime import datetime
-from collections import defaultdict, Counter
+from sent_ledger import SentLedger
+from view_cache import ViewCache
+from bounded_store import BoundedStore
+from telegram_outbox import TelegramOutbox
+from collections import defaultdict, Counter, deque
 
 try:
     from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 except Exception:
     InlineKeyboardMarkup = None
     InlineKeyboardButton = None
+try:
+    from telegram import InputMediaDocument
+except Exception:
+    InputMediaDocument = None
+try:
+    from telegram import Update
+except Exception:
+    Update = None
 
 class TelegramNotifier:
     def __init__(self):
         self.bot = Bot(token=Config.TELEGRAM_TOKEN)
+        # File d'envoi unique: limites globales/par chat, RetryAfter, nouvelles tentatives
+        self.outbox = TelegramOutbox(self.bot)
         self.logger = logging.getLogger(__name__)
         self.chat_id = Config.TELEGRAM_CHAT_ID or None
         self.bot_ref = None  # Référence vers ELearningBot
         self.stopped = False
-        # Cache navigation inline: {message_id: { 'course_id': str, 'page': int, 'items': [...] }}
-        self.inline_state = {}
+        # Fichiers déjà livrés par chat + cache des file_id Telegram
+        self.sent_ledger = SentLedger()
+        # Cache navigation inline: {course_id: {'items': [...]}}
+        # (borné LRU/TTL; les listes d'items sont celles du cache des vues, sans copie)
+        self.inline_state = BoundedStore(Config.NAV_STATE_MAX_ENTRIES, Config.NAV_STATE_TTL_SECONDS)
+        # Vues rendues par cours, recalculées seulement quand le snapshot change
+        self.view_cache = ViewCache()
         # Nombre d'items par page pour navigation inline
         self.items_per_page = 10
         if InlineKeyboardButton is None:
@@ -30,9 +49,19 @@ class TelegramNotifier:
         # Menu pagination state (simple)
         self.menu_pages = ['main','more']
         # Navigation state pour les menus
-        self.navigation_state = {}
+        self.navigation_state = BoundedStore(Config.NAV_STATE_MAX_ENTRIES, Config.NAV_STATE_TTL_SECONDS)
         # Commandes disponibles
         self.commands = self._initialize_commands()
+        # Exécution concurrente des commandes: plafond global, ordre conservé par chat
+        self._command_sem = asyncio.Semaphore(max(1, Config.COMMAND_CONCURRENCY))
+        self._command_locks = {}
+        self._command_tasks = set()
+        # Updates déjà traitées (fenêtre bornée: deque pour l'ordre, set pour la recherche)
+        self._seen_update_ids = set()
+        self._seen_update_order = deque()
+        # Mode webhook: activé par web_app.py (serveur HTTP présent) si TELEGRAM_WEBHOOK_URL est défini
+        self.webhook_enabled = False
+        self.webhook_active = False
 
     def set_bot_ref(self, bot_ref):
         self.bot_ref = bot_ref
@@ -249,29 +278,131 @@ class TelegramNotifier:
 
     # ================== Boucle de commandes (polling manuel) ==================
     async def command_loop(self):
+        """Recevoir les updates: webhook si disponible, sinon long polling (repli automatique)."""
+        if self.webhook_enabled and await self.setup_webhook():
+            await self._webhook_watchdog()
+            if self.stopped:
+                return
+        await self._polling_loop()
+
+    async def _polling_loop(self):
         offset = None
-        processed_update_ids = set()
+        try:
+            # get_updates est refusé tant qu'un webhook est enregistré
+            await self.bot.delete_webhook()
+        except Exception as e:
+            self.logger.debug(f"delete_webhook: {e}")
         while not self.stopped:
             try:
+                # Long polling: l'appel attend lui-même les updates, pas de pause supplémentaire
                 updates = await self.bot.get_updates(offset=offset, timeout=20)
                 for upd in updates:
                     offset = upd.update_id + 1
-                    if upd.update_id in processed_update_ids:
-                        continue
-                    processed_update_ids.add(upd.update_id)
-                    if hasattr(upd, 'message') and upd.message:
-                        if not self.chat_id:
-                            self.chat_id = upd.message.chat_id
-                        text = (upd.message.text or '').strip()
-                        if text.startswith('/'):
-                            await self._handle_command(text, upd.message.chat_id)
-                    elif hasattr(upd, 'callback_query') and upd.callback_query:
-                        await self._handle_callback_query(upd.callback_query)
-                await asyncio.sleep(0.5)
+                    self.dispatch_update(upd)
             except Exception as e:
                 self.logger.warning(f"Boucle commandes erreur: {e}")
                 await asyncio.sleep(2)
 
+    # ================== Webhook ==================
+    @property
+    def webhook_secret(self) -> str:
+        """Jeton secret attendu dans X-Telegram-Bot-Api-Secret-Token (dérivé du token si non configuré)."""
+        if Config.TELEGRAM_WEBHOOK_SECRET:
+            return Config.TELEGRAM_WEBHOOK_SECRET
+        import hashlib
+        return hashlib.sha256(f"webhook:{Config.TELEGRAM_TOKEN}".encode('utf-8')).hexdigest()[:48]
+
+    async def setup_webhook(self) -> bool:
+        """Enregistrer le webhook auprès de Telegram; False si impossible (repli sur le polling)."""
+        if not Config.TELEGRAM_WEBHOOK_URL or Update is None:
+            return False
+        url = Config.TELEGRAM_WEBHOOK_URL.rstrip('/') + Config.TELEGRAM_WEBHOOK_PATH
+        try:
+            await self.bot.set_webhook(url=url, secret_token=self.webhook_secret,
+                                       allowed_updates=['message', 'callback_query'])
+            self.webhook_active = True
+            self.logger.info(f"Webhook Telegram actif: {url}")
+            return True
+        except Exception as e:
+            self.logger.warning(f"Webhook indisponible ({e}): repli sur le polling")
+            self.webhook_active = False
+            return False
+
+    async def _webhook_watchdog(self):
+        """Surveiller le webhook; en cas d'erreurs de livraison récentes, repasser en polling."""
+        while not self.stopped:
+            await asyncio.sleep(Config.TELEGRAM_WEBHOOK_CHECK_SECONDS)
+            try:
+                info = await self.bot.get_webhook_info()
+            except Exception as e:
+                self.logger.debug(f"get_webhook_info: {e}")
+                continue
+            last_error = info.last_error_date
+            if last_error is not None and not isinstance(last_error, datetime):
+                last_error = datetime.fromtimestamp(last_error)
+            recent = last_error is not None and \
+                (datetime.now(last_error.tzinfo) - last_error).total_seconds() < Config.TELEGRAM_WEBHOOK_CHECK_SECONDS
+            if not info.url or (recent and info.pending_update_count):
+                self.logger.warning(f"Webhook en échec ({info.last_error_message or 'non enregistré'}): repli sur le polling")
+                self.webhook_active = False
+                return
+
+    async def handle_webhook_update(self, data: dict):
+        """Point d'entrée du webhook (web_app.py): même dispatcher que le polling."""
+        upd = Update.de_json(data, self.bot)
+        if upd:
+            self.dispatch_update(upd)
+
+    def _is_duplicate_update(self, update_id: int) -> bool:
+        if update_id in self._seen_update_ids:
+            return True
+        self._seen_update_ids.add(update_id)
+        self._seen_update_order.append(update_id)
+        if len(self._seen_update_order) > Config.SEEN_UPDATES_WINDOW:
+            self._seen_update_ids.discard(self._seen_update_order.popleft())
+        return False
+
+    def dispatch_update(self, upd):
+        """Lancer le traitement d'une update Telegram dans une tâche (sans attendre)."""
+        if self._is_duplicate_update(upd.update_id):
+            return
+        if getattr(upd, 'message', None):
+            if not self.chat_id:
+                self.chat_id = upd.message.chat_id
+            text = (upd.message.text or '').strip()
+            if text.startswith('/'):
+                self._spawn_handler(upd.message.chat_id, text.split()[0], self._handle_command(text, upd.message.chat_id))
+        elif getattr(upd, 'callback_query', None):
+            cq = upd.callback_query
+            chat_id = cq.message.chat_id if cq.message else cq.from_user.id
+            self._spawn_handler(chat_id, f"callback {cq.data or ''}"[:40], self._handle_callback_query(cq))
+
+    def _spawn_handler(self, chat_id, label: str, coro):
+        task = asyncio.create_task(self._run_handler(chat_id, label, coro))
+        self._command_tasks.add(task)
+        task.add_done_callback(self._command_tasks.discard)
+
+    async def _run_handler(self, chat_id, label: str, coro):
+        """Exécuter un handler: ordre par chat, plafond global, délai maximal.
+
+        Au-delà de COMMAND_TIMEOUT_SECONDS le handler est annulé; le chat et le plafond
+        ne sont libérés qu'à sa fin, ce qui garde l'ordre des commandes d'un chat. Les
+        commandes longues (scans, envoi de fichiers) confient leur travail à une tâche
+        de fond et répondent tout de suite.
+        """
+        lock = self._command_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            async with self._command_sem:
+                # Réponses aux commandes: voie prioritaire de la file d'envoi
+                with self.outbox.lane('interactive'):
+                    try:
+                        await asyncio.wait_for(coro, timeout=Config.COMMAND_TIMEOUT_SECONDS)
+                    except asyncio.TimeoutError:
+                        self.logger.warning(f"Commande {label} > {Config.COMMAND_TIMEOUT_SECONDS}s: annulée")
+                        await self._safe_send(chat_id, f"⏱️ Commande {label} interrompue (délai dépassé)")
+                    except Exception as e:
+                        self.logger.warning(f"Commande {label} échouée: {e}")
+
     async def _handle_command(self, text: str, chat_id: int):
         parts = text.split()
         cmd = parts[0].lower()
@@ -334,7 +465,7 @@ class TelegramNotifier:
             "💡 <i>Utilisez les boutons ci-dessous ou tapez /menu pour commencer</i>"
         )
         
-        await self.bot.send_message(
+        await self.outbox.send_message(
             chat_id=chat_id,
             text=help_text,
             parse_mode='HTML',
@@ -350,7 +481,7 @@ class TelegramNotifier:
             "Maintenance: /rescan /rescan_course /bigscan /versions /config /delay /setmode",
             "Historique: /latest /week /digest",
             "Temps: /today /yesterday /last7",
-            "Fichiers: /files_send",
+            "Fichiers: /files_send <id> [force]",
             "Départements ID: /advanced (d<ID> / dt<ID> / dy<ID> / d7<ID>)",
             "Départements NOM: /dep_<slug> (_today _yesterday _last7)",
             "Exemple: /dep_psychologie_et_d_orthophonie_today",
@@ -416,14 +547,10 @@ class TelegramNotifier:
         snap = self.bot_ref.get_course_snapshot(cid)
         if not snap:
             return await self._safe_send(chat_id, "Aucun snapshot pour ce cours")
-        sections = snap.get('sections', [])
-        total_acts = sum(len(s.get('activities', [])) for s in sections)
-        total_res = sum(len(s.get('resources', [])) for s in sections)
-        total_files = sum(len(a.get('files', [])) for s in sections for a in s.get('activities', [])) + \
-                      sum(len(r.get('files', [])) for s in sections for r in s.get('resources', []))
+        counts = snap.counts
         msg = (
-            f"📘 <b>Cours {cid}</b>\nSections: {len(sections)}\n"
-            f"Activités: {total_acts} | Ressources: {total_res} | Fichiers: {total_files}"
+            f"📘 <b>Cours {cid}</b>\nSections: {counts['sections']}\n"
+            f"Activités: {counts['activities']} | Ressources: {counts['resources']} | Fichiers: {counts['files']}"
         )
         await self._safe_send(chat_id, msg)
 
@@ -474,14 +601,8 @@ class TelegramNotifier:
         if not args: return await self._safe_send(chat_id, "Usage: /files <id>")
         snap = self.bot_ref.get_course_snapshot(args[0])
         if not snap: return await self._safe_send(chat_id, "Snapshot absent")
-        file_entries = []
-        for s in snap.get('sections', []):
-            for a in s.get('activities', []):
-                for f in a.get('files', []):
-                    file_entries.append(f"[A] {f.get('name')}")
-            for r in s.get('resources', []):
-                for f in r.get('files', []):
-                    file_entries.append(f"[R] {f.get('name')}")
+        file_entries = [f"[{'A' if kind == 'activity' else 'R'}] {f.name}"
+                        for _, kind, item in snap.iter_items() for f in item.files]
         if not file_entries:
             return await self._safe_send(chat_id, "Aucun fichier détecté")
         await self._safe_send(chat_id, "📄 Fichiers:\n" + '\n'.join(self._escape(x) for x in file_entries[:200]))
@@ -490,9 +611,22 @@ class TelegramNotifier:
         if not args: return await self._safe_send(chat_id, "Usage: /nav <id>")
         snap = self.bot_ref.get_course_snapshot(args[0])
         if not snap: return await self._safe_send(chat_id, "Snapshot absent")
-        text = self._build_nav_text(snap)
+        text = self.view_cache.get(args[0], snap, 'nav', lambda: self._build_nav_text(snap))
         await self._safe_send(chat_id, text)
 
+    def _inline_items(self, cid: str, snap: dict) -> list:
+        """Lignes de la navigation inline d'un cours (mises en cache)."""
+        def build():
+            items = []
+            for s in snap.get('sections', []):
+                items.append(f"📂 {s.get('title')}")
+                for a in s.get('activities', []):
+                    items.append(f"  📋 {a.get('title')}")
+                for r in s.get('resources', []):
+                    items.append(f"  📚 {r.get('title')}")
+            return items
+        return self.view_cache.get(cid, snap, 'inline_items', build)
+
     def _build_nav_text(self, snap: dict) -> str:
         out = [f"📘 Navigation rapide: {snap.get('course_id','')}\n"]
         for s in snap.get('sections', []):
@@ -519,24 +653,25 @@ class TelegramNotifier:
             val = float(args[0])
             from config import Config as C
             C.MESSAGE_DELAY_SECONDS = max(0.1, min(val, 5.0))
+            # Le débit de la file d'envoi suit les limites Telegram (TELEGRAM_PER_CHAT_RATE), pas ce délai
             await self._safe_send(chat_id, f"Délai configuré: {C.MESSAGE_DELAY_SECONDS}s")
         except:
             await self._safe_send(chat_id, "Nombre invalide")
 
     async def _cmd_search(self, chat_id, args):
-        if not args: return await self._safe_send(chat_id, "Usage: /search <mot>")
+        if not args: return await self._safe_send(chat_id, "Usage: /search <mot> | /search ~<mot approché>")
         term = ' '.join(args).lower()
-        matches = []
-        for cid, snap in self.bot_ref.last_courses_content.items():
-            for s in snap.get('sections', []):
-                if term in s.get('title','').lower():
-                    matches.append(f"[{cid}] Section: {s.get('title')}")
-                for a in s.get('activities', []):
-                    if term in a.get('title','').lower():
-                        matches.append(f"[{cid}] Activité: {a.get('title')}")
-                for r in s.get('resources', []):
-                    if term in r.get('title','').lower():
-                        matches.append(f"[{cid}] Ressource: {r.get('title')}")
+        labels = {'section': 'Section', 'activity': 'Activité', 'resource': 'Ressource'}
+        if term.startswith('~'):
+            # Recherche approchée: accents et fautes de frappe tolérés, résultats classés
+            labels.update({'course': 'Département', 'file': 'Fichier'})
+            ranked = self.bot_ref.search_index.fuzzy_search(term[1:], kinds=labels, limit=50)
+            if not ranked:
+                return await self._safe_send(chat_id, "Aucun résultat")
+            lines = [f"[{d['course_id']}] {labels[d['kind']]}: {d['title']} ({int(score * 100)}%)" for d, score in ranked]
+            return await self._safe_send(chat_id, "🔎 Résultats approchés:\n" + '\n'.join(self._escape(m) for m in lines))
+        matches = [f"[{d['course_id']}] {labels[d['kind']]}: {d['title']}"
+                   for d in self.bot_ref.search_index.search(term, kinds=labels, limit=200)]
         if not matches:
             return await self._safe_send(chat_id, "Aucun résultat")
         await self._safe_send(chat_id, "🔎 Résultats:\n" + '\n'.join(self._escape(m) for m in matches[:200]))
@@ -546,7 +681,7 @@ class TelegramNotifier:
         import json
         snap = self.bot_ref.get_course_snapshot(args[0])
         if not snap: return await self._safe_send(chat_id, "Snapshot absent")
-        data = json.dumps(snap, ensure_ascii=False)[:3800]
+        data = json.dumps(snap.to_dict(), ensure_ascii=False)[:3800]
         await self._safe_send(chat_id, f"<b>Export JSON partiel</b>:\n<pre>{self._escape(data)}</pre>", parse_mode='HTML')
 
     async def _cmd_courses_count(self, chat_id, args):
@@ -604,20 +739,13 @@ class TelegramNotifier:
         cid = args[0]
         snap = self.bot_ref.get_course_snapshot(cid)
         if not snap: return await self._safe_send(chat_id, "Snapshot absent")
-        items = []
-        for s in snap.get('sections', []):
-            items.append(f"📂 {s.get('title')}")
-            for a in s.get('activities', []):
-                items.append(f"  📋 {a.get('title')}")
-            for r in s.get('resources', []):
-                items.append(f"  📚 {r.get('title')}")
-        await self._send_inline_page(chat_id, cid, items, 0)
+        await self._send_inline_page(chat_id, cid, self._inline_items(cid, snap), 0)
 
     async def _cmd_inventory_course(self, chat_id, args):
         if not args: return await self._safe_send(chat_id, "Usage: /inventory <id>")
         snap = self.bot_ref.get_course_snapshot(args[0])
         if not snap: return await self._safe_send(chat_id, "Snapshot absent")
-        txt = self._build_nav_text(snap)
+        txt = self.view_cache.get(args[0], snap, 'nav', lambda: self._build_nav_text(snap))
         await self._safe_send(chat_id, txt[:3900])
 
     async def _cmd_versions(self, chat_id, args):
@@ -665,7 +793,7 @@ class TelegramNotifier:
             "Choisissez le type de recherche :"
         )
         
-        await self.bot.send_message(
+        await self.outbox.send_message(
             chat_id=chat_id,
             text=menu_text,
             parse_mode='HTML',
@@ -694,7 +822,7 @@ class TelegramNotifier:
             "Gérez les paramètres du bot :"
         )
         
-        await self.bot.send_message(
+        await self.outbox.send_message(
             chat_id=chat_id,
             text=menu_text,
             parse_mode='HTML',
@@ -742,6 +870,7 @@ class TelegramNotifier:
             "3. Explorez les départements\n\n"
             "🔍 <b>Recherche:</b>\n"
             "• /search <mot> - Recherche globale\n"
+            "• /search ~<mot> - Recherche approchée (accents, fautes)\n"
             "• /find_course <nom> - Trouver un cours\n"
             "• /find_file <nom> - Trouver un fichier\n\n"
             "📊 <b>Statistiques:</b>\n"
@@ -805,19 +934,8 @@ class TelegramNotifier:
             return
         
         search_term = ' '.join(args).lower()
-        matches = []
-        
-        for course_id, content in self.bot_ref.last_courses_content.items():
-            course_name = self._get_course_name(course_id)
-            for section in content.get('sections', []):
-                for activity in section.get('activities', []):
-                    for file_info in activity.get('files', []):
-                        if search_term in file_info.get('name', '').lower():
-                            matches.append(f"• {file_info['name']} (dans {activity['title']} - {course_name})")
-                for resource in section.get('resources', []):
-                    for file_info in resource.get('files', []):
-                        if search_term in file_info.get('name', '').lower():
-                            matches.append(f"• {file_info['name']} (dans {resource['title']} - {course_name})")
+        matches = [f"• {d['title']} (dans {d['parent_title']} - {self._get_course_name(d['course_id'])})"
+                   for d in self.bot_ref.search_index.search(search_term, kinds=('file',), limit=20)]
         
         if matches:
             result_text = f"📄 <b>Fichiers trouvés pour '{search_term}':</b>\n\n" + '\n'.join(matches[:20])
@@ -833,14 +951,8 @@ class TelegramNotifier:
             return
         
         search_term = ' '.join(args).lower()
-        matches = []
-        
-        for course_id, content in self.bot_ref.last_courses_content.items():
-            course_name = self._get_course_name(course_id)
-            for section in content.get('sections', []):
-                for activity in section.get('activities', []):
-                    if search_term in activity.get('title', '').lower():
-                        matches.append(f"• {activity['title']} (dans {section['title']} - {course_name})")
+        matches = [f"• {d['title']} (dans {d['section_title']} - {self._get_course_name(d['course_id'])})"
+                   for d in self.bot_ref.search_index.search(search_term, kinds=('activity',), limit=20)]
         
         if matches:
             result_text = f"📋 <b>Activités trouvées pour '{search_term}':</b>\n\n" + '\n'.join(matches[:20])
@@ -856,14 +968,8 @@ class TelegramNotifier:
             return
         
         search_term = ' '.join(args).lower()
-        matches = []
-        
-        for course_id, content in self.bot_ref.last_courses_content.items():
-            course_name = self._get_course_name(course_id)
-            for section in content.get('sections', []):
-                for resource in section.get('resources', []):
-                    if search_term in resource.get('title', '').lower():
-                        matches.append(f"• {resource['title']} (dans {section['title']} - {course_name})")
+        matches = [f"• {d['title']} (dans {d['section_title']} - {self._get_course_name(d['course_id'])})"
+                   for d in self.bot_ref.search_index.search(search_term, kinds=('resource',), limit=20)]
         
         if matches:
             result_text = f"📚 <b>Ressources trouvées pour '{search_term}':</b>\n\n" + '\n'.join(matches[:20])
@@ -888,7 +994,8 @@ class TelegramNotifier:
         import sys
         
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # Mesure CPU sur 1 s hors de la boucle d'évènements
+            cpu_percent = await asyncio.to_thread(psutil.cpu_percent, 1)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
         except:
@@ -975,17 +1082,9 @@ class TelegramNotifier:
             return
         
         search_term = ' '.join(args).lower()
-        results = []
-        
-        for course_id, content in self.bot_ref.last_courses_content.items():
-            course_name = self._get_course_name(course_id)
-            for section in content.get('sections', []):
-                for activity in section.get('activities', []):
-                    if search_term in activity.get('title', '').lower() or search_term in activity.get('description', '').lower():
-                        results.append(f"📋 {activity['title']} (dans {section['title']} - {course_name})")
-                for resource in section.get('resources', []):
-                    if search_term in resource.get('title', '').lower() or search_term in resource.get('description', '').lower():
-                        results.append(f"📚 {resource['title']} (dans {section['title']} - {course_name})")
+        icons = {'activity': '📋', 'resource': '📚'}
+        results = [f"{icons[d['kind']]} {d['title']} (dans {d['section_title']} - {self._get_course_name(d['course_id'])})"
+                   for d in self.bot_ref.search_index.search(search_term, kinds=icons, with_description=True, limit=30)]
         
         if results:
             result_text = f"🔍 <b>Recherche avancée pour '{search_term}':</b>\n\n" + '\n'.join(results[:30])
@@ -1081,12 +1180,19 @@ class TelegramNotifier:
     
     async def _cmd_debug_info(self, chat_id, args):
         """Informations de debug"""
+        vc = self.view_cache.summary()
+        nav = self.navigation_state.stats()
+        inl = self.inline_state.stats()
         debug_text = (
             "🐛 <b>Debug Info</b>\n\n"
             f"🔧 <b>Bot ref:</b> {'Disponible' if self.bot_ref else 'Non disponible'}\n"
             f"📊 <b>Commandes:</b> {len(self.commands)}\n"
-            f"💾 <b>État navigation:</b> {len(self.navigation_state)} entrées\n"
-            f"🔄 <b>État inline:</b> {len(self.inline_state)} entrées\n"
+            f"💾 <b>État navigation:</b> {nav['entries']}/{nav['max_entries']} entrées "
+            f"({nav['hits']} hits / {nav['misses']} misses, {nav['evictions']} évictions, {nav['expired']} expirées)\n"
+            f"🔄 <b>État inline:</b> {inl['entries']}/{inl['max_entries']} entrées "
+            f"({inl['hits']} hits / {inl['misses']} misses, {inl['evictions']} évictions, {inl['expired']} expirées)\n"
+            f"🗂️ <b>Cache des vues:</b> {vc['courses']} cours, {vc['hits']} hits / {vc['misses']} misses, "
+            f"{vc['invalidations']} invalidations\n"
             f"📱 <b>Chat ID:</b> {self.chat_id}\n"
             f"⏹️ <b>Arrêt demandé:</b> {self.stopped}"
         )
@@ -1212,7 +1318,7 @@ class TelegramNotifier:
             "Sélectionnez un département pour voir ses détails :"
         )
         
-        await self.bot.send_message(
+        await self.outbox.send_message(
             chat_id=chat_id,
             text=menu_text,
             parse_mode='HTML',
@@ -1248,7 +1354,12 @@ class TelegramNotifier:
                      f"Échecs: {bar(fail)}",
                      f"Notifications: {stats['total_notifications']}",
                      f"Cours surveillés: {stats['courses_monitored']}",
-                     f"Erreurs récentes (24h): {stats['recent_errors']}"]
+                     f"Erreurs récentes (24h): {stats['recent_errors']}",
+                     f"Dernier cycle: {stats['pages_parsed']} pages analysées / {stats['pages_skipped_unchanged']} inchangées"]
+            waits = self.outbox.lane_waits
+            lines.append("File d'envoi (attente max): " + ' | '.join(
+                f"{lane} {w['max']:.1f}s" for lane, w in waits.items()
+            ) + f" | en attente: {self.outbox.pending()}")
             await self._safe_send(chat_id, '\n'.join(lines))
         except Exception as e:
             await self._safe_send(chat_id, f"Erreur stats: {e}")
@@ -1391,36 +1502,133 @@ class TelegramNotifier:
     # ================== Envoi fichiers téléchargés ==================
     async def _cmd_send_files_course(self, chat_id, args):
         if not args:
-            return await self._safe_send(chat_id, "Usage: /files_send <id>")
-        await self.send_course_files(args[0])
+            return await self._safe_send(chat_id, "Usage: /files_send <id> [force]")
+        force = len(args) > 1 and args[1].lower() == 'force'
+        # Envoi en tâche de fond: peut dépasser le délai maximal d'une commande
+        task = asyncio.create_task(self.send_course_files(args[0], force=force))
+        self._command_tasks.add(task)
+        task.add_done_callback(self._command_tasks.discard)
         await self._safe_send(chat_id, "📁 Envoi des fichiers demandé (voir messages)")
 
-    async def send_course_files(self, course_id: str, course_name: str = None):
+    async def send_course_files(self, course_id: str, course_name: str = None, force: bool = False):
         if not Config.SEND_FILES_AS_DOCUMENTS:
             return
         import os
         root = os.path.join('downloads', course_id)
         if not os.path.exists(root):
             return
-        for dirpath, _, files in os.walk(root):
-            for f in files:
-                full = os.path.join(dirpath, f)
+        paths = [os.path.join(dirpath, f) for dirpath, _, files in os.walk(root) for f in files]
+        await self.send_files(paths, course_name or course_id, force=force)
+
+    async def _file_digest(self, path: str):
+        """Empreinte du contenu d'un fichier téléchargé (index des blobs, sinon calcul)."""
+        blob_store = getattr(getattr(self.bot_ref, 'firebase', None), 'blob_store', None)
+        digest = blob_store.digest_for_path(path) if blob_store else None
+        if digest:
+            return digest
+        from blob_store import BlobStore
+        executor = getattr(self.bot_ref, 'executor', None)
+        if executor:
+            return await executor.run(BlobStore.hash_file, path)
+        return BlobStore.hash_file(path)
+
+    async def send_files(self, paths: list, course_name: str, force: bool = False):
+        """Envoyer exactement les fichiers locaux donnés (documents Telegram).
+
+        Un contenu déjà livré à ce chat est ignoré (sauf force); un contenu déjà
+        téléversé une fois est renvoyé par son file_id, sans nouveau téléversement.
+        Les documents partent par groupes (sendMediaGroup, 10 max), quelques groupes
+        en parallèle, au rythme de la file d'envoi.
+        """
+        if not Config.SEND_FILES_AS_DOCUMENTS:
+            return
+        import os
+        pending = []
+        digests = set()
+        for full in paths:
+            try:
+                digest = await self._file_digest(full)
+                # Même contenu sous plusieurs chemins (cours différents): un seul envoi
+                if digest in digests:
+                    continue
+                if not force and self.sent_ledger.was_delivered(self.chat_id, digest):
+                    continue
+                if os.path.getsize(full) > 49 * 1024 * 1024:
+                    continue
+                digests.add(digest)
+                pending.append((full, os.path.basename(full), digest))
+            except Exception as e:
+                self.logger.warning(f"Fichier ignoré {full}: {e}")
+        if not pending:
+            return
+        size = max(1, min(10, Config.FILE_MEDIA_GROUP_SIZE)) if InputMediaDocument else 1
+        groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+        sem = asyncio.Semaphore(max(1, Config.FILE_SEND_CONCURRENCY))
+
+        async def _deliver(group):
+            async with sem:
                 try:
-                    size = os.path.getsize(full)
-                    if size > 49 * 1024 * 1024:
-                        continue
-                    caption = f"{course_name or course_id}\n{f}"[:100]
-                    with open(full, 'rb') as fh:
-                        await self.bot.send_document(chat_id=self.chat_id, document=fh, filename=f, caption=caption)
-                    # Enregistrer dans contexte bigscan si actif
-                    if self.bot_ref and getattr(self.bot_ref, 'current_bigscan', None) is not None:
-                        try:
-                            self.bot_ref.current_bigscan.setdefault('files_sent', set()).add(f)
-                        except Exception:
-                            pass
-                    await asyncio.sleep(0.8)
+                    await self._send_file_group(group, course_name)
                 except Exception as e:
-                    self.logger.warning(f"Envoi fichier échoué {f}: {e}")
+                    self.logger.warning(f"Envoi groupe de fichiers échoué ({len(group)}): {e}")
+
+        try:
+            await asyncio.gather(*(_deliver(g) for g in groups))
+        finally:
+            # Registre écrit une fois pour le lot, hors de la boucle d'événements
+            await self._flush_ledger()
+
+    async def _flush_ledger(self):
+        executor = getattr(self.bot_ref, 'executor', None)
+        if executor:
+            await executor.run(self.sent_ledger.flush)
+        else:
+            self.sent_ledger.flush()
+
+    async def _send_file_group(self, group: list, course_name: str, use_file_ids: bool = True):
+        """Envoyer un groupe [(chemin, nom, sha)] en un appel et enregistrer les livraisons."""
+        handles = []
+        try:
+            media = []
+            for full, f, digest in group:
+                caption = f"{course_name}\n{f}"[:100]
+                file_id = self.sent_ledger.get_file_id(digest) if use_file_ids else None
+                if file_id:
+                    media.append((file_id, f, caption))
+                else:
+                    fh = open(full, 'rb')
+                    handles.append(fh)
+                    media.append((fh, f, caption))
+            try:
+                if len(media) == 1:
+                    document, f, caption = media[0]
+                    kwargs = {} if isinstance(document, str) else {'filename': f}
+                    messages = [await self.outbox.send_document(chat_id=self.chat_id, document=document, caption=caption,
+                                                                ordered=False, **kwargs)]
+                else:
+                    messages = await self.outbox.send_media_group(chat_id=self.chat_id, ordered=False, media=[
+                        InputMediaDocument(media=document, caption=caption,
+                                           **({} if isinstance(document, str) else {'filename': f}))
+                        for document, f, caption in media
+                    ])
+            except TelegramError as e:
+                # file_id périmé: oublier ceux du groupe et re-téléverser une fois
+                if use_file_ids and any(isinstance(m[0], str) for m in media):
+                    self.logger.info(f"file_id refusé, nouveau téléversement du groupe: {e}")
+                    for _, _, digest in group:
+                        self.sent_ledger.forget_file_id(digest)
+                    return await self._send_file_group(group, course_name, use_file_ids=False)
+                raise
+        finally:
+            for fh in handles:
+                fh.close()
+        bigscan = getattr(self.bot_ref, 'current_bigscan', None) if self.bot_ref else None
+        for (full, f, digest), msg in zip(group, messages):
+            document = getattr(msg, 'document', None)
+            self.sent_ledger.record(self.chat_id, digest, f, document.file_id if document else None, save=False)
+            # Enregistrer dans contexte bigscan si actif
+            if bigscan is not None:
+                bigscan.setdefault('files_sent', set()).add(f)
 
     async def send_bigscan_files_summary(self, ctx: dict):
         """Envoyer un résumé final après bigscan (nombre de cours, fichiers envoyés)."""
@@ -1446,7 +1654,7 @@ class TelegramNotifier:
             msg.append(f"Début: {start}")
             msg.append(f"Fin: {end}")
             msg = '\n'.join(msg)
-            await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
+            await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
         except Exception as e:
             self.logger.warning(f"Résumé bigscan échoué: {e}")
 
@@ -1459,7 +1667,11 @@ class TelegramNotifier:
                 page = int(page_s)
                 state_key = f"{cid}"
                 st = self.inline_state.get(state_key)
-                if not st: return
+                if not st:
+                    # État expiré ou évincé: reconstruire la liste depuis le snapshot
+                    snap = self.bot_ref.get_course_snapshot(cid) if self.bot_ref else None
+                    if not snap: return
+                    st = self.inline_state[state_key] = {'items': self._inline_items(cid, snap)}
                 await self._edit_inline_page(cq.message.chat_id, cq.message.message_id, cid, st['items'], page)
             
             elif data.startswith('dep:'):
@@ -1578,7 +1790,7 @@ class TelegramNotifier:
             "Choisissez une action :"
         )
         
-        await self.bot.send_message(
+        await self.outbox.send_message(
             chat_id=chat_id,
             text=menu_text,
             parse_mode='HTML',
@@ -1593,7 +1805,7 @@ class TelegramNotifier:
         chunk = items[start:end]
         text = f"📘 <b>Navigation {cid}</b> (page {page+1})\n" + '\n'.join(self._escape(x) for x in chunk)
         kb = self._build_nav_keyboard(cid, page, len(items))
-        msg = await self.bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML', reply_markup=kb)
+        msg = await self.outbox.send_message(chat_id=chat_id, text=text, parse_mode='HTML', reply_markup=kb)
         return msg
 
     async def _edit_inline_page(self, chat_id, message_id, cid, items, page):
@@ -1603,7 +1815,7 @@ class TelegramNotifier:
         text = f"📘 <b>Navigation {cid}</b> (page {page+1})\n" + '\n'.join(self._escape(x) for x in chunk)
         kb = self._build_nav_keyboard(cid, page, len(items))
         try:
-            await self.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode='HTML', reply_markup=kb)
+            await self.outbox.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode='HTML', reply_markup=kb)
         except Exception as e:
             self.logger.warning(f"Edit inline failed: {e}")
 
@@ -1655,7 +1867,7 @@ class TelegramNotifier:
             "Choisissez une option ci-dessous :"
         )
         
-        await self.bot.send_message(
+        await self.outbox.send_message(
             chat_id=chat_id,
             text=menu_text,
             parse_mode='HTML',
@@ -1709,7 +1921,7 @@ class TelegramNotifier:
                     # Accept as menu:bigscan callback branch in handler
                     pass
         kb = InlineKeyboardMarkup(rows)
-        await self.bot.send_message(chat_id=chat_id, text=txt, reply_markup=kb)
+        await self.outbox.send_message(chat_id=chat_id, text=txt, reply_markup=kb)
 
     async def _cmd_first_scan(self, chat_id, args):
         """Lancer le premier scan complet (inventaire initial)"""
@@ -1722,13 +1934,15 @@ class TelegramNotifier:
                 f"✅ Premier scan déjà effectué le {self.bot_ref.initial_scan_completed_at.strftime('%d/%m/%Y à %H:%M:%S')}\n\n"
                 "Utilisez /bigscan pour forcer un nouveau scan complet."
             )
+        if self.bot_ref.full_scan_running():
+            return await self._safe_send(chat_id, "⏳ Un scan complet est déjà en cours, patientez jusqu'à la fin.")
         
         # Demander confirmation
         kb = InlineKeyboardMarkup([
             [InlineKeyboardButton('✅ Oui, lancer le premier scan', callback_data='firstscan:confirm:yes')],
             [InlineKeyboardButton('❌ Annuler', callback_data='firstscan:confirm:no')]
         ])
-        await self.bot.send_message(
+        await self.outbox.send_message(
             chat_id=chat_id, 
             text="🔍 <b>Premier scan complet</b>\n\n"
                  "Cette commande va lancer l'inventaire initial de tous les cours surveillés.\n"
@@ -1753,14 +1967,15 @@ class TelegramNotifier:
         kb = InlineKeyboardMarkup([
             [InlineKeyboardButton('✅ Oui', callback_data='bigscan:confirm:yes'), InlineKeyboardButton('❌ Non', callback_data='bigscan:confirm:no')]
         ])
-        await self.bot.send_message(chat_id=chat_id, text="⚠️ Lancer un BIG SCAN complet ?\nCela peut être long et télécharger beaucoup de fichiers.", reply_markup=kb)
+        await self.outbox.send_message(chat_id=chat_id, text="⚠️ Lancer un BIG SCAN complet ?\nCela peut être long et télécharger beaucoup de fichiers.", reply_markup=kb)
 
     async def _launch_bigscan(self, chat_id):
         from time import time as _time
-        self.last_bigscan_ts = _time()
         if not self.bot_ref:
             return await self._safe_send(chat_id, "Bot ref indisponible")
-        self.bot_ref.trigger_big_scan()
+        if not self.bot_ref.trigger_big_scan():
+            return await self._safe_send(chat_id, "⏳ Un scan complet est déjà en cours, patientez jusqu'à la fin.")
+        self.last_bigscan_ts = _time()
         await self._safe_send(chat_id, "🚀 Big scan lancé (inventaire complet + fichiers si activés)")
 
     async def _launch_first_scan(self, chat_id):
@@ -1768,18 +1983,11 @@ class TelegramNotifier:
         if not self.bot_ref:
             return await self._safe_send(chat_id, "❌ Bot non disponible")
         
-        # Forcer le premier scan
-        self.bot_ref.force_full_initial = True
-        # Activer téléchargement des fichiers seulement pendant ce premier scan
-        self.bot_ref.scraper.enable_file_download = Config.SEND_FILES_AS_DOCUMENTS
-        
+        # Inventaire forcé en tâche de fond (tâche gardée par le bot: pas de scans superposés);
+        # check_all_courses choisit sa voie (inventaire = 'bulk'), pas celle de la commande
+        if not self.bot_ref.trigger_big_scan():
+            return await self._safe_send(chat_id, "⏳ Un scan complet est déjà en cours, patientez jusqu'à la fin.")
         await self._safe_send(chat_id, "🚀 Premier scan lancé (inventaire initial + fichiers si activés)")
-        
-        # Lancer le scan initial
-        await self.bot_ref.check_all_courses(is_initial_scan=True)
-        
-        # Après le premier scan, désactiver téléchargement automatique
-        self.bot_ref.scraper.enable_file_download = False
 
     async def _cmd_last_files(self, chat_id, args):
         """Lister les derniers fichiers ajoutés sur 7 jours."""
@@ -1844,6 +2052,10 @@ class TelegramNotifier:
             lines = [f"{header}", f"{bar} {percent:.1f}%", f"Cours: {done}/{total}"]
             if eta_seconds:
                 lines.append(f"Estimation restante: {mins}m{secs:02d}s")
+            dl = ctx.get('downloads') or {}
+            if dl.get('queued'):
+                failed = f" ({dl.get('failed', 0)} échecs)" if dl.get('failed') else ''
+                lines.append(f"Téléchargements: {dl.get('done', 0) + dl.get('failed', 0)}/{dl['queued']}{failed}")
             if ctx.get('files_sent'):
                 lines.append(f"Fichiers envoyés: {len(ctx['files_sent'])}")
             txt = '\n'.join(lines)
@@ -1899,18 +2111,13 @@ class TelegramNotifier:
             else:
                 chunks = self._build_messages_split(course_name, course_url, changes)
                 for part in chunks:
-                    msg = await self.bot.send_message(chat_id=self.chat_id, text=part, parse_mode='HTML', disable_web_page_preview=True)
+                    msg = await self.outbox.send_message(chat_id=self.chat_id, text=part, parse_mode='HTML', disable_web_page_preview=True)
                     sent_ids.append(msg.message_id)
-                    await asyncio.sleep(0.15)
-            if self.bot_ref and getattr(self.bot_ref, 'firebase', None):
-                for mid in sent_ids:
-                    try:
-                        self.bot_ref.firebase.save_message_record(course_url.split('=')[-1], mid, 'notification', {
-                            'initial': is_initial_scan,
-                            'changes_count': len(changes)
-                        })
-                    except Exception:
-                        pass
+            for mid in sent_ids:
+                await self._save_message_record(course_url.split('=')[-1], mid, 'notification', {
+                    'initial': is_initial_scan,
+                    'changes_count': len(changes)
+                })
             self.logger.info(f"Notification envoyée pour le cours: {course_name}")
             return True
         except TelegramError as e:
@@ -1920,37 +2127,26 @@ class TelegramNotifier:
             self.logger.error(f"Erreur lors de l'envoi de la notification: {str(e)}")
             return False
 
-    async def send_department_complete_message(self, course_name: str, course_id: str, content: dict):
+    async def _save_message_record(self, course_id: str, message_id: int, kind: str, meta: dict = None):
+        """Enregistrer l'ID d'un message envoyé via le pool bloquant du bot (Firestore/local)."""
+        if not (self.bot_ref and getattr(self.bot_ref, 'firebase', None)):
+            return
+        try:
+            await self.bot_ref.executor.run(self.bot_ref.firebase.save_message_record, course_id, message_id, kind, meta)
+        except Exception:
+            pass
+
+    async def send_department_complete_message(self, course_name: str, course_id: str, content):
         """Message court envoyé après inventaire complet d'un département (cours) au premier scan."""
         try:
             if not self.chat_id:
                 return
-            sections = content.get('sections', [])
-            acts = sum(len(s.get('activities', [])) for s in sections)
-            res = sum(len(s.get('resources', [])) for s in sections)
-            files = 0
-            for s in sections:
-                for a in s.get('activities', []):
-                    files += len(a.get('files', []))
-                for r in s.get('resources', []):
-                    files += len(r.get('files', []))
-                    msg = (f"✅ <b>Inventaire terminé</b> — {self._escape(course_name)}\n"
-                           f"Sections: {len(sections)} | Activités: {acts} | Ressources: {res} | Fichiers: {files}")
-                    msg = await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
-                    if self.bot_ref and getattr(self.bot_ref, 'firebase', None):
-                        try:
-                            self.bot_ref.firebase.save_message_record(course_id, msg.message_id, 'dept_summary', {
-                                'sections': len(sections), 'activities': acts, 'resources': res, 'files': files
-                            })
-                        except Exception:
-                            pass
-                if self.bot_ref and getattr(self.bot_ref, 'firebase', None):
-                    try:
-                        self.bot_ref.firebase.save_message_record(course_id, msg.message_id, 'dept_summary', {
-                            'sections': len(sections), 'total_items': total_items
-                        })
-                    except Exception:
-                        pass
+            counts = content.counts
+            msg = (f"✅ <b>Inventaire terminé</b> — {self._escape(course_name)}\n"
+                   f"Sections: {counts['sections']} | Activités: {counts['activities']} | "
+                   f"Ressources: {counts['resources']} | Fichiers: {counts['files']}")
+            sent = await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
+            await self._save_message_record(course_id, sent.message_id, 'dept_summary', dict(counts))
         except Exception as e:
             self.logger.warning(f"dept complete msg échoué {course_id}: {e}")
 
@@ -1960,15 +2156,11 @@ class TelegramNotifier:
             if not self.chat_id:
                 return
             msg = f"ℹ️ Pas de mise à jour pour <b>{self._escape(course_name)}</b> ce cycle"
-            sent = await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
-            if self.bot_ref and getattr(self.bot_ref, 'firebase', None):
-                try:
-                    self.bot_ref.firebase.save_message_record(course_id, sent.message_id, 'no_update', {
-                        'course': course_name,
-                        'timestamp': datetime.now().isoformat()
-                    })
-                except Exception:
-                    pass
+            sent = await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
+            await self._save_message_record(course_id, sent.message_id, 'no_update', {
+                'course': course_name,
+                'timestamp': datetime.now().isoformat()
+            })
         except Exception as e:
             self.logger.warning(f"no-update msg échoué {course_id}: {e}")
     
@@ -1980,24 +2172,11 @@ class TelegramNotifier:
             
             # Obtenir les statistiques du cours
             snap = self.bot_ref.get_course_snapshot(course_id) if self.bot_ref else None
-            sections_count = 0
-            activities_count = 0
-            resources_count = 0
-            files_count = 0
-            
-            if snap:
-                sections = snap.get('sections', [])
-                sections_count = len(sections)
-                for section in sections:
-                    activities = section.get('activities', [])
-                    resources = section.get('resources', [])
-                    activities_count += len(activities)
-                    resources_count += len(resources)
-                    
-                    for activity in activities:
-                        files_count += len(activity.get('files', []))
-                    for resource in resources:
-                        files_count += len(resource.get('files', []))
+            counts = snap.counts if snap else {}
+            sections_count = counts.get('sections', 0)
+            activities_count = counts.get('activities', 0)
+            resources_count = counts.get('resources', 0)
+            files_count = counts.get('files', 0)
             
             # Construire le message
             msg_lines = [
@@ -2015,21 +2194,17 @@ class TelegramNotifier:
             ]
             
             msg = '\n'.join(msg_lines)
-            sent = await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
+            sent = await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
             
             # Enregistrer le message
-            if self.bot_ref and getattr(self.bot_ref, 'firebase', None):
-                try:
-                    self.bot_ref.firebase.save_message_record(course_id, sent.message_id, 'no_changes', {
-                        'course': course_name,
-                        'sections': sections_count,
-                        'activities': activities_count,
-                        'resources': resources_count,
-                        'files': files_count,
-                        'timestamp': datetime.now().isoformat()
-                    })
-                except Exception:
-                    pass
+            await self._save_message_record(course_id, sent.message_id, 'no_changes', {
+                'course': course_name,
+                'sections': sections_count,
+                'activities': activities_count,
+                'resources': resources_count,
+                'files': files_count,
+                'timestamp': datetime.now().isoformat()
+            })
                     
         except Exception as e:
             self.logger.warning(f"no-changes msg échoué {course_id}: {e}")
@@ -2070,14 +2245,10 @@ class TelegramNotifier:
             total_resources = 0
             total_files = 0
             for cid, data in contents.items():
-                for s in data.get('sections', []):
-                    total_sections += 1
-                    total_activities += len(s.get('activities', []))
-                    total_resources += len(s.get('resources', []))
-                    for a in s.get('activities', []):
-                        total_files += len(a.get('files', []))
-                    for r in s.get('resources', []):
-                        total_files += len(r.get('files', []))
+                total_sections += data.counts['sections']
+                total_activities += data.counts['activities']
+                total_resources += data.counts['resources']
+                total_files += data.counts['files']
             msg = (
                 "📊 <b>Résumé Initial Global</b>\n" \
                 f"Cours: {total_courses} | Sections: {total_sections}\n" \
@@ -2085,7 +2256,7 @@ class TelegramNotifier:
                 f"Fichiers: {total_files} | Mode inventaire: {Config.INITIAL_SCAN_DETAIL_LEVEL}\n" \
                 f"Versioning: {'ON' if Config.COURSE_VERSIONING else 'OFF'}"
             )
-            await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
+            await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
         except Exception as e:
             self.logger.warning(f"Résumé global initial échoué: {e}")
 
@@ -2093,7 +2264,7 @@ class TelegramNotifier:
         try:
             if not self.chat_id:
                 return
-            await self.bot.send_message(chat_id=self.chat_id, text="🔄 Aucun nouveau changement sur ce cycle", parse_mode='HTML')
+            await self.outbox.send_message(chat_id=self.chat_id, text="🔄 Aucun nouveau changement sur ce cycle", parse_mode='HTML')
         except Exception as e:
             self.logger.warning(f"no updates msg échoué: {e}")
 
@@ -2125,7 +2296,7 @@ class TelegramNotifier:
             "",
             "⏳ <i>Analyse détaillée du contenu existant...</i>"
         ]
-        await self.bot.send_message(chat_id=self.chat_id, text='\n'.join(intro), parse_mode='HTML', disable_web_page_preview=True)
+        await self.outbox.send_message(chat_id=self.chat_id, text='\n'.join(intro), parse_mode='HTML', disable_web_page_preview=True)
 
         # 2. Résumé global
         grouped_changes = self._group_changes_by_type(changes)
@@ -2135,31 +2306,30 @@ class TelegramNotifier:
                 summary_lines.append(f"{self._get_type_emoji(change_type)} {self._get_type_name(change_type)}: <b>{len(items)}</b>")
         summary_lines.append("")
         summary_lines.append(f"⏰ <i>Généré le {self._get_current_time()}</i>")
-        await self.bot.send_message(chat_id=self.chat_id, text='\n'.join(summary_lines), parse_mode='HTML')
+        await self.outbox.send_message(chat_id=self.chat_id, text='\n'.join(summary_lines), parse_mode='HTML')
 
         # 3. Détails section par section
         section_messages = self._build_detailed_initial_sections(changes)
         for msg in section_messages:
             # Découper si > 3900 caractères (limite Telegram ~4096)
             if len(msg) <= 3900:
-                await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML', disable_web_page_preview=True)
+                await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML', disable_web_page_preview=True)
             else:
                 # Split propre par double saut de ligne
                 parts = self._split_long_message(msg)
                 for part in parts:
-                    await self.bot.send_message(chat_id=self.chat_id, text=part, parse_mode='HTML', disable_web_page_preview=True)
-            await asyncio.sleep(0.3)  # petite pause pour éviter le flood
+                    await self.outbox.send_message(chat_id=self.chat_id, text=part, parse_mode='HTML', disable_web_page_preview=True)
 
         # 4. Conclusion
         conclusion = f"✅ <b>Scan initial terminé</b>\n\nTotal: <b>{len(grouped_changes.get('existing_activity', [])) + len(grouped_changes.get('existing_resource', [])) + len(grouped_changes.get('existing_file', []))}</b> éléments listés."
-        await self.bot.send_message(chat_id=self.chat_id, text=conclusion, parse_mode='HTML')
+        await self.outbox.send_message(chat_id=self.chat_id, text=conclusion, parse_mode='HTML')
 
     async def _send_separate_initial_scan(self, course_name: str, course_url: str, changes: list):
         """Envoyer chaque section / activité / ressource séparément dans l'ordre (streaming)."""
         header = f"🔍 <b>Inventaire initial</b>\n📚 <b>Cours:</b> {course_name}\n🔗 <a href='{course_url}'>Ouvrir</a>\n"\
                  f"⚙️ Mode: Séparé\n"\
                  f"⏰ {self._get_current_time()}"
-        await self.bot.send_message(chat_id=self.chat_id, text=header, parse_mode='HTML', disable_web_page_preview=True)
+        await self.outbox.send_message(chat_id=self.chat_id, text=header, parse_mode='HTML', disable_web_page_preview=True)
 
         current_section = None
         activity_index = 0
@@ -2171,31 +2341,27 @@ class TelegramNotifier:
                 activity_index = 0
                 resource_index = 0
                 msg = f"\n📂 <b>Section:</b> {self._escape(current_section)}\n📝 {self._escape(change.get('details',''))}"
-                await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
-                await asyncio.sleep(Config.MESSAGE_DELAY_SECONDS)
+                await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
             elif ctype == 'existing_activity':
                 activity_index += 1
                 title = change.get('activity_title','Sans titre')
                 details = change.get('details','')
                 msg = f"📋 <b>Activité {activity_index}</b> — {self._escape(title)}\n<i>{self._escape(details)}</i>"
-                await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
-                await asyncio.sleep(Config.MESSAGE_DELAY_SECONDS)
+                await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
             elif ctype == 'existing_resource':
                 resource_index += 1
                 title = change.get('resource_title','Sans titre')
                 details = change.get('details','')
                 msg = f"📚 <b>Ressource {resource_index}</b> — {self._escape(title)}\n<i>{self._escape(details)}</i>"
-                await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
-                await asyncio.sleep(Config.MESSAGE_DELAY_SECONDS)
+                await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML')
             elif ctype == 'existing_file':
                 file_name = change.get('file_name','Fichier')
                 parent = change.get('parent_title','')
                 msg = f"📄 <b>Fichier</b>: {self._escape(file_name)}\n📁 Dans: {self._escape(parent)}"
-                await self.bot.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML', disable_web_page_preview=True)
-                await asyncio.sleep(Config.MESSAGE_DELAY_SECONDS)
+                await self.outbox.send_message(chat_id=self.chat_id, text=msg, parse_mode='HTML', disable_web_page_preview=True)
 
         footer = f"✅ <b>Fin inventaire:</b> {course_name}\n⏰ {self._get_current_time()}"
-        await self.bot.send_message(chat_id=self.chat_id, text=footer, parse_mode='HTML')
+        await self.outbox.send_message(chat_id=self.chat_id, text=footer, parse_mode='HTML')
 
     async def _send_deferred_initial_inventory(self, course_name: str, course_url: str, changes: list):
         """Construire un inventaire complet et l'envoyer en un seul lot structuré avec liens fichiers et ressources."""
@@ -2271,7 +2437,7 @@ class TelegramNotifier:
         full_text = '\n'.join(parts)
         sent_ids = []
         for chunk in self._paginate(full_text):
-            msg = await self.bot.send_message(chat_id=self.chat_id, text=chunk, parse_mode='HTML', disable_web_page_preview=True)
+            msg = await self.outbox.send_message(chat_id=self.chat_id, text=chunk, parse_mode='HTML', disable_web_page_preview=True)
             sent_ids.append(msg.message_id)
         return sent_ids
 
@@ -2368,16 +2534,16 @@ class TelegramNotifier:
                     await self._safe_send(chat_id, chunk, parse_mode=parse_mode)
                 return
             try:
-                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode, disable_web_page_preview=True)
+                await self.outbox.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode, disable_web_page_preview=True)
             except TelegramError as te:
                 # Retry plain text if formatting or length error
                 if any(k in str(te).lower() for k in ['unsupported start tag','parse entities','too long']):
                     clean = self._strip_html(text)[:4090]
                     if len(clean) > 3900:
                         for chunk in self._paginate(clean):
-                            await self.bot.send_message(chat_id=chat_id, text=chunk)
+                            await self.outbox.send_message(chat_id=chat_id, text=chunk)
                     else:
-                        await self.bot.send_message(chat_id=chat_id, text=clean)
+                        await self.outbox.send_message(chat_id=chat_id, text=clean)
                 else:
                     raise
         except Exception as e:
@@ -2407,9 +2573,12 @@ class TelegramNotifier:
             'resource_added': '➕',
             'resource_removed': '➖',
             'file_added': '📁',
+            'file_updated': '🔄',
             'file_removed': '🗑️',
             'activity_description_changed': '✏️',
-            'section_renamed': '🔁'
+            'section_renamed': '🔁',
+            'activity_renamed': '🔁',
+            'resource_renamed': '🔁'
         }
         return emoji_map.get(change_type, '📝')
     
@@ -2427,12 +2596,19 @@ class TelegramNotifier:
             'resource_added': 'Nouvelles ressources',
             'resource_removed': 'Ressources supprimées',
             'file_added': 'Nouveaux fichiers',
+            'file_updated': 'Fichiers mis à jour',
             'file_removed': 'Fichiers supprimés',
             'activity_description_changed': 'Descriptions modifiées',
-            'section_renamed': 'Sections renommées'
+            'section_renamed': 'Sections renommées',
+            'activity_renamed': 'Activités renommées',
+            'resource_renamed': 'Ressources renommées'
         }
         return name_map.get(change_type, 'Autres')
     
+    def _build_messages_split(self, course_name: str, course_url: str, changes: list) -> list:
+        """Message de notification découpé en morceaux compatibles avec la limite Telegram."""
+        return self._paginate(self._build_message(course_name, course_url, changes))
+
     def _build_message(self, course_name: str, course_url: str, changes: list, is_initial_scan: bool = False) -> str:
         """Construire le message de notification"""
         if is_initial_scan:
@@ -2505,7 +2681,7 @@ class TelegramNotifier:
             message += "🔔 Vous recevrez une notification dès qu'un changement sera détecté !\n\n"
             message += "🔍 <b>Premier scan en cours...</b>"
             
-            await self.bot.send_message(
+            await self.outbox.send_message(
                 chat_id=self.chat_id,
                 text=message,
                 parse_mode='HTML'
@@ -2529,7 +2705,7 @@ class TelegramNotifier:
             
             message = f"❌ <b>Erreur du Bot</b>\n\n{error_message}"
             
-            await self.bot.send_message(
+            await self.outbox.send_message(
                 chat_id=self.chat_id,
                 text=message,
                 parse_mode='HTML'
@@ -0,0 +1,205 @@
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import logging
+import time
+from config import Config
+from rate_limiter import TokenBucket
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+# Voies de priorité des envois (plus petit = servi en premier dans la file d'un chat):
+# réponses aux commandes, notifications de changements, trafic de masse (inventaire, fichiers)
+LANES = {'interactive': 0, 'notify': 1, 'bulk': 2}
+# Voie courante, portée par le contexte de la tâche qui envoie
+send_lane = contextvars.ContextVar('send_lane', default='notify')
+
+class TelegramOutbox:
+    """File d'envoi centrale vers l'API Telegram.
+
+    Tous les appels sortants (send_message, send_document, send_media_group,
+    edit_message_text) passent par cette file: un seau à jetons global et un
+    seau par chat appliquent les limites Telegram au débit maximal autorisé,
+    RetryAfter est respecté (le chat est mis en pause le temps demandé) et les
+    erreurs réseau transitoires sont réessayées. Les envois vers un même chat
+    partent dans l'ordre de mise en file au sein d'une même voie; une réponse à une
+    commande (voie 'interactive') passe devant les notifications, l'inventaire et les
+    téléversements de fichiers (toujours en voie 'bulk') en attente.
+    """
+    def __init__(self, bot, global_rate: float = None, per_chat_rate: float = None, max_retries: int = None):
+        self.bot = bot
+        self.logger = logging.getLogger(__name__)
+        self.global_bucket = TokenBucket(global_rate or Config.TELEGRAM_GLOBAL_RATE)
+        self.per_chat_rate = per_chat_rate or Config.TELEGRAM_PER_CHAT_RATE
+        self.group_chat_rate = Config.TELEGRAM_GROUP_CHAT_RATE
+        self.max_retries = Config.TELEGRAM_SEND_RETRIES if max_retries is None else max_retries
+        # Une file et un worker par chat: ordre conservé, et une pause RetryAfter
+        # sur un chat ne bloque pas les autres
+        self._loop = None
+        self._queues = {}
+        self._tasks = {}
+        self._chat_buckets = {}
+        # Téléversements (ordered=False) simultanés, tous chats confondus
+        self._upload_slots = asyncio.Semaphore(max(1, Config.FILE_SEND_CONCURRENCY))
+        self._uploads = set()
+        # Réveil des workers en attente d'un créneau (créneau libéré ou nouvel envoi)
+        self._wakeup = asyncio.Event()
+        self._seq = itertools.count()
+        self.stats = {'sent': 0, 'retry_after': 0, 'retried': 0, 'failed': 0}
+        # Attente en file par voie (s): dernière et maximale
+        self.lane_waits = {name: {'last': 0.0, 'max': 0.0} for name in LANES}
+
+    # ===================== API publique =====================
+    async def send_message(self, **kwargs):
+        return await self.call('send_message', **kwargs)
+
+    async def send_document(self, **kwargs):
+        return await self.call('send_document', **kwargs)
+
+    async def send_media_group(self, **kwargs):
+        # Un groupe compte pour autant de messages que de documents
+        return await self.call('send_media_group', cost=len(kwargs.get('media') or []) or 1, **kwargs)
+
+    async def edit_message_text(self, **kwargs):
+        return await self.call('edit_message_text', **kwargs)
+
+    async def call(self, method: str, cost: float = 1, ordered: bool = True, **kwargs):
+        """Mettre en file un appel Bot et attendre son résultat (ou son exception).
+
+        ordered=False (documents): mis en file dans la voie 'bulk', derrière les réponses
+        et notifications; le worker du chat le lance sans attendre sa fin, ce qui laisse
+        jusqu'à FILE_SEND_CONCURRENCY téléversements se chevaucher.
+        """
+        chat_id = kwargs.get('chat_id')
+        queue = self._chat_queue(chat_id)
+        lane = send_lane.get() if ordered else 'bulk'
+        future = self._loop.create_future()
+        await queue.put((LANES.get(lane, LANES['notify']), next(self._seq), lane, time.monotonic(),
+                         method, kwargs, cost, ordered, future))
+        self._wakeup.set()
+        return await future
+
+    @contextlib.contextmanager
+    def lane(self, name: str):
+        """Envoyer dans la voie `name` pour le bloc (et les tâches qu'il crée)."""
+        token = send_lane.set(name)
+        try:
+            yield
+        finally:
+            send_lane.reset(token)
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues.values())
+
+    # ===================== Workers =====================
+    def _chat_queue(self, chat_id):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Nouvelle boucle (redémarrage): files et seaux liés à la boucle courante
+            self._loop = loop
+            self._queues = {}
+            self._tasks = {}
+            self._chat_buckets = {}
+            self._upload_slots = asyncio.Semaphore(max(1, Config.FILE_SEND_CONCURRENCY))
+            self._uploads = set()
+            self._wakeup = asyncio.Event()
+            self.global_bucket = TokenBucket(self.global_bucket.rate, self.global_bucket.capacity)
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.PriorityQueue()
+            self._chat_buckets[chat_id] = self._new_chat_bucket(chat_id)
+        task = self._tasks.get(chat_id)
+        if task is None or task.done():
+            self._tasks[chat_id] = loop.create_task(self._worker(chat_id, queue))
+        return queue
+
+    def _new_chat_bucket(self, chat_id) -> TokenBucket:
+        # Identifiants négatifs: groupes et canaux, limités à 20 messages par minute
+        try:
+            is_group = int(chat_id) < 0
+        except (TypeError, ValueError):
+            is_group = False
+        rate = self.group_chat_rate if is_group else self.per_chat_rate
+        return TokenBucket(rate, 1.0)
+
+    async def _worker(self, chat_id, queue):
+        while True:
+            item = await queue.get()
+            _, _, lane, queued_at, method, kwargs, cost, ordered, future = item
+            try:
+                if future.cancelled():
+                    continue
+                if not ordered and self._upload_slots.locked():
+                    # Aucun créneau de téléversement: remettre en file (même rang) et attendre
+                    # un créneau libre ou un nouvel envoi, qui peut passer devant
+                    queue.put_nowait(item)
+                    self._wakeup.clear()
+                    if self._upload_slots.locked():
+                        await self._wakeup.wait()
+                    continue
+                waited = time.monotonic() - queued_at
+                self.lane_waits[lane]['last'] = waited
+                self.lane_waits[lane]['max'] = max(self.lane_waits[lane]['max'], waited)
+                if not ordered:
+                    # Téléversement: lancé dans sa propre tâche, le worker passe à l'envoi suivant
+                    await self._upload_slots.acquire()  # libre: ne bloque pas
+                    task = asyncio.create_task(self._upload(method, kwargs, cost, chat_id, future))
+                    self._uploads.add(task)
+                    task.add_done_callback(self._uploads.discard)
+                    continue
+                result = await self._execute(method, kwargs, cost, chat_id)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _upload(self, method: str, kwargs: dict, cost: float, chat_id, future):
+        try:
+            result = await self._execute(method, kwargs, cost, chat_id)
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self._upload_slots.release()
+            self._wakeup.set()
+
+    async def _execute(self, method: str, kwargs: dict, cost: float, chat_id):
+        attempt = 0
+        while True:
+            await self._chat_buckets[chat_id].acquire(cost)
+            await self.global_bucket.acquire(cost)
+            # Fichier ouvert déjà lu par une tentative précédente: repartir du début
+            document = kwargs.get('document')
+            if attempt and hasattr(document, 'seek'):
+                document.seek(0)
+            try:
+                result = await getattr(self.bot, method)(**kwargs)
+                self.stats['sent'] += 1
+                return result
+            except RetryAfter as e:
+                self.stats['retry_after'] += 1
+                wait = float(getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()) + 0.5
+                self.logger.warning(f"Limite Telegram atteinte (chat {chat_id}): pause {wait}s")
+                # Pause du seau: tous les envois vers ce chat (ou vers l'API si aucun chat) attendent,
+                # pas seulement l'appel refusé; la nouvelle tentative attend la fin de la pause
+                self._chat_buckets[chat_id].pause(wait)
+                if chat_id is None:
+                    self.global_bucket.pause(wait)
+            except (BadRequest, Forbidden):
+                # Erreurs définitives (HTML invalide, chat bloqué...): à gérer par l'appelant
+                self.stats['failed'] += 1
+                raise
+            except (TimedOut, NetworkError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.stats['failed'] += 1
+                    raise
+                self.stats['retried'] += 1
+                delay = min(30, 2 ** attempt)
+                self.logger.info(f"Envoi Telegram {method} en échec ({e}), nouvel essai dans {delay}s")
+                await asyncio.sleep(delay)
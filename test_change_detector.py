@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests du détecteur de changements: identifiants stables (cm id, pluginfile.php),
+doublons sans identifiant, déplacements entre sections et empreintes de contenu.
+"""
+
+import copy
+import unittest
+
+import content_hash
+from change_detector import ChangeDetector
+
+BASE = 'https://elearning.test'
+
+def _file(name, url=None):
+    return {'name': name, 'url': url or f'{BASE}/pluginfile.php/9/mod_folder/content/0/{name}'}
+
+def _item(title, cm_id=None, files=(), kind='assign', description=''):
+    url = f'{BASE}/mod/{kind}/view.php?id={cm_id}' if cm_id else ''
+    return {'title': title, 'type': kind, 'url': url, 'description': description, 'files': list(files)}
+
+def _section(title, activities=(), resources=()):
+    return {'title': title, 'activities': list(activities), 'resources': list(resources)}
+
+def _content(*sections):
+    return {'course_id': '1', 'url': f'{BASE}/course/view.php?id=1', 'timestamp': 0, 'sections': list(sections)}
+
+def _types(changes):
+    return sorted((c['type'], c.get('activity_title') or c.get('resource_title') or c.get('file_name'))
+                  for c in changes)
+
+class ChangeDetectorKeysTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = ChangeDetector()
+
+    def detect(self, old, new):
+        return self.detector.detect_changes(old, new)
+
+    def test_duplicate_titles_without_cm_id(self):
+        old = _content(_section('Semaine 1', activities=[
+            _item('TD', files=[_file('td1.pdf')]),
+            _item('TD', files=[_file('td2.pdf')]),
+        ]))
+        new = copy.deepcopy(old)
+        new['sections'][0]['activities'].append(_item('TD', files=[_file('td3.pdf')]))
+        self.assertEqual(_types(self.detect(old, new)), [('activity_added', 'TD')])
+
+    def test_cm_keyed_rename(self):
+        old = _content(_section('Semaine 1', activities=[_item('Cours magistral', cm_id=5, files=[_file('cm.pdf')])]))
+        new = copy.deepcopy(old)
+        new['sections'][0]['activities'][0]['title'] = 'Séance de révision'
+        changes = self.detect(old, new)
+        self.assertEqual([c['type'] for c in changes], ['activity_renamed'])
+        self.assertEqual(changes[0]['cm_id'], '5')
+        self.assertEqual((changes[0].old_value, changes[0].new_value), ('Cours magistral', 'Séance de révision'))
+
+    def test_item_moved_between_sections(self):
+        moved = _item('Projet', cm_id=7, files=[_file('projet.pdf')])
+        old = _content(_section('Semaine 1', activities=[moved, _item('Quiz', cm_id=8, files=[_file('q.pdf')])]),
+                       _section('Semaine 2', activities=[_item('TP', cm_id=9, files=[_file('tp.pdf')])]))
+        new = _content(_section('Semaine 1', activities=[_item('Quiz', cm_id=8, files=[_file('q.pdf')])]),
+                       _section('Semaine 2', activities=[_item('TP', cm_id=9, files=[_file('tp.pdf')]),
+                                                         copy.deepcopy(moved)]))
+        # Même cm id: ni ajout ni suppression (ni renvoi de ses fichiers)
+        self.assertEqual(self.detect(old, new), [])
+
+    def test_resource_revision_bump_is_file_updated(self):
+        def content(revision):
+            url = f'{BASE}/pluginfile.php/55/mod_resource/content/{revision}/plan.pdf'
+            return _content(_section('Généralités', resources=[
+                _item('Plan du cours', cm_id=101, kind='resource', files=[_file('plan.pdf', url)])
+            ]))
+        changes = self.detect(content(3), content(4))
+        self.assertEqual(_types(changes), [('file_updated', 'plan.pdf')])
+        self.assertTrue(changes[0]['file_url'].endswith('/content/4/plan.pdf'))
+
+    def test_same_path_under_different_itemids(self):
+        def attachment(itemid, name):
+            return _file(name, f'{BASE}/pluginfile.php/9/mod_assign/introattachment/{itemid}/{name}')
+        old = _content(_section('Devoirs', activities=[
+            _item('Devoir', cm_id=12, files=[attachment(11, 'a.pdf'), attachment(12, 'a.pdf')])
+        ]))
+        new = copy.deepcopy(old)
+        new['sections'][0]['activities'][0]['files'].append(attachment(12, 'b.pdf'))
+        self.assertEqual(_types(self.detect(old, new)), [('file_added', 'b.pdf')])
+
+class ChangeDetectorHashTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = ChangeDetector()
+        self.old = _content(
+            _section('Semaine 1', activities=[_item('TD', cm_id=1, files=[_file('td1.pdf')])]),
+            _section('Semaine 2', activities=[_item('TP', cm_id=2, files=[_file('tp1.pdf')])]),
+        )
+
+    def test_old_snapshot_without_hashes(self):
+        # Snapshot sauvegardé avant les empreintes: comparaison complète de l'arbre
+        new = copy.deepcopy(self.old)
+        new['sections'][1]['activities'][0]['files'].append(_file('tp2.pdf'))
+        content_hash.annotate(new)
+        self.assertNotIn('content_hash', self.old)
+        self.assertEqual(_types(self.detector.detect_changes(self.old, new)), [('file_added', 'tp2.pdf')])
+
+        unchanged = copy.deepcopy(self.old)
+        content_hash.annotate(unchanged)
+        self.assertEqual(self.detector.detect_changes(self.old, unchanged), [])
+
+    def test_unchanged_content_hash_returns_no_change(self):
+        old = copy.deepcopy(self.old)
+        content_hash.annotate(old)
+        new = copy.deepcopy(old)
+        self.assertEqual(self.detector.detect_changes(old, new), [])
+        # Même empreinte de cours: l'arbre n'est pas parcouru
+        new['sections'][0]['activities'][0]['files'].append(_file('td2.pdf'))
+        self.assertEqual(self.detector.detect_changes(old, new), [])
+
+    def test_changed_section_is_walked_after_annotate(self):
+        old = copy.deepcopy(self.old)
+        content_hash.annotate(old)
+        new = copy.deepcopy(self.old)
+        new['sections'][0]['activities'][0]['files'].append(_file('td2.pdf'))
+        content_hash.annotate(new)
+        self.assertEqual(old['sections'][1]['hash'], new['sections'][1]['hash'])
+        self.assertNotEqual(old['content_hash'], new['content_hash'])
+        self.assertEqual(_types(self.detector.detect_changes(old, new)), [('file_added', 'td2.pdf')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests de MoodleWebServiceSource contre un serveur Moodle factice local
+(login/token.php et webservice/rest/server.php servis depuis des réponses JSON figées).
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+import requests
+
+from moodle_ws_source import MoodleWebServiceError, MoodleWebServiceSource
+
+TOKEN = 'jeton-factice'
+
+COURSE_CONTENTS = [
+    {
+        'id': 1, 'section': 0, 'name': 'Généralités',
+        'modules': [
+            {
+                'id': 101, 'name': 'Plan du cours', 'modname': 'resource', 'uservisible': True,
+                'url': 'http://moodle.test/mod/resource/view.php?id=101',
+                'description': '<p>Plan &amp; calendrier</p>',
+                'contents': [{
+                    'type': 'file', 'filename': 'plan.pdf', 'filesize': 1234, 'timemodified': 1700000000,
+                    'contenthash': 'abc123',
+                    'fileurl': 'http://moodle.test/webservice/pluginfile.php/55/mod_resource/content/3/plan.pdf?forcedownload=1'
+                }]
+            },
+            {
+                'id': 102, 'name': 'Forum des annonces', 'modname': 'forum', 'uservisible': True,
+                'url': 'http://moodle.test/mod/forum/view.php?id=102', 'description': ''
+            },
+            {
+                'id': 103, 'name': 'Devoir caché', 'modname': 'assign', 'uservisible': False,
+                'url': 'http://moodle.test/mod/assign/view.php?id=103'
+            }
+        ]
+    },
+    {
+        'id': 2, 'section': 1, 'name': '',
+        'modules': [
+            {
+                'id': 201, 'name': 'TD', 'modname': 'folder', 'uservisible': True,
+                'url': 'http://moodle.test/mod/folder/view.php?id=201',
+                'contents': [
+                    {'type': 'file', 'filename': 'td1.pdf', 'filesize': 10, 'timemodified': 1700000100,
+                     'contenthash': 'def456',
+                     'fileurl': 'http://moodle.test/webservice/pluginfile.php/56/mod_folder/content/0/td1.pdf'},
+                    {'type': 'url', 'filename': 'lien', 'fileurl': 'http://example.org'}
+                ]
+            }
+        ]
+    }
+]
+
+class _MockMoodleHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        self.server.requests.append((self.path, params))
+        if self.path == '/login/token.php':
+            if params.get('service') == 'moodle_mobile_app':
+                body = {'token': TOKEN}
+            else:
+                body = {'error': 'Service inconnu'}
+        elif self.path == '/webservice/rest/server.php':
+            if params.get('wstoken') != TOKEN:
+                body = {'exception': 'moodle_exception', 'errorcode': 'invalidtoken', 'message': 'Jeton invalide'}
+            elif params.get('wsfunction') == 'core_course_get_contents':
+                body = COURSE_CONTENTS
+            else:
+                body = {'exception': 'dml_missing_record_exception', 'errorcode': 'invalidrecord', 'message': '?'}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+class MoodleWebServiceSourceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), _MockMoodleHandler)
+        cls.server.requests = []
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_port}/webservice/rest/server.php"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.session = requests.Session()
+        self.source = MoodleWebServiceSource(self.session, token=None, endpoint=self.endpoint)
+
+    def tearDown(self):
+        self.session.close()
+
+    def _course_content(self):
+        raw = self.source.call_raw('core_course_get_contents', courseid='42')
+        sections_json = self.source.check_response(json.loads(raw))
+        return self.source.build_content('http://moodle.test/course/view.php?id=42', '42', sections_json)
+
+    def test_token_is_requested_once_then_reused(self):
+        self._course_content()
+        self._course_content()
+        paths = [path for path, _ in self.server.requests]
+        self.assertEqual(paths.count('/login/token.php'), 1)
+        self.assertEqual(paths.count('/webservice/rest/server.php'), 2)
+        _, params = self.server.requests[1]
+        self.assertEqual(params['wstoken'], TOKEN)
+        self.assertEqual(params['courseid'], '42')
+        self.assertEqual(params['moodlewsrestformat'], 'json')
+
+    def test_build_content_matches_snapshot_format(self):
+        content = self._course_content()
+        self.assertEqual(content['course_id'], '42')
+        self.assertEqual([s['title'] for s in content['sections']], ['Généralités', 'section-1'])
+
+        general = content['sections'][0]
+        # Les ressources sont séparées des activités; les modules invisibles sont ignorés
+        self.assertEqual([r['title'] for r in general['resources']], ['Plan du cours'])
+        self.assertEqual([(a['title'], a['type']) for a in general['activities']], [('Forum des annonces', 'forum')])
+
+        resource = general['resources'][0]
+        self.assertEqual(resource['type'], 'resource')
+        self.assertEqual(resource['description'], 'Plan & calendrier')
+        self.assertEqual(resource['files'], [{
+            'name': 'plan.pdf',
+            'url': 'http://moodle.test/pluginfile.php/55/mod_resource/content/3/plan.pdf',
+            'timemodified': 1700000000,
+            'filesize': 1234,
+            'contenthash': 'abc123'
+        }])
+
+        folder = content['sections'][1]['activities'][0]
+        self.assertEqual(folder['type'], 'folder')
+        # Seules les entrées de type 'file' deviennent des fichiers
+        self.assertEqual([f['name'] for f in folder['files']], ['td1.pdf'])
+        self.assertEqual(folder['files'][0]['url'], 'http://moodle.test/pluginfile.php/56/mod_folder/content/0/td1.pdf')
+
+    def test_download_url_adds_token(self):
+        url = 'http://moodle.test/pluginfile.php/55/mod_resource/content/3/plan.pdf'
+        self.assertEqual(self.source.download_url(url),
+                         f'http://moodle.test/webservice/pluginfile.php/55/mod_resource/content/3/plan.pdf?token={TOKEN}')
+        self.assertEqual(self.source.download_url(url + '?forcedownload=1'),
+                         f'http://moodle.test/webservice/pluginfile.php/55/mod_resource/content/3/plan.pdf'
+                         f'?forcedownload=1&token={TOKEN}')
+        # URL déjà authentifiée ou hors pluginfile.php: inchangée
+        ws_url = f'http://moodle.test/webservice/pluginfile.php/1/x/y/0/a.pdf?token={TOKEN}'
+        self.assertEqual(self.source.download_url(ws_url), ws_url)
+        self.assertEqual(self.source.download_url('http://moodle.test/mod/url/view.php?id=1'),
+                         'http://moodle.test/mod/url/view.php?id=1')
+
+    def test_invalid_token_is_forgotten(self):
+        self.source.token = 'périmé'
+        raw = self.source.call_raw('core_course_get_contents', courseid='42')
+        with self.assertRaises(MoodleWebServiceError):
+            self.source.check_response(json.loads(raw))
+        self.assertIsNone(self.source.token)
+        # Nouvel appel: jeton redemandé à login/token.php
+        self._course_content()
+        self.assertIn('/login/token.php', [path for path, _ in self.server.requests])
+
+if __name__ == '__main__':
+    unittest.main()
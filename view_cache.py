@@ -0,0 +1,68 @@
+import hashlib
+import json
+import logging
+import threading
+
+class ViewCache:
+    """Cache par cours des vues rendues à partir d'un snapshot.
+
+    Chaque entrée est rattachée à l'empreinte du snapshot (sha1 des sections, hors
+    horodatage): tant que le snapshot d'un cours ne change pas, les vues (/nav,
+    /inventory, /inline) sont servies sans reparcourir l'arbre du cours.
+    Le même objet snapshot est reconnu par identité, sans recalcul de l'empreinte.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # course_id -> {'snapshot': objet snapshot, 'fingerprint': str, 'views': {nom: valeur}}
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @staticmethod
+    def fingerprint(snapshot: dict) -> str:
+        # Empreinte de cours calculée par le scraper (content_hash), sinon hash des sections
+        if snapshot.get('content_hash'):
+            return snapshot['content_hash']
+        sections = snapshot.to_dict()['sections'] if hasattr(snapshot, 'to_dict') else snapshot.get('sections', [])
+        payload = json.dumps(sections, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _entry(self, course_id: str, snapshot: dict) -> dict:
+        entry = self._entries.get(course_id)
+        if entry is not None and entry['snapshot'] is snapshot:
+            return entry
+        fingerprint = self.fingerprint(snapshot)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            # Nouvel objet au contenu identique (rechargement, rescan sans changement)
+            entry['snapshot'] = snapshot
+            return entry
+        if entry is not None:
+            self.stats['invalidations'] += 1
+        entry = self._entries[course_id] = {'snapshot': snapshot, 'fingerprint': fingerprint, 'views': {}}
+        return entry
+
+    def get(self, course_id: str, snapshot: dict, view: str, builder):
+        """Vue `view` du cours, construite par builder() si absente ou périmée."""
+        with self._lock:
+            views = self._entry(course_id, snapshot)['views']
+            if view in views:
+                self.stats['hits'] += 1
+                return views[view]
+            self.stats['misses'] += 1
+        value = builder()
+        with self._lock:
+            entry = self._entries.get(course_id)
+            if entry is not None and entry['snapshot'] is snapshot:
+                entry['views'][view] = value
+        return value
+
+    def invalidate(self, course_id: str = None):
+        with self._lock:
+            if course_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(course_id, None)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self.stats, courses=len(self._entries))
@@ -1,8 +1,10 @@
 import asyncio
+import hmac
 import os
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Request
 from fastapi.responses import JSONResponse, PlainTextResponse
+from config import Config
 from main import ELearningBot
 
 # Créer application FastAPI
@@ -20,6 +22,8 @@ async def startup_event():
     if bot_instance is None:
         logger.info("🚀 Démarrage du bot eLearning...")
         bot_instance = ELearningBot()
+        # Serveur HTTP disponible: recevoir les updates par webhook si configuré
+        bot_instance.notifier.webhook_enabled = bool(Config.TELEGRAM_WEBHOOK_URL)
         # Lancer le bot en tâche asynchrone
         bot_task = asyncio.create_task(bot_instance.start())
         logger.info("✅ Bot async task démarrée - Prêt à recevoir des commandes")
@@ -76,6 +80,22 @@ async def trigger_scan():
     bot_instance.trigger_manual_scan()
     return {"status": "scan_triggered"}
 
+@app.post(Config.TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request, x_telegram_bot_api_secret_token: str | None = Header(default=None)):
+    if not bot_instance:
+        return JSONResponse({"error": "bot not ready"}, status_code=503)
+    notifier = bot_instance.notifier
+    if not hmac.compare_digest(x_telegram_bot_api_secret_token or '', notifier.webhook_secret):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    # Traiter même si le polling de repli a pris le relais: Telegram considère un 200 comme
+    # livré, et dispatch_update écarte les update_id déjà vus par l'une ou l'autre voie
+    try:
+        await notifier.handle_webhook_update(await request.json())
+    except Exception as e:
+        logger.warning(f"Update webhook invalide: {e}")
+    # Toujours 200: Telegram réessaierait sinon la même update indéfiniment
+    return {"ok": True}
+
 @app.get("/")
 async def root():
     return PlainTextResponse("eLearning bot en fonctionnement. Endpoints: /health /stats /courses /scan")